@@ -13,8 +13,11 @@ FOLDERS = {
     "rh"           : "data/rh",
     "revenue_cogs" : "data/revenue_cogs",
     "capex"        : "data/capex",
+    "ifrs16"       : "data/ifrs16",
+    "budget"       : "data/budget",
     "mapping"      : "mapping",
     "output"       : "data/output",
+    "cache"        : "data/cache",    # Cache colonnaire Parquet (ledger + sorties de stages)
 }
 
 # ── Comptabilité ──────────────────────────────────────────────────────────────
@@ -24,6 +27,74 @@ CLASSES_PL         = ['6', '7']                   # Comptes de P&L
 JOURNAL_AN         = 'AN'                          # Code journal À Nouveaux
 NA_VALUES          = ['NA', 'N/A', 'NAN', '']     # Valeurs nulles textuelles
 SEUIL_ECART_INTERCO = 0.01                         # Seuil de tolérance écarts intercos (€)
+SEUIL_EQUILIBRE_FEC = 0.01                         # Seuil d'équilibre Débit/Crédit (écriture, journal, jour)
+FEC_PROFONDEUR_MOIS_MAX = 24                       # Écritures plus anciennes (vs fin de période) → anomalie
+EXERCICE_PREMIER_MOIS   = 1                        # Premier mois de l'exercice fiscal (YTD)
+
+# ── Rapprochement intercos ligne à ligne (interco_rapprochement) ──────────────
+
+INTERCO_FENETRE_JOURS  = 15   # Écart de dates maximal entre deux lignes rapprochées
+INTERCO_JETON_MIN      = 3    # Longueur minimale d'un jeton PieceRef / EcritureLib (avec au moins un chiffre)
+INTERCO_JETON_FREQ_MAX = 5    # Jeton présent sur plus de N lignes d'un côté d'une paire → non discriminant, ignoré
+
+# ── Devises (conversion des filiales hors EUR) ────────────────────────────────
+
+DEVISE_GROUPE           = "EUR"                          # Devise de présentation du groupe
+DEVISES_ENTITES         = {}                             # Devise fonctionnelle par entité hors EUR, ex. {"CELSIUS": "CHF"}
+TAUX_CHANGE_FILE        = "mapping/taux_change.xlsx"     # Devise | Date | Taux_moyen | Taux_cloture (1 EUR = x devise)
+COMPTE_ECART_CONVERSION = "107700"                       # Écarts de conversion (capitaux propres)
+
+# ── Exécution out-of-core (stages 01–04 et 07) ────────────────────────────────
+
+OUT_OF_CORE_MEMORY_MB    = 512    # Plafond mémoire du mode par blocs (Mo)
+OUT_OF_CORE_OCTETS_LIGNE = 1_200  # Empreinte estimée d'une ligne FEC parsée (octets)
+OUT_OF_CORE_PART_BLOC    = 0.25   # Part du plafond allouée à un bloc (le reste : agrégats, temporaires)
+
+# ── Budget mémoire (--memory-budget) ──────────────────────────────────────────
+
+MEMORY_BUDGET_MB           = None   # Budget mémoire par défaut (Mo) ; None = pas de budget
+MEMOIRE_FACTEUR_CHARGEMENT = 2.0    # Pic des stages 01–02 en mémoire / taille du FEC parsé
+MEMOIRE_OCTETS_CELLULE     = 500    # Empreinte estimée d'une cellule openpyxl stylée (octets)
+
+# ── Clôture flash (--flash) ───────────────────────────────────────────────────
+
+FLASH_RACINES_CA     = ['70']                                   # CA brut (étape fec, avant mapping)
+FLASH_RACINES_EBITDA = ['60', '61', '62', '63', '64', '65',     # EBITDA estimé sur les racines PCG d'exploitation
+                        '70', '71', '72', '73', '74', '75']     # (hors dotations 68/78, financier, exceptionnel, IS)
+FLASH_LIGNES_CA      = ["Sales", "B2C Revenue", "B2B Revenue"]  # CA après mapping (lignes de PL_STRUCTURE)
+
+# ── Packs de distribution (--packs / fpa packs) ───────────────────────────────
+
+PACKS_WORKERS = None   # Processus d'écriture des packs ; None = nombre de CPU, 1 = séquentiel
+
+# ── Export colonnaire (stage 08, outils BI) ───────────────────────────────────
+
+EXPORT_FORMAT = "parquet"   # "parquet" | "arrow" (IPC / Feather v2, sans décodage) ; None = pas d'export
+
+# ── Régénération du reporting (output_08) ─────────────────────────────────────
+
+REPORTING_REUTILISATION = True   # Onglets aux agrégats inchangés repris du classeur précédent (empreintes)
+
+# ── Service résident (fpa watch) ──────────────────────────────────────────────
+
+DAEMON_POLL_S     = 2     # Intervalle de scrutation des dossiers d'entrée (s)
+DAEMON_DEBOUNCE_S = 1     # Délai de stabilité d'un fichier avant prise en compte (s)
+
+# ── API HTTP locale (fpa serve) ───────────────────────────────────────────────
+
+API_HOST = "127.0.0.1"   # Écoute locale uniquement
+API_PORT = 8765
+
+# ── Journal (niveaux, événements JSON) ────────────────────────────────────────
+
+LOG_NIVEAU  = "INFO"    # DEBUG : aperçus de DataFrames et détail ligne à ligne (calculés seulement à ce niveau)
+LOG_FORMAT  = "texte"   # "texte" (console lisible) | "json" (un événement par ligne)
+LOG_FICHIER = None      # Copie JSON lines des événements, ex. "data/output/journal.jsonl" ; None = console seule
+
+# ── Démarrage du CLI (fpa bench) ──────────────────────────────────────────────
+
+CLI_DEMARRAGE_MAX_S   = 0.5   # Objectif des commandes légères (fpa --help, fpa detect), interpréteur à froid (s)
+CLI_BENCH_REPETITIONS = 5     # Mesures par commande (minimum et médiane retenus)
 
 # ── Split BU ──────────────────────────────────────────────────────────────────
 
@@ -44,12 +115,35 @@ LIGNES_PL_COGS = ['COGS']
 CAPEX_FILE     = "data/capex/capex_decaisses.xlsx"
 CAPEX_COL_PERIOD = "Periode"
 CAPEX_COL_AMOUNT = "Montant_decaisse"
+CAPEX_COL_PROJET = "Projet"    # Optionnel — défaut : CAPEX_PROJET_DEFAUT
+CAPEX_COL_ENTITE = "Entite"    # Optionnel — défaut : CAPEX_ENTITE_DEFAUT
+
+CAPEX_PROJETS_FILE             = "data/capex/capex_projets.xlsx"   # Optionnel : durées / mises en service
+CAPEX_ENTITE_DEFAUT            = "PID"
+CAPEX_PROJET_DEFAUT            = "Milestones"
+CAPEX_DUREE_AMORTISSEMENT_MOIS = 36
 
 # ── IFRS 16 ───────────────────────────────────────────────────────────────────
 
+IFRS16_REGISTRE_FILE  = "data/ifrs16/registre_baux.xlsx"   # Registre des baux (moteur d'échéanciers)
+
+# Loyers comptabilisés rapprochés du registre (repris en ROU D&A si le registre est absent)
 IFRS16_ENTITIES       = ["PID", "CELSIUS"]
 IFRS16_LOYER_ACCOUNTS = {"PID": "61343", "CELSIUS": "61320"}
 
+# ── Tableau de flux de trésorerie (cash_flow_07b) ─────────────────────────────
+
+# Mapping_BS_category → section du tableau de flux (catégories absentes : variations d'exploitation)
+FLUX_SECTIONS_BS = {
+    "Current assets"     : "Exploitation",
+    "Current liabilities": "Exploitation",
+    "Fixed assets"       : "Investissement",   # Brut et amortissements cumulés (28x)
+    "Equity"             : "Financement",
+}
+FLUX_CATEGORIES_TRESORERIE = ["Cash"]                  # Trésorerie d'ouverture / de clôture
+FLUX_CATEGORIES_DA         = ["D&A on fixed assets"]   # Dotations réintégrées (Mapping_PL_category)
+FLUX_SEUIL_CONTROLE        = 1.0                       # Écart toléré variation calculée / trésorerie (€)
+
 # ── Styles Excel (output_08) ──────────────────────────────────────────────────
 
 C_HEADER   = "1F2D3D"   # Bleu nuit — header colonnes
@@ -94,10 +188,31 @@ PL_STRUCTURE = [
     ("Extraordinary items",      "item"),
 ]
 
+# Comparatifs ajoutés à la colonne TOTAL des onglets P&L (découpés dans pl_cube)
+PL_COMPARATIFS = ["YTD", "N-1", "R12"]
+
+# ── Budget / forecast (previsionnel) ──────────────────────────────────────────
+
+# Une ligne par (Entite, Ligne) — lignes 'item' de PL_STRUCTURE, charges négatives — et une
+# colonne par mois YYYYMM ; fichiers optionnels
+BUDGET_FILE   = "data/budget/budget.xlsx"
+FORECAST_FILE = "data/budget/forecast.xlsx"
+PL_ECARTS     = ["Budget", "Forecast"]   # Versions comparées au réel dans les onglets P&L (prévu, écart, écart %)
+
 # ── Groupes reporting (output_08) ─────────────────────────────────────────────
 
+# Membres : entités ou sous-groupes (nom d'un autre groupe, résolu en ses entités)
 REPORTING_GROUPS = {
     "PID & FR"           : ["PID", "FR"],
     "CELSIUS & VERTICAL" : ["CELSIUS", "VERTICAL"],
     "Consolidé"          : ["FR", "PID", "CELSIUS", "VERTICAL"],
-}
\ No newline at end of file
+}
+
+# ── Périmètre de consolidation (consolidation) ────────────────────────────────
+
+# Participations directes {détentrice: {filiale: part du capital}} ; dans chaque périmètre, les
+# membres non détenus par un autre membre sont têtes de groupe (intérêt 100 %)
+PARTICIPATIONS             = {}         # ex. {"FR": {"PID": 1.0, "CELSIUS": 0.8}, "CELSIUS": {"VERTICAL": 0.6}}
+METHODES_CONSOLIDATION     = {}         # Entité → "globale" (défaut) | "proportionnelle"
+DATES_PERIMETRE            = {}         # Entité → ["YYYYMM", "YYYYMM"] premier / dernier mois consolidés ("" ou None : sans borne)
+CATEGORIE_CAPITAUX_PROPRES = "Equity"   # Mapping_BS_category dont la part des minoritaires est reclassée
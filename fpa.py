@@ -0,0 +1,259 @@
+"""
+fpa.py — Outils en ligne de commande autour du pipeline FP&A
+--------------------------------------------------------------
+Sous-commandes :
+  detect        Période de clôture et FEC détectés (lecture du dossier, sans pandas)
+  run           Clôture complète — mêmes options que main.py (fpa run --help)
+  stage N       Un stage seul, avec aperçu de ses sorties (01 à 07)
+  check-mapping Comptes FEC non mappés, doublons et détails sans catégorie du mapping PCG
+  query [SQL]   Requête SQL sur le cache colonnaire (ledger, mappings, sorties de stages)
+                Sans SQL : liste les tables disponibles
+  drill         Lignes FEC derrière un chiffre reporté (entité × ligne de détail P&L ou Bilan)
+  watch         Service résident : régénère le reporting à chaque fichier déposé
+  serve         API HTTP locale (P&L, Bilan, split BU par entité/groupe, JSON ou Arrow)
+  packs         Packs de distribution par entité / groupe depuis le cache (pool de processus)
+  bench         Temps de démarrage à froid des commandes (historique data/output/bench_demarrage.json)
+  restate       Retraite l'historique sous le mapping PCG courant (diff des agrégats, sans recharger les FEC)
+  flash         Dernier instantané de la clôture flash (fpa run --flash), lu sans pandas
+
+Démarrage : ce module n'importe que argparse et config.py ; chaque sous-commande importe ce dont
+elle a besoin à l'exécution. fpa --help et fpa detect ne chargent ni pandas ni openpyxl.
+
+Options communes (avant la sous-commande) :
+  --config FICHIER   TOML / YAML (cf. scripts/pipeline_config.py) — cache, dossiers et périmètres
+                     d'un groupe ; défaut : config.py
+  --log-niveau N     DEBUG | INFO | WARNING | ERROR ; --log-format texte | json (cf. scripts/journal.py)
+
+Installation : pip install -e .  (commande `fpa`) ; sinon python fpa.py …
+  Seul ce module est installé : config.py, main.py et scripts/ sont lus depuis le dépôt. Une
+  installation non éditable (pip install .) n'est pas prise en charge : fpa s'arrête avec un message.
+
+Exemple :
+  fpa detect
+  fpa check-mapping --periode 202403
+  fpa run --out-of-core --packs
+  fpa run --flash   (puis, depuis un autre terminal : fpa flash)
+  fpa query "SELECT * FROM df_pl_final WHERE Entite = 'PID'" --periode 202403
+  fpa drill PID "Rent" --vue PL
+  fpa restate --periodes 202401 202402
+  fpa --config groupes/nord/cloture.toml packs
+"""
+
+import argparse
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+try:
+    from config import DAEMON_POLL_S, API_HOST, API_PORT, PACKS_WORKERS, CLI_BENCH_REPETITIONS, DEVISE_GROUPE
+except ModuleNotFoundError as e:
+    if e.name != "config":
+        raise
+    # pip install . (non éditable) : fpa.py copié seul dans site-packages, sans le dépôt
+    sys.exit(f"fpa : config.py introuvable à côté de {os.path.abspath(__file__)}. Seule l'installation "
+             f"éditable est prise en charge (pip install -e . depuis le dépôt) ; sinon : python fpa.py …")
+
+
+# Stages exécutables seuls (bloc __main__ du module) ; 08 nécessite toute la chaîne : fpa run
+STAGES = {
+    "01": "load_fec_01",
+    "02": "monthly_movements_02",
+    "03": "pcg_mapping_03",
+    "04": "interco_04",
+    "05": "bu_split_05",
+    "06": "capex_06",
+    "07": "ifrs16_07",
+}
+
+
+def _config(args):
+    from scripts.pipeline_config import charger_config, config_defaut
+    return charger_config(args.config) if args.config else config_defaut()
+
+
+def _cmd_detect(args):
+    from scripts.fec_fichiers import periodes_disponibles, detect_fec_files
+    cfg      = _config(args)
+    fec      = cfg.FOLDERS["fec"]
+    periodes = periodes_disponibles(fec)
+    if not periodes:
+        print(f"❌ Aucun fichier FEC dans {fec}")
+        return 1
+
+    periode = args.periode or list(periodes)[-1]
+    print(f"Périodes disponibles : {', '.join(periodes)}")
+    print(f"Période de clôture   : {periode}")
+    fichiers   = detect_fec_files(fec, periode, cfg.ENTITES)
+    manquantes = [e for e in cfg.ENTITES if e not in fichiers]
+    if manquantes:
+        print(f"  ⚠️  FEC manquant(s) : {', '.join(manquantes)}")
+        return 1
+    print(f"  ✅ {len(fichiers)} entité(s) sur {len(cfg.ENTITES)}")
+
+
+def _cmd_run(args, options):
+    from main import main as run
+    communes = [(opt, val) for opt, val in [("--config", args.config), ("--log-niveau", args.log_niveau),
+                                            ("--log-format", args.log_format)] if val is not None]
+    return run([x for couple in communes for x in couple] + options, prog="fpa run")
+
+
+def _cmd_stage(args):
+    import runpy
+    if args.config:
+        # Les blocs __main__ des stages lisent config.py ; un --config ignoré fausserait l'aperçu
+        sys.exit("fpa stage : --config non pris en charge (aperçu sur config.py) — utiliser fpa run")
+    runpy.run_module(f"scripts.{STAGES[args.numero.zfill(2)]}", run_name="__main__")
+
+
+def _cmd_check_mapping(args):
+    from scripts.fec_fichiers import detect_periode
+    from scripts.pcg_mapping_03 import controler_mapping
+    cfg       = _config(args)
+    periode   = args.periode or detect_periode(cfg.FOLDERS["fec"])
+    anomalies = controler_mapping(cfg.FOLDERS["fec"], cfg.FOLDERS["mapping"], periode, cfg.ENTITES)
+    return 1 if len(anomalies) else 0
+
+
+def _cmd_bench(args):
+    from scripts.demarrage import run
+    return 0 if run(repetitions=args.repetitions, config_file=args.config,
+                    output_folder=_config(args).FOLDERS["output"]) else 1
+
+
+def _cmd_flash(args):
+    import json
+    from pathlib import Path
+    racine = Path(_config(args).FOLDERS["output"]) / "flash"
+    periodes = sorted(d.name for d in racine.iterdir() if d.is_dir()) if racine.is_dir() else []
+    periode  = args.periode or (periodes[-1] if periodes else None)
+    chemin   = racine / str(periode) / f"flash_{periode}.json"
+    if not chemin.exists():
+        print(f"❌ Aucun instantané flash{f' pour {periode}' if periode else ''} dans {racine} (fpa run --flash)")
+        return 1
+
+    flash = json.loads(chemin.read_text(encoding="utf-8"))
+    print(f"Flash {flash['periode']} — étape {flash['etape']}{'' if flash['complet'] else ' (entités partielles)'}"
+          f" — démarré le {flash['demarre_le']}")
+    print(f"  {'Entité':<12}{'Étape':<11}{'+s':>8}{'CA':>16}{'EBITDA':>16}{'Résultat':>16}")
+    for entite, v in flash["entites"].items():
+        print(f"  {entite:<12}{v['etape']:<11}{v['t_s']:>8.2f}{v['CA']:>16,.0f}{v['EBITDA']:>16,.0f}{v['Resultat']:>16,.0f}"
+              + (f"  ({v['devise']})" if v["devise"] != DEVISE_GROUPE else ""))
+    t = flash["total"]
+    if t is None:
+        print(f"  {'TOTAL':<31}{'— devises fonctionnelles mixtes, total après conversion (02b)':>48}")
+    else:
+        print(f"  {'TOTAL':<31}{t['CA']:>16,.0f}{t['EBITDA']:>16,.0f}{t['Resultat']:>16,.0f}")
+
+
+def _cmd_restate(args):
+    from scripts.mapping_historique import run
+    run(periodes=args.periodes, version=args.version, cfg=_config(args))
+
+
+def _cmd_query(args):
+    from scripts.query import run
+    run(sql=args.sql, periode=args.periode, fmt=args.format, cache_folder=_config(args).FOLDERS["cache"])
+
+
+def _cmd_drill(args):
+    from scripts.drilldown import run
+    run(entite=args.entite, detail=args.detail, vue=args.vue, periode=args.periode,
+        cache_folder=_config(args).FOLDERS["cache"])
+
+
+def _cmd_watch(args):
+    from scripts.daemon import run
+    run(intervalle=args.intervalle, drilldown_sheet=args.drilldown_sheet, cfg=_config(args))
+
+
+def _cmd_serve(args):
+    from scripts.api import run
+    run(host=args.host, port=args.port, cfg=_config(args))
+
+
+def _cmd_packs(args):
+    from scripts.packs import run
+    run(periode=args.periode, workers=args.workers, cfg=_config(args))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="fpa", description="Outils FP&A Automation")
+    parser.add_argument("--config", metavar="FICHIER", help="Configuration TOML / YAML du groupe (défaut : config.py)")
+    parser.add_argument("--log-niveau", choices=["DEBUG", "INFO", "WARNING", "ERROR"], type=str.upper,
+                        help="Niveau du journal ; DEBUG : aperçus des DataFrames (défaut : config.LOG_NIVEAU)")
+    parser.add_argument("--log-format", choices=["texte", "json"], help="Journal lisible ou JSON (défaut : config.LOG_FORMAT)")
+    sub    = parser.add_subparsers(dest="commande", required=True)
+
+    p_detect = sub.add_parser("detect", help="Période de clôture et FEC détectés (sans charger pandas)")
+    p_detect.add_argument("--periode", help="Période YYYYMM (défaut : la plus récente)")
+    p_detect.set_defaults(func=_cmd_detect)
+
+    # Options transmises telles quelles à main.py (fpa run --help : aide de main.py)
+    p_run = sub.add_parser("run", add_help=False, help="Clôture complète, mêmes options que main.py")
+    p_run.set_defaults(func=_cmd_run)
+
+    p_stage = sub.add_parser("stage", help="Exécute un stage seul et affiche un aperçu de ses sorties")
+    p_stage.add_argument("numero", choices=[*STAGES, *(n.lstrip("0") for n in STAGES)], metavar="N",
+                         help=f"Numéro du stage ({', '.join(STAGES)})")
+    p_stage.set_defaults(func=_cmd_stage)
+
+    p_check = sub.add_parser("check-mapping", help="Contrôle du mapping PCG face aux comptes des FEC")
+    p_check.add_argument("--periode", help="Période YYYYMM (défaut : la plus récente)")
+    p_check.set_defaults(func=_cmd_check_mapping)
+
+    p_query = sub.add_parser("query", help="Requête SQL sur le cache colonnaire (DuckDB embarqué)")
+    p_query.add_argument("sql", nargs="?", help="Requête SQL (sans argument : liste des tables)")
+    p_query.add_argument("--periode", help="Période YYYYMM (défaut : la plus récente en cache)")
+    p_query.add_argument("--format", choices=["table", "csv"], default="table")
+    p_query.set_defaults(func=_cmd_query)
+
+    p_drill = sub.add_parser("drill", help="Lignes FEC derrière un chiffre reporté (index de drill-down)")
+    p_drill.add_argument("entite", help="Entité (FR, PID, …)")
+    p_drill.add_argument("detail", help="Mapping_PL_detail ou Mapping_BS_detail")
+    p_drill.add_argument("--vue", choices=["PL", "BS"], default="PL")
+    p_drill.add_argument("--periode", help="Période YYYYMM (défaut : la plus récente en cache)")
+    p_drill.set_defaults(func=_cmd_drill)
+
+    p_watch = sub.add_parser("watch", help="Service résident : mappings et FEC gardés en mémoire, recalcul incrémental")
+    p_watch.add_argument("--intervalle", type=float, default=DAEMON_POLL_S, help="Intervalle de scrutation (s)")
+    p_watch.add_argument("--drilldown-sheet", action="store_true")
+    p_watch.set_defaults(func=_cmd_watch)
+
+    p_serve = sub.add_parser("serve", help="API HTTP locale sur les agrégats précalculés")
+    p_serve.add_argument("--host", default=API_HOST)
+    p_serve.add_argument("--port", type=int, default=API_PORT)
+    p_serve.set_defaults(func=_cmd_serve)
+
+    p_packs = sub.add_parser("packs", help="Un classeur par entité et par groupe + manifeste, en parallèle")
+    p_packs.add_argument("--periode", help="Période YYYYMM (défaut : la plus récente en cache)")
+    p_packs.add_argument("--workers", type=int, default=PACKS_WORKERS, help="Processus (défaut : nombre de CPU)")
+    p_packs.set_defaults(func=_cmd_packs)
+
+    p_bench = sub.add_parser("bench", help="Temps de démarrage à froid des commandes, ajouté à l'historique")
+    p_bench.add_argument("--repetitions", type=int, default=CLI_BENCH_REPETITIONS)
+    p_bench.set_defaults(func=_cmd_bench)
+
+    p_restate = sub.add_parser("restate", help="Retraite l'historique sous une version du mapping PCG (diff ligne à ligne)")
+    p_restate.add_argument("--periodes", nargs="+", metavar="YYYYMM", help="Mois à retraiter (défaut : tout l'historique)")
+    p_restate.add_argument("--version", type=int, help="Version cible (défaut : mapping_pcg.xlsx courant)")
+    p_restate.set_defaults(func=_cmd_restate)
+
+    p_flash = sub.add_parser("flash", help="Dernier instantané de la clôture flash (CA, EBITDA, résultat par entité)")
+    p_flash.add_argument("--periode", help="Période YYYYMM (défaut : la plus récente)")
+    p_flash.set_defaults(func=_cmd_flash)
+
+    args, options = parser.parse_known_args(argv)
+    if args.log_niveau or args.log_format:
+        from scripts.journal import configurer_journal
+        from config import LOG_NIVEAU, LOG_FORMAT
+        configurer_journal(args.log_niveau or LOG_NIVEAU, args.log_format or LOG_FORMAT)
+    if args.func is _cmd_run:
+        return _cmd_run(args, options)
+    if options:
+        parser.error(f"arguments non reconnus : {' '.join(options)}")
+    return args.func(args) or 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
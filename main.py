@@ -3,17 +3,51 @@ main.py — Pipeline FP&A Automation
 -------------------------------------
 Ordre d'exécution :
   01 — Chargement et consolidation des FEC
+  02b — Conversion des filiales hors EUR (taux moyen / clôture, écart de conversion)
   02 — Extraction mouvements P&L et soldes bilan
   03 — Application du mapping PCG
   04 — Éliminations intercompagnies
   05 — Split CA/COGS/masse salariale par BU
-  06 — CAPEX cash milestones
+  06 — CAPEX milestones (immobilisation + amortissement)
   07 — Retraitement IFRS 16
-  08 — Génération des reportings Excel
+  07b — Tableau de flux de trésorerie (variations de bilan N / N-1, méthode indirecte)
+  08 — Génération des reportings Excel + export Parquet / Arrow des sorties de stages (en parallèle)
+
+Options :
+  --out-of-core      Lecture des FEC par blocs (stages 01–04 et 07), cf. scripts/out_of_core.py
+  --memoire-mb N     Plafond mémoire du mode out-of-core (défaut : config.OUT_OF_CORE_MEMORY_MB)
+  --drilldown-sheet  Onglet des lignes FEC avec liens depuis 'Détail P&L FEC' (cf. scripts/drilldown.py)
+  --memory-budget N  Budget mémoire (Mo) : bascule automatique sur les variantes par blocs / en flux,
+                     arrêt propre si le budget ne peut être tenu (cf. scripts/memoire.py)
+  --packs            Packs de distribution par entité / groupe, écrits en parallèle (cf. scripts/packs.py)
+  --config FICHIER   Configuration TOML / YAML de la clôture (cf. scripts/pipeline_config.py) ;
+                     répétée : une clôture indépendante par fichier, dans un pool de processus
+  --workers N        Taille du pool des clôtures multi-groupes (défaut : nombre de CPU)
+  --flash            Clôture flash : CA / EBITDA / résultat par entité publiés dès le chargement de
+                     chaque FEC, puis après mapping et intercos (cf. scripts/flash.py)
+  --log-niveau N     DEBUG | INFO | WARNING | ERROR (défaut : config.LOG_NIVEAU) ; DEBUG ajoute les
+                     aperçus de DataFrames, calculés seulement à ce niveau (cf. scripts/journal.py)
+  --log-format F     texte | json — un événement structuré par ligne (défaut : config.LOG_FORMAT)
 """
 
-from config                     import FOLDERS
+import argparse
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import partial
+
+import pandas as pd
+
+from config                     import OUT_OF_CORE_MEMORY_MB, MEMORY_BUDGET_MB, LOG_NIVEAU, LOG_FORMAT
+from scripts.journal            import journal, configurer_journal
+from scripts.pipeline_config    import config_defaut, charger_config
 from scripts.load_fec_01        import load_fec_entites, detect_periode
+from scripts.fx_translation_02b import (
+    load_taux,
+    convertir_ledger,
+    ecarts_conversion,
+    ajouter_ecarts_conversion,
+)
 from scripts.monthly_movements_02 import (
     get_mouvements_mois,
     get_mouvements_par_compte,
@@ -30,6 +64,11 @@ from scripts.interco_04         import (
     eliminer_intercos_pl,
     eliminer_intercos_bs,
 )
+from scripts.interco_rapprochement import (
+    run as run_rapprochement,
+    sauver_rapprochement,
+)
+from scripts.interco_historique import mettre_a_jour_historique
 from scripts.bu_split_05        import (
     load_split_ca_cogs,
     load_silae,
@@ -38,52 +77,367 @@ from scripts.bu_split_05        import (
 )
 from scripts.capex_06           import run as run_capex
 from scripts.ifrs16_07          import run as run_ifrs16
-from scripts.output_08          import run as run_output
+from scripts.cash_flow_07b      import run as run_cash_flow
+from scripts.output_08          import run as run_output, agregats_par_perimetre
+from scripts.out_of_core        import agreger_fec_par_blocs
+from scripts.ledger_store       import (
+    sauver_ledger,
+    sauver_tables,
+    mappings_en_table,
+    empreinte_entrees,
+    sauver_empreinte,
+)
+from scripts.drilldown          import indexer_lignes, finaliser_index, sauver_index, lignes_vue
+from scripts.pl_cube            import mettre_a_jour_cube
+from scripts.previsionnel       import run as run_previsionnel
+from scripts.mapping_historique import enregistrer_version, mettre_a_jour_mouvements, importer_cache
+from scripts.comptes            import dimension_comptes, libelles_comptes
+from scripts.packs              import run as run_packs
+from scripts.export_colonnaire  import lancer as lancer_export, attendre as attendre_export
+from scripts.flash              import nouveau_flash, publier, publier_fec, publier_mapping, publier_intercos, publier_definitif, indicateurs_pcg
+from scripts.validation         import nouveaux_controles, finaliser as finaliser_controles, sauver_rapport
+from scripts.memoire            import (
+    BudgetMemoireDepasse,
+    nouveau_budget,
+    planifier_chargement,
+    mesurer,
+    synthese,
+)
 
 
-if __name__ == "__main__":
+log = journal("main")
+
+
+def charger_referentiels(cfg=None):
+    """Mapping PCG + configuration intercos (partagés par tous les stages)."""
+    cfg                          = cfg or config_defaut()
+    mappings                     = load_mapping_pcg(cfg.FOLDERS["mapping"], cfg.ENTITES)
+    df_interco_pl, df_interco_bs = load_interco(cfg.FOLDERS["mapping"])
+    return {
+        "mappings"      : mappings,
+        "table_mappings": mappings_en_table(mappings),
+        "df_interco_pl" : df_interco_pl,
+        "df_interco_bs" : df_interco_bs,
+        "taux"          : load_taux(cfg.TAUX_CHANGE_FILE),
+    }
+
 
-    # 01 — Chargement FEC
-    periode = detect_periode(FOLDERS["fec"])
-    df      = load_fec_entites(FOLDERS["fec"], periode)
+def charger_ledger(periode, referentiels, out_of_core=False, memoire_mb=OUT_OF_CORE_MEMORY_MB, budget=None, cfg=None,
+                   flash=None):
+    """
+    Stages 01–02. Retourne les entrées de executer_aval :
+      df, df_mois, df_comptes, df_bilan, montants_pl, montants_bs, loyers, parts_index, controles
+    (df / df_mois valent None en mode out-of-core, les montants sont alors précalculés).
+    budget : budget mémoire (memoire.nouveau_budget) — bascule en out-of-core si nécessaire.
+    cfg    : configuration de la clôture (pipeline_config) — défaut : config.py.
+    flash  : état de la clôture flash (flash.nouveau_flash) — instantané à chaque FEC chargé.
+    """
+    cfg = cfg or config_defaut()
+    fec = cfg.FOLDERS["fec"]
+    out_of_core, memoire_mb = planifier_chargement(budget, fec, periode, out_of_core, memoire_mb, cfg.ENTITES)
+    if out_of_core:
+        # 01/02 — Lecture par blocs + agrégats partiels (le FEC consolidé n'est jamais matérialisé)
+        agregats = agreger_fec_par_blocs(
+            fec, periode, referentiels["df_interco_pl"], referentiels["df_interco_bs"], memoire_mb,
+            table_mappings=referentiels["table_mappings"], budget=budget, taux=referentiels["taux"], cfg=cfg,
+        )
+        mesurer(budget, "01–02 chargement par blocs")
+        if flash is not None:
+            publier(flash, "fec", indicateurs_pcg(agregats["df_comptes"], cfg.FLASH_RACINES_CA, cfg.FLASH_RACINES_EBITDA))
+        return {
+            "df"          : None,
+            "df_mois"     : None,
+            "df_comptes"  : agregats["df_comptes"],
+            "df_bilan"    : agregats["df_bilan"],
+            "montants_pl" : agregats["montants_pl"],
+            "montants_bs" : agregats["montants_bs"],
+            "loyers"      : agregats["loyers"],
+            "parts_index" : agregats["index_parts"],
+            "controles"   : agregats["controles"],
+        }
+
+    # 01 — Chargement FEC (+ contrôles d'intégrité dans la même passe)
+    controles = nouveaux_controles()
+    df = load_fec_entites(fec, periode, controles, cfg.ENTITES, partial(publier_fec, flash) if flash else None)
+    mesurer(budget, "01 chargement FEC")
+
+    # 02b — Conversion en devise groupe (sans effet si toutes les entités sont en EUR)
+    df = convertir_ledger(df, periode, referentiels["taux"], cfg)
+    sauver_ledger(periode, df, cfg.FOLDERS["cache"])
 
     # 02 — Mouvements & soldes
-    df_mois    = get_mouvements_mois(df, periode)
-    df_comptes = get_mouvements_par_compte(df_mois)
-    df_bilan   = get_soldes_bilan(df, periode)
+    df_mois = get_mouvements_mois(df, periode)
+    entrees = {
+        "df"          : df,
+        "df_mois"     : df_mois,
+        "df_comptes"  : get_mouvements_par_compte(df_mois),
+        "df_bilan"    : ajouter_ecarts_conversion(get_soldes_bilan(df, periode), ecarts_conversion(df, periode, cfg), cfg),
+        "montants_pl" : None,
+        "montants_bs" : None,
+        "loyers"      : None,
+        "parts_index" : [indexer_lignes(df, referentiels["table_mappings"], periode)],
+        "controles"   : finaliser_controles(controles, periode, cfg),
+    }
+    mesurer(budget, "02 mouvements & soldes")
+    return entrees
+
+
+def charger_rh(periode, cfg=None):
+    """Stage 05 — entrées RH (Silae + mapping RH) et split masse salariale."""
+    cfg           = cfg or config_defaut()
+    df_silae      = load_silae(cfg.FOLDERS["rh"], periode)
+    df_mapping_rh = load_mapping_rh(cfg.FOLDERS["mapping"])
+    df_opex_rh, df_capex_rh = split_masse_salariale(df_silae, df_mapping_rh)
+    return {"df_opex_rh": df_opex_rh, "df_capex_rh": df_capex_rh}
+
+
+def executer_aval(periode, referentiels, entrees, rh=None, drilldown_sheet=False, budget=None, cfg=None, flash=None):
+    """
+    Stages 03–08 à partir des entrées de charger_ledger. Retourne les sorties de stages.
+    Avec un budget mémoire, le ledger en mémoire (entrees['df'], ['df_mois']) est libéré après
+    le stage 07 : le drill-down de l'output relit les lignes depuis le cache Parquet.
+    flash : état de la clôture flash — instantanés après mapping, intercos et agrégats reportés.
+    """
+    cfg      = cfg or config_defaut()
+    cache    = cfg.FOLDERS["cache"]
+    output   = cfg.FOLDERS["output"]
+    mappings = referentiels["mappings"]
 
     # 03 — Mapping PCG
-    mappings              = load_mapping_pcg(FOLDERS["mapping"])
-    df_mapped, df_alertes = appliquer_mapping(df_comptes, mappings)
-    df_bilan_mapped       = agreger_bilan(df_bilan, mappings)
+    df_mapped, df_alertes = appliquer_mapping(entrees["df_comptes"], mappings)
+    df_bilan_mapped       = agreger_bilan(entrees["df_bilan"], mappings)
+    publier_mapping(flash, df_mapped)
+
+    # 04 — Rapprochement ligne à ligne (ledger en cache) puis éliminations intercos
+    rapprochement = run_rapprochement(periode, referentiels["df_interco_pl"], referentiels["df_interco_bs"], cache, cfg)
+    df_pl_elimine, recap_pl    = eliminer_intercos_pl(entrees["df_mois"], df_mapped, referentiels["df_interco_pl"], entrees["montants_pl"], rapprochement["synthese"], cfg.SEUIL_ECART_INTERCO)
+    df_bilan_elimine, recap_bs = eliminer_intercos_bs(entrees["df"], entrees["df_bilan"], referentiels["df_interco_bs"], entrees["montants_bs"], rapprochement["synthese"], cfg.SEUIL_ECART_INTERCO)
+    df_pl_final                = agreger_pl(df_pl_elimine)
+    publier_intercos(flash, df_pl_final)
+    mesurer(budget, "03–04 mapping & intercos")
 
-    # 04 — Éliminations intercos
-    df_interco_pl, df_interco_bs    = load_interco(FOLDERS["mapping"])
-    df_pl_elimine, recap_pl         = eliminer_intercos_pl(df_mois, df_mapped, df_interco_pl)
-    df_bilan_elimine, recap_bs      = eliminer_intercos_bs(df, df_bilan, df_interco_bs)
-    df_pl_final                     = agreger_pl(df_pl_elimine)
+    # Index de drill-down (chiffre reporté → lignes du ledger en cache)
+    drill_index = finaliser_index(entrees["parts_index"], recap_pl, recap_bs)
+    sauver_index(periode, drill_index, cache)
 
     # 05 — Split BU
-    df_split      = load_split_ca_cogs(FOLDERS["revenue_cogs"], periode)
-    df_silae      = load_silae(FOLDERS["rh"], periode)
-    df_mapping_rh = load_mapping_rh(FOLDERS["mapping"])
-    df_opex_rh, df_capex_rh = split_masse_salariale(df_silae, df_mapping_rh)
+    df_split = load_split_ca_cogs(cfg.FOLDERS["revenue_cogs"], periode)
+    rh       = rh if rh is not None else charger_rh(periode, cfg)
 
-    # 06 — CAPEX cash milestones
-    capex_decaisses = run_capex(period=periode)
+    # 06 — CAPEX milestones : additions (décaissés + masse salariale capitalisée) et amortissements
+    capex = run_capex(period=periode, capex_file=cfg.CAPEX_FILE, df_capex_rh=rh["df_capex_rh"],
+                      projets_file=cfg.CAPEX_PROJETS_FILE, cache_folder=cache, cfg=cfg)
 
     # 07 — IFRS 16
-    ifrs16 = run_ifrs16(df_fec=df, period=periode)
+    ifrs16 = run_ifrs16(df_fec=entrees["df"], period=periode, loyers=entrees["loyers"],
+                        registre_file=cfg.IFRS16_REGISTRE_FILE, cfg=cfg)
+    mesurer(budget, "05–07 BU, CAPEX, IFRS 16")
+    if budget is not None:
+        entrees["df"] = entrees["df_mois"] = None
+
+    # Cache colonnaire des sorties de stages (drill-down : python fpa.py query)
+    # Dimension compte : comptes des FEC chargés (numéros et libellés retenus au stage 01) et du mapping
+    comptes = dimension_comptes(pd.concat([
+        libelles_comptes(cfg.ENTITES), referentiels["table_mappings"].reindex(columns=["Entite", "CompteNum"]),
+    ]))
 
-    # 08 — Output Excel
-    run_output(
+    sauver_tables(periode, {
+        "comptes"         : comptes,
+        "mappings"        : referentiels["table_mappings"],
+        "df_comptes"      : entrees["df_comptes"],
+        "df_mapped"       : df_mapped,
+        "df_alertes"      : df_alertes,
+        "df_pl_elimine"   : df_pl_elimine,
+        "df_pl_final"     : df_pl_final,
+        "df_bilan"        : entrees["df_bilan"],
+        "df_bilan_mapped" : df_bilan_mapped,
+        "recap_pl"        : recap_pl,
+        "recap_bs"        : recap_bs,
+        "interco_lignes"  : rapprochement["lignes"],
+        "interco_synthese": rapprochement["synthese"],
+        "df_opex_rh"      : rh["df_opex_rh"],
+        "df_capex_rh"     : rh["df_capex_rh"],
+        "df_ifrs16"       : ifrs16["df_ifrs16"],
+        "df_capex"        : capex["df_variation"],
+        "controles"       : entrees["controles"],
+    }, cache)
+    sauver_rapport(entrees["controles"], periode, output)
+    sauver_rapprochement(rapprochement, periode, output)
+
+    # Agrégats reportés par périmètre (API locale, packs) + empreinte des entrées
+    agregats = agregats_par_perimetre(df_pl_final, df_bilan_mapped, rh["df_opex_rh"], ifrs16, periode, capex, cfg)
+    sauver_tables(periode, agregats, cache)
+    publier_definitif(flash, agregats["pl_reporte"])
+    sauver_empreinte(periode, empreinte_entrees(periode, cfg.FOLDERS), cache)
+    cube = mettre_a_jour_cube(periode, agregats["pl_reporte"], cfg.ENTITES, cache)
+    # Budget / forecast : écarts réel vs prévu, tous périmètres et mois communs au cube d'un coup
+    previsionnel = run_previsionnel(periode, cube, cfg)
+    df_ecarts    = previsionnel["df_ecarts"] if previsionnel is not None else None
+    if df_ecarts is not None and not df_ecarts.empty:
+        sauver_tables(periode, {"df_ecarts": df_ecarts[df_ecarts["Periode"] == str(periode)]}, cache)
+    historique_interco = mettre_a_jour_historique(periode, referentiels["df_interco_pl"], referentiels["df_interco_bs"], cache)
+    # Historique compte × mois + version du mapping (retraitement sans rejouer les stages : fpa restate)
+    importer_cache(cache, sauf=[str(periode)])
+    version_mapping = enregistrer_version(referentiels["table_mappings"], f"clôture {periode}", cache)
+    historique_mouvements = mettre_a_jour_mouvements(periode, df_pl_elimine, entrees["df_bilan"], version_mapping, cache,
+                                                     entites=cfg.ENTITES)
+
+    # 07b — Tableau de flux : soldes N / N-1 relus dans l'historique, tous les mois d'un coup
+    flux = run_cash_flow(periode, historique_mouvements, entrees["df_comptes"], referentiels["table_mappings"], cache, cfg)
+    sauver_tables(periode, {"df_flux": flux["df_flux"][flux["df_flux"]["Periode"] == str(periode)]}, cache)
+
+    # 08 — Output Excel ; export Parquet / Arrow des sorties de stages écrit en parallèle (thread)
+    export = lancer_export({
+        "df_mapped"      : df_mapped,
+        "df_pl_final"    : df_pl_final,
+        "df_bilan_mapped": df_bilan_mapped,
+        "df_opex_rh"     : rh["df_opex_rh"],
+        "recap_pl"       : recap_pl,
+        "recap_bs"       : recap_bs,
+        "df_ifrs16"      : ifrs16["df_ifrs16"],
+    }, periode, output, cfg.EXPORT_FORMAT)
+    filepath = run_output(
         df_pl_final     = df_pl_final,
         df_pl_elimine   = df_pl_elimine,
         df_bilan_mapped = df_bilan_mapped,
-        df_opex_rh      = df_opex_rh,
+        df_opex_rh      = rh["df_opex_rh"],
         recap_pl        = recap_pl,
         recap_bs        = recap_bs,
         ifrs16          = ifrs16,
         periode         = periode,
-        output_folder   = FOLDERS["output"],
-    )
\ No newline at end of file
+        output_folder   = output,
+        df_drilldown    = lignes_vue(periode, drill_index, cache_folder=cache) if drilldown_sheet else None,
+        cube            = cube,
+        budget          = budget,
+        capex           = capex,
+        interco_historique = historique_interco,
+        flux            = flux,
+        agregats        = agregats,
+        df_ecarts       = df_ecarts,
+        cfg             = cfg,
+    )
+    attendre_export(export)
+
+    return {
+        "df_mapped"       : df_mapped,
+        "df_pl_elimine"   : df_pl_elimine,
+        "df_pl_final"     : df_pl_final,
+        "df_bilan_mapped" : df_bilan_mapped,
+        "recap_pl"        : recap_pl,
+        "recap_bs"        : recap_bs,
+        "rapprochement"   : rapprochement,
+        "ifrs16"          : ifrs16,
+        "capex"           : capex,
+        "flux"            : flux,
+        "filepath"        : filepath,
+        **rh,
+    }
+
+
+def cloturer(cfg=None, out_of_core=False, memoire_mb=OUT_OF_CORE_MEMORY_MB, drilldown_sheet=False, budget=None,
+             packs=False, flash=False):
+    """Clôture complète (stages 01–08, packs et instantanés flash en option) d'une configuration. Retourne le chemin du reporting."""
+    cfg          = cfg or config_defaut()
+    periode      = detect_periode(cfg.FOLDERS["fec"])
+    flash        = nouveau_flash(periode, cfg) if flash else None
+    referentiels = charger_referentiels(cfg)
+    entrees      = charger_ledger(periode, referentiels, out_of_core, memoire_mb, budget, cfg, flash)
+    resultats    = executer_aval(periode, referentiels, entrees, drilldown_sheet=drilldown_sheet, budget=budget, cfg=cfg,
+                                 flash=flash)
+    if packs:
+        run_packs(periode, cfg=cfg)
+    return resultats["filepath"]
+
+
+def _cloturer_groupe(cfg, memory_budget, options):
+    """Tâche du pool multi-groupes : budget mémoire propre au processus, erreurs renvoyées au parent."""
+    budget = nouveau_budget(memory_budget)
+    try:
+        return cfg.nom, cloturer(cfg, budget=budget, **options), None
+    except Exception as e:
+        return cfg.nom, None, f"{type(e).__name__} : {e}"
+
+
+def _cloturer_lot(configs, memory_budget, options):
+    """Configurations partageant un même cache : clôturées l'une après l'autre (tables par période communes)."""
+    return [_cloturer_groupe(cfg, memory_budget, options) for cfg in configs]
+
+
+def cloturer_groupes(configs, workers=None, memory_budget=None, **options):
+    """
+    Clôtures indépendantes (une par PipelineConfig) dans un pool de processus : chaque processus
+    garde ses imports et ses caches (taux résolus, échéanciers IFRS 16) d'une clôture à la suivante.
+    Les configurations d'un même dossier cache sont clôturées en séquence dans un même processus
+    (ledger et tables par période partagés) ; les tables communes à tous les mois (cube P&L,
+    historiques, additions CAPEX) sont de plus écrites sous verrou (ledger_store.verrou_cache).
+    Retourne {nom: chemin du reporting ou None si la clôture a échoué}.
+    """
+    lots = {}
+    for cfg in configs:
+        lots.setdefault(os.path.abspath(cfg.FOLDERS["cache"]), []).append(cfg)
+    workers = min(workers or os.cpu_count() or 1, len(lots))
+    log.info(f"\n[main] {len(configs)} clôture(s) — {workers} processus"
+             + (f", {len(lots)} cache(s) distinct(s)" if len(lots) < len(configs) else ""))
+
+    resultats = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_cloturer_lot, lot, memory_budget, options) for lot in lots.values()]
+        for future in as_completed(futures):
+            for nom, filepath, erreur in future.result():
+                resultats[nom] = filepath
+                if erreur is None:
+                    log.info(f"[main] ✅ {nom} : {filepath}")
+                else:
+                    log.error(f"[main] ❌ {nom} : {erreur}")
+    return resultats
+
+
+def main(argv=None, prog=None):
+    """Point d'entrée de `python main.py` et de `fpa run` (mêmes options). Retourne le code de sortie."""
+    parser = argparse.ArgumentParser(prog=prog, description="Pipeline FP&A Automation")
+    parser.add_argument("--out-of-core", action="store_true",
+                        help="Lecture des FEC par blocs (stages 01–04 et 07) pour les ledgers plus gros que la mémoire")
+    parser.add_argument("--memoire-mb", type=int, default=OUT_OF_CORE_MEMORY_MB,
+                        help=f"Plafond mémoire du mode out-of-core en Mo (défaut : {OUT_OF_CORE_MEMORY_MB})")
+    parser.add_argument("--drilldown-sheet", action="store_true",
+                        help="Ajoute au reporting l'onglet des lignes FEC, lié depuis 'Détail P&L FEC'")
+    parser.add_argument("--memory-budget", type=int, default=MEMORY_BUDGET_MB,
+                        help="Budget mémoire en Mo : variantes par blocs / en flux si nécessaire, arrêt propre sinon")
+    parser.add_argument("--packs", action="store_true",
+                        help="Génère aussi un classeur par entité et par groupe (pool de processus) + manifeste")
+    parser.add_argument("--config", action="append", default=[], metavar="FICHIER",
+                        help="Configuration TOML / YAML de la clôture ; répétée : une clôture par fichier, en parallèle")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Processus des clôtures multi-groupes (défaut : nombre de CPU)")
+    parser.add_argument("--flash", action="store_true",
+                        help="Instantanés CA / EBITDA / résultat par entité (JSON + CSV) dès le chargement de chaque FEC")
+    parser.add_argument("--log-niveau", default=LOG_NIVEAU, choices=["DEBUG", "INFO", "WARNING", "ERROR"],
+                        type=str.upper, help=f"Niveau du journal ; DEBUG : aperçus des DataFrames (défaut : {LOG_NIVEAU})")
+    parser.add_argument("--log-format", default=LOG_FORMAT, choices=["texte", "json"],
+                        help=f"Journal lisible ou un événement JSON par ligne (défaut : {LOG_FORMAT})")
+    args = parser.parse_args(argv)
+    configurer_journal(args.log_niveau, args.log_format)
+
+    configs = [charger_config(c) for c in args.config] or [config_defaut()]
+    options = dict(out_of_core=args.out_of_core, memoire_mb=args.memoire_mb,
+                   drilldown_sheet=args.drilldown_sheet, packs=args.packs, flash=args.flash)
+
+    if len(configs) > 1:
+        resultats = cloturer_groupes(configs, args.workers, args.memory_budget, **options)
+        return 0 if all(resultats.values()) else 1
+
+    budget = nouveau_budget(args.memory_budget)
+    try:
+        cloturer(configs[0], budget=budget, **options)
+    except MemoryError as e:
+        # BudgetMemoireDepasse (contrôle du budget) ou échec d'allocation : arrêt propre, sans trace
+        cause = str(e) if isinstance(e, BudgetMemoireDepasse) else "allocation mémoire impossible"
+        log.error(f"\n❌ Budget mémoire dépassé — {cause}")
+        synthese(budget)
+        return 3
+    synthese(budget)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
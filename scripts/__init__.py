@@ -0,0 +1 @@
+"""scripts — stages du pipeline FP&A et outils autour du cache (cf. README)."""
@@ -0,0 +1,152 @@
+"""
+api.py — API HTTP locale (P&L, Bilan, split BU par périmètre)
+---------------------------------------------------------------
+Sert les agrégats précalculés par le pipeline (output_08.agregats_par_perimetre, mis en
+cache dans data/cache/YYYYMM/) : aucune agrégation du ledger à la requête, seulement un
+filtre sur le périmètre. Serveur http.server de la bibliothèque standard, local uniquement.
+
+Routes (GET) :
+  /periodes                               → périodes disponibles
+  /perimetres                             → entités et groupes (REPORTING_GROUPS)
+  /pl?perimetre=PID&periode=202403        → P&L reporté (lignes PL_STRUCTURE + détails)
+  /bilan?perimetre=Consolidé              → Bilan reporté par Mapping_BS_detail
+  /bu?perimetre=CELSIUS                   → masse salariale OPEX par BU
+
+Formats : JSON par défaut ; Arrow IPC stream avec `?format=arrow` ou
+`Accept: application/vnd.apache.arrow.stream`.
+
+Cache HTTP : ETag = empreinte des tables servies (ledger_store.empreinte_tables : pl_reporte,
+bilan_reporte, bu_reporte en cache) + route + paramètres. `If-None-Match` identique → 304 sans
+corps. Les tables sont gardées en mémoire tant que cette empreinte ne change pas : tout run qui
+les réécrit les invalide, même si seule la configuration (groupes, participations…) a changé.
+"""
+
+import hashlib
+import json
+import os
+import sys
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import FOLDERS, API_HOST, API_PORT, REPORTING_GROUPS
+from scripts.ledger_store import charger_table, empreinte_tables, periodes_en_cache
+from scripts.output_08 import perimetres
+from scripts.pipeline_config import config_defaut
+from scripts.journal import journal
+
+log = journal(__name__)
+
+
+ROUTES = {
+    "/pl"   : "pl_reporte",
+    "/bilan": "bilan_reporte",
+    "/bu"   : "bu_reporte",
+}
+MIME_ARROW = "application/vnd.apache.arrow.stream"
+
+_tables = {}   # {(cache, periode, empreinte): {nom: DataFrame}}
+
+
+def _charger(periode, empreinte, cache_folder=FOLDERS["cache"]):
+    cle = (str(cache_folder), periode, empreinte)
+    if cle not in _tables:
+        for ancienne in [c for c in _tables if c[:2] == cle[:2]]:
+            del _tables[ancienne]
+        _tables[cle] = {nom: charger_table(periode, nom, cache_folder) for nom in ROUTES.values()}
+    return _tables[cle]
+
+
+def _json(obj):
+    return json.dumps(obj, ensure_ascii=False, default=str).encode("utf-8")
+
+
+def _arrow(df):
+    import pyarrow as pa
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    sink  = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def repondre(url, headers=None, cache_folder=FOLDERS["cache"], groupes=REPORTING_GROUPS):
+    """
+    Traite une requête GET sans socket (utilisable directement comme client local de test).
+    Retourne (status, en-têtes, corps).
+    """
+    headers  = headers or {}
+    parties  = urlsplit(url)
+    params   = {k: v[-1] for k, v in parse_qs(parties.query).items()}
+    periodes = periodes_en_cache(cache_folder)
+
+    if parties.path == "/periodes":
+        return 200, {"Content-Type": "application/json"}, _json(periodes)
+    if parties.path == "/perimetres":
+        return 200, {"Content-Type": "application/json"}, _json(perimetres(groupes))
+    if parties.path not in ROUTES:
+        return 404, {"Content-Type": "application/json"}, _json({"erreur": f"route inconnue : {parties.path}"})
+
+    periode = params.get("periode") or (periodes[-1] if periodes else None)
+    if periode not in periodes:
+        return 404, {"Content-Type": "application/json"}, _json({"erreur": f"période non disponible : {periode}"})
+
+    perimetre = params.get("perimetre", "Consolidé")
+    if perimetre not in perimetres(groupes):
+        return 404, {"Content-Type": "application/json"}, _json({"erreur": f"périmètre inconnu : {perimetre}"})
+
+    arrow = params.get("format") == "arrow" or MIME_ARROW in headers.get("Accept", "")
+    empreinte = empreinte_tables(periode, ROUTES.values(), cache_folder)
+    variante  = hashlib.sha1(f"{parties.path}|{periode}|{perimetre}|{arrow}".encode()).hexdigest()[:12]
+    etag      = f'"{empreinte[:20]}-{variante}"'
+
+    entetes = {"ETag": etag, "Cache-Control": "no-cache"}
+    if headers.get("If-None-Match") == etag:
+        return 304, entetes, b""
+
+    df = _charger(periode, empreinte, cache_folder)[ROUTES[parties.path]]
+    df = df[df["Perimetre"] == perimetre].drop(columns="Perimetre") if not df.empty else df
+
+    if arrow:
+        return 200, {**entetes, "Content-Type": MIME_ARROW}, _arrow(df)
+    corps = {"periode": periode, "perimetre": perimetre, "lignes": df.to_dict(orient="records")}
+    return 200, {**entetes, "Content-Type": "application/json; charset=utf-8"}, _json(corps)
+
+
+class _Handler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        try:
+            cfg = self.server.cfg
+            status, entetes, corps = repondre(self.path, dict(self.headers), cfg.FOLDERS["cache"], cfg.REPORTING_GROUPS)
+        except Exception as e:
+            status, entetes, corps = 500, {"Content-Type": "application/json"}, _json({"erreur": str(e)})
+
+        self.send_response(status)
+        for k, v in entetes.items():
+            self.send_header(k, v)
+        self.send_header("Content-Length", str(len(corps)))
+        self.end_headers()
+        self.wfile.write(corps)
+
+    def log_message(self, format, *args):
+        log.info(f"[api] {self.address_string()} {format % args}")
+
+
+def creer_serveur(host=API_HOST, port=API_PORT, cfg=None):
+    """`cfg` (pipeline_config) : cache servi et périmètres du groupe."""
+    serveur = ThreadingHTTPServer((host, port), _Handler)
+    serveur.cfg = cfg or config_defaut()
+    return serveur
+
+
+def run(host=API_HOST, port=API_PORT, cfg=None):
+    serveur = creer_serveur(host, port, cfg)
+    log.info(f"[api] Écoute sur http://{host}:{port} (Ctrl+C pour arrêter)")
+    try:
+        serveur.serve_forever()
+    except KeyboardInterrupt:
+        log.info("\n[api] Arrêt demandé")
+    finally:
+        serveur.server_close()
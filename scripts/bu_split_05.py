@@ -1,12 +1,13 @@
+import logging
 import pandas as pd
 import os
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from config import (
-    BU_MAPPING_PID, CELSIUS_B2C_BUS, CELSIUS_B2B_BUS,
-    LIGNES_PL_CA, LIGNES_PL_COGS
-)
+from scripts.pipeline_config import config_defaut
+from scripts.journal import journal, evenement, apercu
+
+log = journal(__name__)
 
 
 # ─────────────────────────────────────────────
@@ -27,14 +28,14 @@ def load_split_ca_cogs(revenue_cogs_folder, periode):
     target = pd.Timestamp(pd.to_datetime(periode, format='%Y%m'))
     df_long = df_long[df_long['Periode'] == target].copy()
 
-    print(f"\nSplit CA/COGS chargé pour {periode} :")
-    print(f"  Lignes : {len(df_long)}")
-    print(df_long.to_string(index=False))
+    log.info(f"\nSplit CA/COGS chargé pour {periode} :")
+    log.info(f"  Lignes : {len(df_long)}")
+    log.debug("%s", apercu(df_long))
     return df_long
 
 
 def load_silae(rh_folder, periode):
-    print(f"\nChargement Silae pour {periode}...")
+    log.info(f"\nChargement Silae pour {periode}...")
     dfs = []
 
     for f in os.listdir(rh_folder):
@@ -49,10 +50,10 @@ def load_silae(rh_folder, periode):
             df['Cout_global'] = pd.to_numeric(df['Cout_global'], errors='coerce').fillna(0)
             df['Entite']     = entite
             dfs.append(df)
-            print(f"  {entite} : {len(df)} salariés chargés")
+            log.info(f"  {entite} : {len(df)} salariés chargés")
 
     df_silae = pd.concat(dfs, ignore_index=True) if dfs else pd.DataFrame()
-    print(f"  Total : {len(df_silae)} salariés")
+    log.info(f"  Total : {len(df_silae)} salariés")
     return df_silae
 
 
@@ -60,7 +61,7 @@ def load_mapping_rh(mapping_folder):
     filepath = os.path.join(mapping_folder, 'mapping_rh.xlsx')
     df = pd.read_excel(filepath, header=0)
     df['Matricule'] = df['Matricule'].astype(str).str.strip().str.replace(r'\.0$', '', regex=True)
-    print(f"\nMapping RH chargé : {len(df)} salariés")
+    log.info(f"\nMapping RH chargé : {len(df)} salariés")
     return df
 
 
@@ -68,8 +69,9 @@ def load_mapping_rh(mapping_folder):
 # SPLIT CA / COGS
 # ─────────────────────────────────────────────
 
-def split_ca_cogs(df_pl_final, df_split, type_flux):
-    lignes_pl = LIGNES_PL_CA if type_flux == 'CA' else LIGNES_PL_COGS
+def split_ca_cogs(df_pl_final, df_split, type_flux, cfg=None):
+    cfg       = cfg or config_defaut()
+    lignes_pl = cfg.LIGNES_PL_CA if type_flux == 'CA' else cfg.LIGNES_PL_COGS
     df_flux   = df_split[df_split['Type'] == type_flux].copy()
     resultats = []
 
@@ -84,13 +86,13 @@ def split_ca_cogs(df_pl_final, df_split, type_flux):
             (df_pl_final['Mapping_PL'].isin(lignes_pl))
         ]['Mouvement'].sum()
 
-        print(f"\n  {entite} {type_flux} : compta={total_compta:,.2f} | fichier={total_fichier:,.2f}")
+        log.info(f"\n  {entite} {type_flux} : compta={total_compta:,.2f} | fichier={total_fichier:,.2f}")
 
         for _, row in df_ent.iterrows():
             bu       = row['BU']
-            bu_final = BU_MAPPING_PID.get(bu, bu)
+            bu_final = cfg.BU_MAPPING_PID.get(bu, bu)
             pct      = row['Montant'] / total_fichier
-            print(f"    {bu} → {bu_final} : {pct:.1%} → {total_compta * pct:,.2f}")
+            log.debug(f"    {bu} → {bu_final} : {pct:.1%} → {total_compta * pct:,.2f}")
             resultats.append({
                 'Entite'    : entite,
                 'BU'        : bu_final,
@@ -107,24 +109,26 @@ def split_ca_cogs(df_pl_final, df_split, type_flux):
     )
 
 
-def split_celsius_ca(df_pl_final, df_split):
+def split_celsius_ca(df_pl_final, df_split, cfg=None):
+    cfg        = cfg or config_defaut()
+    b2c, b2b   = cfg.CELSIUS_B2C_BUS, cfg.CELSIUS_B2B_BUS
     df_celsius = df_split[(df_split['Entite'] == 'CELSIUS') & (df_split['Type'] == 'CA')].copy()
 
     ca_b2c = df_pl_final[(df_pl_final['Entite'] == 'CELSIUS') & (df_pl_final['Mapping_PL'] == 'B2C Revenue')]['Mouvement'].sum()
     ca_b2b = df_pl_final[(df_pl_final['Entite'] == 'CELSIUS') & (df_pl_final['Mapping_PL'] == 'B2B Revenue')]['Mouvement'].sum()
 
-    total_b2c = df_celsius[df_celsius['BU'].isin(CELSIUS_B2C_BUS)]['Montant'].sum()
-    total_b2b = df_celsius[df_celsius['BU'].isin(CELSIUS_B2B_BUS)]['Montant'].sum()
+    total_b2c = df_celsius[df_celsius['BU'].isin(b2c)]['Montant'].sum()
+    total_b2b = df_celsius[df_celsius['BU'].isin(b2b)]['Montant'].sum()
 
     resultats = []
 
-    for _, row in df_celsius[df_celsius['BU'].isin(CELSIUS_B2C_BUS)].iterrows():
+    for _, row in df_celsius[df_celsius['BU'].isin(b2c)].iterrows():
         pct = row['Montant'] / total_b2c if total_b2c != 0 else 0
         resultats.append({'Entite': 'CELSIUS', 'BU': row['BU'], 'Mapping_PL': 'B2C Revenue', 'Mouvement': ca_b2c * pct})
 
     resultats.append({'Entite': 'CELSIUS', 'BU': 'Total B2C', 'Mapping_PL': 'B2C Revenue', 'Mouvement': ca_b2c})
 
-    for _, row in df_celsius[df_celsius['BU'].isin(CELSIUS_B2B_BUS)].iterrows():
+    for _, row in df_celsius[df_celsius['BU'].isin(b2b)].iterrows():
         pct = row['Montant'] / total_b2b if total_b2b != 0 else 0
         resultats.append({'Entite': 'CELSIUS', 'BU': row['BU'], 'Mapping_PL': 'B2B Revenue', 'Mouvement': ca_b2b * pct})
 
@@ -136,7 +140,7 @@ def split_celsius_ca(df_pl_final, df_split):
 # ─────────────────────────────────────────────
 
 def split_masse_salariale(df_silae, df_mapping_rh):
-    print("\nSplit masse salariale...")
+    log.info("\nSplit masse salariale...")
 
     df = df_silae.merge(
         df_mapping_rh[['Matricule', 'BU', 'Type', 'IFRS', 'CAPEX %', 'OPEX %']],
@@ -145,8 +149,9 @@ def split_masse_salariale(df_silae, df_mapping_rh):
 
     non_mappes = df[df['BU'].isna()]
     if not non_mappes.empty:
-        print(f"  ⚠️  {len(non_mappes)} salarié(s) non mappé(s) :")
-        print(non_mappes[['Matricule', 'Salarie', 'Entite']].to_string(index=False))
+        evenement(log, logging.WARNING, "rh.non_mappes", f"  ⚠️  {len(non_mappes)} salarié(s) non mappé(s)",
+                  salaries=len(non_mappes))
+        log.debug("%s", apercu(non_mappes, ['Matricule', 'Salarie', 'Entite']))
 
     df = df[df['BU'].notna()].copy()
     df['CAPEX %']    = pd.to_numeric(df['CAPEX %'], errors='coerce').fillna(0)
@@ -159,10 +164,11 @@ def split_masse_salariale(df_silae, df_mapping_rh):
 
     df_capex = df.groupby(['Entite', 'BU'], as_index=False).agg(Montant_CAPEX=('Cout_CAPEX', 'sum'))
 
-    print(f"\n  OPEX masse salariale par BU :")
-    print(df_opex.to_string(index=False))
-    print(f"\n  CAPEX masse salariale par BU :")
-    print(df_capex.to_string(index=False))
+    evenement(log, logging.INFO, "rh.split",
+              f"  OPEX : {df_opex['Mouvement'].sum():,.2f} | CAPEX : {df_capex['Montant_CAPEX'].sum():,.2f}",
+              opex=round(float(df_opex['Mouvement'].sum()), 2), capex=round(float(df_capex['Montant_CAPEX'].sum()), 2))
+    log.debug("\n  OPEX masse salariale par BU :\n%s", apercu(df_opex))
+    log.debug("\n  CAPEX masse salariale par BU :\n%s", apercu(df_capex))
 
     return df_opex, df_capex
 
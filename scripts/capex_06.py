@@ -1,34 +1,258 @@
 """
-capex_06.py — CAPEX cash milestones
--------------------------------------
+capex_06.py — CAPEX milestones : immobilisation et amortissement
+------------------------------------------------------------------
+Logique :
+  - Additions du mois, par (Entité, Projet) :
+      · décaissés milestones (capex_decaisses.xlsx, cumulatif — relu seulement s'il change)
+      · masse salariale capitalisée (df_capex_rh de bu_split_05, par BU)
+  - Les additions sont persistées par période (data/cache/capex/additions.parquet) :
+    chaque clôture n'écrit que son mois, l'historique de la masse salariale capitalisée s'accumule
+  - Chaque addition mensuelle est une tranche amortie linéairement sur la durée du projet
+    (capex_projets.xlsx, défaut CAPEX_DUREE_AMORTISSEMENT_MOIS) à partir du mois d'addition
+    ou de la mise en service si elle est postérieure
+  - Tableau de variation des immobilisations calculé pour tous les projets et tous les mois
+    d'un coup (matrices tranches × mois) : Brut, Additions, Dotation, Amortissements cumulés, VNC
+
 Inputs :
-  - period     : str au format 'YYYYMM' (période de clôture courante)
-  - capex_file : chemin vers le fichier décaissés (défaut : config.CAPEX_FILE)
+  - period       : str au format 'YYYYMM' (période de clôture courante)
+  - df_capex_rh  : masse salariale capitalisée par (Entite, BU) — optionnel
+  - capex_file   : chemin vers le fichier décaissés (défaut : config.CAPEX_FILE)
+  - projets_file : registre des projets (défaut : config.CAPEX_PROJETS_FILE), optionnel
+    Format : Projet | Entite | Duree_mois | Mise_en_service
 
 Output :
-  - float : CAPEX décaissés du mois courant
+  - dict avec clés :
+      'decaisses'       : float — décaissés milestones du mois (toutes entités)
+      'par_entite'      : {entité: {'decaisses', 'capitalise_rh', 'dotation', 'vnc'}}
+      'df_variation'    : DataFrame — tableau de variation du mois par (Entite, Projet)
 """
 
+import hashlib
+import logging
+import numpy as np
 import pandas as pd
 from pathlib import Path
 import os
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from config import CAPEX_FILE, CAPEX_COL_PERIOD, CAPEX_COL_AMOUNT
+from config import (
+    CAPEX_FILE, CAPEX_PROJETS_FILE, CAPEX_DUREE_AMORTISSEMENT_MOIS, FOLDERS,
+)
+from scripts.pipeline_config import config_defaut
+from scripts.ledger_store import empreinte_fichiers, table_derivee, verrou_cache
+from scripts.journal import journal, evenement
+
+log = journal(__name__)
+
+
+COLONNES_ADDITIONS = ["Periode", "Entite", "Projet", "Source", "Montant"]
+COLONNES_VARIATION = ["Entite", "Projet", "Periode", "Brut_ouverture", "Additions", "Brut_cloture",
+                      "Dotation", "Amort_cumules", "VNC"]
+SOURCE_MILESTONE   = "Milestone"
+SOURCE_RH          = "Masse salariale"
+
+
+def _dossier(cache_folder):
+    return Path(cache_folder) / "capex"
+
+
+# ── Additions ─────────────────────────────────────────────────────────────────
+
+def load_decaissements(capex_file=CAPEX_FILE, cfg=None):
+    """Décaissés milestones de toutes les périodes → additions (Source = Milestone)."""
+    cfg = cfg or config_defaut()
+    col_periode, col_entite, col_projet = cfg.CAPEX_COL_PERIOD, cfg.CAPEX_COL_ENTITE, cfg.CAPEX_COL_PROJET
+    df = pd.read_excel(capex_file, dtype={col_periode: str})
+    df[col_periode] = df[col_periode].astype(str).str.strip()
+    return pd.DataFrame({
+        "Periode": df[col_periode],
+        "Entite" : df[col_entite].astype(str).str.strip() if col_entite in df else cfg.CAPEX_ENTITE_DEFAUT,
+        "Projet" : df[col_projet].astype(str).str.strip() if col_projet in df else cfg.CAPEX_PROJET_DEFAUT,
+        "Source" : SOURCE_MILESTONE,
+        "Montant": pd.to_numeric(df[cfg.CAPEX_COL_AMOUNT], errors="coerce").fillna(0.0),
+    })
+
+
+def mettre_a_jour_additions(period, capex_file=CAPEX_FILE, df_capex_rh=None, cache_folder=FOLDERS["cache"], cfg=None):
+    """
+    Additions persistées : les milestones sont remplacés quand le fichier décaissés change,
+    la masse salariale capitalisée du mois remplace celle déjà enregistrée pour la période.
+    """
+    cfg     = cfg or config_defaut()
+    dossier = _dossier(cache_folder)
+    chemin  = dossier / "additions.parquet"
+    with verrou_cache("capex_additions", cache_folder):
+        additions = pd.read_parquet(chemin) if chemin.exists() else pd.DataFrame(columns=COLONNES_ADDITIONS)
+
+        # Fichier décaissés cumulatif : relu seulement si son contenu a changé depuis le dernier run
+        marqueur  = dossier / "decaisses.empreinte"
+        empreinte = empreinte_fichiers(capex_file)
+        if Path(capex_file).exists() and (not marqueur.exists() or marqueur.read_text() != empreinte):
+            additions = pd.concat([additions[additions["Source"] != SOURCE_MILESTONE], load_decaissements(capex_file, cfg)],
+                                  ignore_index=True)
+            dossier.mkdir(parents=True, exist_ok=True)
+            marqueur.write_text(empreinte)
+
+        if df_capex_rh is not None:
+            # Seule la masse salariale des entités de la clôture est remplacée (cache partagé entre groupes)
+            rh = df_capex_rh[df_capex_rh["Montant_CAPEX"] != 0]
+            remplacees = ((additions["Source"] == SOURCE_RH) & (additions["Periode"] == str(period))
+                          & additions["Entite"].isin(cfg.ENTITES))
+            additions = pd.concat([
+                additions[~remplacees],
+                pd.DataFrame({"Periode": str(period), "Entite": rh["Entite"].to_numpy(), "Projet": rh["BU"].to_numpy(),
+                              "Source": SOURCE_RH, "Montant": rh["Montant_CAPEX"].to_numpy()}),
+            ], ignore_index=True)
+
+        additions = additions[COLONNES_ADDITIONS].astype({"Montant": float})
+        additions = additions.sort_values(["Periode", "Entite", "Projet", "Source"]).reset_index(drop=True)
+        dossier.mkdir(parents=True, exist_ok=True)
+        additions.to_parquet(chemin, index=False)
+    return additions
+
+
+def load_projets(projets_file=CAPEX_PROJETS_FILE):
+    """Registre optionnel des projets : durée d'amortissement et date de mise en service."""
+    if not Path(projets_file).exists():
+        return pd.DataFrame(columns=["Projet", "Entite", "Duree_mois", "Mise_en_service"])
+    df = pd.read_excel(projets_file, dtype={"Projet": str, "Entite": str})
+    if "Mise_en_service" not in df:
+        df["Mise_en_service"] = pd.NaT
+    df["Mise_en_service"] = pd.to_datetime(df["Mise_en_service"])
+    return df
+
+
+# ── Moteur d'amortissement ────────────────────────────────────────────────────
+
+def _rang_mois(periodes):
+    p = pd.Series(periodes, dtype=str)
+    return p.str[:4].astype(int).to_numpy() * 12 + p.str[4:6].astype(int).to_numpy() - 1
+
+
+def calculer_variation(additions, projets, duree_defaut=CAPEX_DUREE_AMORTISSEMENT_MOIS):
+    """
+    Tableau de variation des immobilisations pour tous les (Entite, Projet) et tous les mois.
+    Chaque addition mensuelle est une tranche ; dotations = matrice tranches × mois.
+    """
+    if additions.empty:
+        return pd.DataFrame(columns=COLONNES_VARIATION)
+
+    tranches = additions.groupby(["Entite", "Projet", "Periode"], as_index=False)["Montant"].sum()
+    tranches = tranches.merge(
+        projets[["Projet", "Entite", "Duree_mois", "Mise_en_service"]].drop_duplicates(["Projet", "Entite"]),
+        on=["Projet", "Entite"], how="left",
+    )
+    duree = tranches["Duree_mois"].fillna(duree_defaut).astype(int).to_numpy()
+    rang  = _rang_mois(tranches["Periode"])
+    mes   = pd.to_datetime(tranches["Mise_en_service"])
+    rang_mes = (mes.dt.year * 12 + mes.dt.month - 1).fillna(-1).astype(int).to_numpy()
+    debut = np.maximum(rang, rang_mes)
+
+    mois = np.arange(rang.min(), max(debut.max() + duree.max(), rang.max() + 1))
+    k    = mois[None, :] - debut[:, None]
+    dotations = np.where((k >= 0) & (k < duree[:, None]), (tranches["Montant"].to_numpy() / duree)[:, None], 0.0)
+    ajouts    = np.where(mois[None, :] == rang[:, None], tranches["Montant"].to_numpy()[:, None], 0.0)
+
+    # Agrégation des tranches par projet (np.add.at sur les codes projet)
+    codes, cles = pd.factorize(pd.MultiIndex.from_frame(tranches[["Entite", "Projet"]]))
+    dot_projet = np.zeros((len(cles), len(mois)))
+    add_projet = np.zeros((len(cles), len(mois)))
+    np.add.at(dot_projet, codes, dotations)
+    np.add.at(add_projet, codes, ajouts)
+
+    brut_cloture  = np.cumsum(add_projet, axis=1)
+    amort_cumules = np.cumsum(dot_projet, axis=1)
+    vnc           = brut_cloture - amort_cumules
+
+    # Format long, limité aux mois où le projet a un mouvement ou un solde (contre-passations comprises)
+    actif = (np.abs(brut_cloture) > 1e-6) | (add_projet != 0) | (dot_projet != 0) | (np.abs(amort_cumules) > 1e-6)
+    p, t  = np.nonzero(actif)
+    m = mois[t]
+    return pd.DataFrame({
+        "Entite"        : cles.get_level_values(0)[p],
+        "Projet"        : cles.get_level_values(1)[p],
+        "Periode"       : [f"{a}{b:02d}" for a, b in zip(m // 12, m % 12 + 1)],
+        "Brut_ouverture": brut_cloture[p, t] - add_projet[p, t],
+        "Additions"     : add_projet[p, t],
+        "Brut_cloture"  : brut_cloture[p, t],
+        "Dotation"      : dot_projet[p, t],
+        "Amort_cumules" : amort_cumules[p, t],
+        "VNC"           : np.where(np.abs(vnc[p, t]) < 1e-6, 0.0, vnc[p, t]),
+    })
+
+
+def get_variation(additions, projets_file=CAPEX_PROJETS_FILE, cache_folder=FOLDERS["cache"],
+                  duree_defaut=CAPEX_DUREE_AMORTISSEMENT_MOIS):
+    """Tableau de variation persisté, recalculé seulement si les additions, les projets ou la durée par défaut changent."""
+    h = hashlib.sha256(additions.to_csv(index=False).encode())
+    h.update(empreinte_fichiers(projets_file).encode())
+    h.update(f"duree={duree_defaut}".encode())
+
+    variation, origine = table_derivee(
+        "capex", "variation", h.hexdigest()[:16],
+        lambda: calculer_variation(additions, load_projets(projets_file), duree_defaut), cache_folder,
+    )
+    if origine == "calcul":
+        log.info(f"[capex_06] Tableau de variation calculé : {variation.groupby(['Entite', 'Projet']).ngroups} projets, "
+                 f"{variation['Periode'].nunique()} mois")
+    return variation
+
+
+# ── Point d'entrée ────────────────────────────────────────────────────────────
+
+def run(period: str, capex_file: str = CAPEX_FILE, df_capex_rh: pd.DataFrame = None,
+        projets_file: str = CAPEX_PROJETS_FILE, cache_folder: str = FOLDERS["cache"], cfg=None) -> dict:
+    """`cfg` (pipeline_config) : format du fichier décaissés, entité / projet / durée par défaut."""
+    cfg = cfg or config_defaut()
+    # Additions persistées de tous les groupes : la clôture ne retient que ses entités
+    additions = mettre_a_jour_additions(period, capex_file, df_capex_rh, cache_folder, cfg)
+    additions = additions[additions["Entite"].isin(cfg.ENTITES)].reset_index(drop=True)
+    variation = get_variation(additions, projets_file, cache_folder, cfg.CAPEX_DUREE_AMORTISSEMENT_MOIS)
+
+    du_mois      = additions[additions["Periode"] == str(period)]
+    df_variation = variation[variation["Periode"] == str(period)].reset_index(drop=True)
+
+    decaisses = du_mois[du_mois["Source"] == SOURCE_MILESTONE].groupby("Entite")["Montant"].sum()
+    rh        = du_mois[du_mois["Source"] == SOURCE_RH].groupby("Entite")["Montant"].sum()
+    mois      = df_variation.groupby("Entite")[["Dotation", "VNC"]].sum()
+
+    entites = sorted(set(decaisses.index) | set(rh.index) | set(mois.index))
+    par_entite = {
+        e: {
+            "decaisses"    : round(float(decaisses.get(e, 0.0)), 2),
+            "capitalise_rh": round(float(rh.get(e, 0.0)), 2),
+            "dotation"     : round(float(mois["Dotation"].get(e, 0.0)), 2),
+            "vnc"          : round(float(mois["VNC"].get(e, 0.0)), 2),
+        }
+        for e in entites
+    }
+
+    total = round(float(decaisses.sum()), 2)
+    if decaisses.empty:
+        log.warning(f"[capex_06] ⚠️  Période {period} absente du fichier — montant = 0")
+    evenement(log, logging.INFO, "capex.decaisses", f"[capex_06] CAPEX décaissés {period} : {total:>12,.2f} €",
+              periode=str(period), decaisses=total)
+    for e, v in par_entite.items():
+        evenement(log, logging.INFO, "capex.entite",
+                  f"[capex_06] {e} — Capitalisé RH : {v['capitalise_rh']:>10,.2f} € | D&A milestones : "
+                  f"{-v['dotation']:>10,.2f} € | VNC : {v['vnc']:>12,.2f} €", entite=e, **v)
 
+    return {
+        "decaisses"   : total,
+        "par_entite"  : par_entite,
+        "df_variation": df_variation,
+    }
 
-def run(period: str, capex_file: str = CAPEX_FILE) -> float:
-    """Lit le fichier cumulatif et retourne le décaissé du mois courant."""
-    df = pd.read_excel(capex_file, dtype={CAPEX_COL_PERIOD: str})
-    df[CAPEX_COL_PERIOD] = df[CAPEX_COL_PERIOD].astype(str).str.strip()
 
-    row = df[df[CAPEX_COL_PERIOD] == str(period)]
+if __name__ == "__main__":
+    from scripts.fec_fichiers import detect_periode
+    from scripts.bu_split_05 import load_silae, load_mapping_rh, split_masse_salariale
 
-    if row.empty:
-        print(f"[capex_06] ⚠️  Période {period} absente du fichier — montant = 0")
-        return 0.0
+    # Masse salariale capitalisée incluse : les additions persistées du mois restent complètes
+    periode        = detect_periode(FOLDERS["fec"])
+    _, df_capex_rh = split_masse_salariale(load_silae(FOLDERS["rh"], periode), load_mapping_rh(FOLDERS["mapping"]))
+    result         = run(periode, df_capex_rh=df_capex_rh)
 
-    capex_decaisses = round(float(row[CAPEX_COL_AMOUNT].iloc[0]), 2)
-    print(f"[capex_06] CAPEX décaissés {period} : {capex_decaisses:>12,.2f} €")
-    return capex_decaisses
\ No newline at end of file
+    print("\nVariation CAPEX :")
+    print(result["df_variation"].to_string(index=False))
@@ -0,0 +1,300 @@
+"""
+cash_flow_07b.py — Tableau de flux de trésorerie consolidé (méthode indirecte)
+--------------------------------------------------------------------------------
+Logique :
+  - Variations de bilan entre deux états successifs : soldes de clôture de N et de N-1 par compte
+    (get_soldes_bilan), relus dans l'historique compte × mois persisté à chaque clôture
+    (mapping_historique, Vue BS) — le ledger n'est pas re-sommé pour N-1
+  - Solde d'ouverture d'un mois :
+      · clôture du mois précédent si elle est dans l'historique et du même exercice
+      · sinon (premier mois de l'exercice, mois précédent non clôturé) : ouverture reconstituée
+        = solde de clôture - mouvements du mois hors à-nouveaux (df_comptes) ; en début
+        d'exercice, les à-nouveaux (affectation du résultat) ne sont pas des flux
+      · écart de conversion d'une entité convertie : sans mouvement dans le ledger, son
+        mouvement du mois est l'opposé de la somme convertie des mouvements du mois (le CTA
+        solde le bilan converti) — ouverture = CTA à la fin du mois précédent, mêmes taux
+  - Variations calculées pour toutes les entités et tous les mois de l'historique d'un coup
+    (jointure clôture × ouverture, puis mapping Mapping_BS_category → section, FLUX_SECTIONS_BS)
+  - Flux = - variation du solde (un actif qui augmente consomme de la trésorerie) :
+      · Exploitation   : résultat net du mois (comptes 6/7, avant éliminations, df_comptes),
+                         dotations réintégrées (FLUX_CATEGORIES_DA), variations du BFR
+      · Investissement : variations des immobilisations, dotations reclassées (le net des
+                         catégories d'immobilisations inclut les amortissements cumulés)
+      · Financement    : capitaux propres, dettes financières
+      · Effet de change: variation de l'écart de conversion (COMPTE_ECART_CONVERSION)
+  - Contrôle : variation calculée vs variation des catégories FLUX_CATEGORIES_TRESORERIE,
+    écart au-delà de FLUX_SEUIL_CONTROLE signalé
+
+Inputs :
+  - periode        : str YYYYMM (période de clôture courante)
+  - historique     : historique compte × mois (mapping_historique.mettre_a_jour_mouvements)
+  - df_comptes     : mouvements du mois par compte (monthly_movements_02) — mois antérieurs relus en cache
+  - table_mappings : mapping PCG courant (ledger_store.mappings_en_table)
+
+Output :
+  - dict avec clés :
+      'df_flux'  : DataFrame Entite | Periode | Section | Ligne | Montant (tous les mois calculés)
+      'periodes' : mois pour lesquels le tableau a pu être établi
+"""
+
+import logging
+import pandas as pd
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import FOLDERS, CLASSES_BILAN, CLASSES_PL
+from scripts.comptes import masque_prefixes, encoder_comptes
+from scripts.pipeline_config import config_defaut
+from scripts.fx_translation_02b import entites_a_convertir
+from scripts.pl_cube import _decaler, fenetres_comparatifs
+from scripts.journal import journal, evenement
+
+log = journal(__name__)
+
+
+COLONNES_FLUX = ["Entite", "Periode", "Section", "Ligne", "Montant"]
+SECTIONS      = ["Exploitation", "Investissement", "Financement"]
+
+LIGNE_RESULTAT   = "Résultat net"
+LIGNE_DA         = "Dotations aux amortissements"
+LIGNE_DA_RECLASS = "Dotations reclassées"
+LIGNE_AUTRES     = "Autres variations de bilan"
+LIGNE_CHANGE     = "Effet de change"
+LIGNE_OUVERTURE  = "Trésorerie d'ouverture"
+LIGNE_CLOTURE    = "Trésorerie de clôture"
+LIGNE_PERIMETRE  = "Variation de périmètre"
+LIGNE_ECART      = "Écart de contrôle"
+
+
+def _mouvements_mensuels(periodes, periode, df_comptes, cache_folder):
+    """Mouvements par compte de chaque mois (mois courant en mémoire, antérieurs relus en cache)."""
+    from scripts.ledger_store import lister_tables, charger_table
+
+    parts = [df_comptes[["Entite", "CompteNum", "CompteId", "Mouvement"]].assign(Periode=str(periode))]
+    for p in periodes:
+        if p == str(periode) or "df_comptes" not in lister_tables(p, cache_folder):
+            continue
+        df = charger_table(p, "df_comptes", cache_folder)
+        if "CompteId" not in df:   # Cache antérieur à la dimension compte
+            df = df.assign(CompteId=encoder_comptes(df["CompteNum"]))
+        parts.append(df[["Entite", "CompteNum", "CompteId", "Mouvement"]].assign(Periode=p))
+    return pd.concat(parts, ignore_index=True)
+
+
+def mouvements_conversion(mouvements, cfg):
+    """
+    Mouvement du mois de l'écart de conversion (COMPTE_ECART_CONVERSION) des entités converties :
+    opposé de la somme convertie de tous les mouvements du mois, équilibrée en devise locale.
+    """
+    convertis = mouvements[mouvements["Entite"].isin(entites_a_convertir(mouvements["Entite"].unique(), cfg))]
+    cta = convertis.groupby(["Entite", "Periode"], as_index=False)["Mouvement"].sum()
+    return cta.assign(CompteNum=cfg.COMPTE_ECART_CONVERSION, Mouvement=-cta["Mouvement"])
+
+
+def soldes_ouverture(clotures, mouvements, cfg):
+    """
+    Solde d'ouverture par (Entite, CompteNum, Periode) de chaque mois de `clotures` : clôture du mois
+    précédent si disponible dans le même exercice, sinon clôture - mouvements du mois (écart de
+    conversion compris, cf. mouvements_conversion).
+    """
+    premier_mois = cfg.EXERCICE_PREMIER_MOIS
+    periodes  = sorted(clotures["Periode"].unique())
+    suivant   = {p: _decaler(p, 1) for p in periodes}
+    chainees  = {p for p in periodes
+                 if int(p[4:]) != premier_mois and _decaler(p, -1) in suivant}
+
+    # Clôture N-1 ré-étiquetée N : une seule jointure pour tous les mois chaînés
+    precedentes = clotures.assign(Periode=clotures["Periode"].map(suivant))
+    precedentes = precedentes[precedentes["Periode"].isin(chainees)]
+
+    # Ouverture reconstituée des autres mois (premier mois d'exercice, mois précédent absent)
+    a_reconstituer = clotures[~clotures["Periode"].isin(chainees)]
+    du_mois = mouvements[mouvements["Periode"].isin(a_reconstituer["Periode"].unique())]
+    mvts = pd.concat([du_mois[masque_prefixes(du_mois["CompteId"], CLASSES_BILAN)], mouvements_conversion(du_mois, cfg)])
+    mvts = mvts.groupby(["Entite", "CompteNum", "Periode"], as_index=False)["Mouvement"].sum()
+    reconstituees = (
+        a_reconstituer.merge(mvts,
+                             on=["Entite", "CompteNum", "Periode"], how="outer")
+        .fillna({"Solde": 0.0, "Mouvement": 0.0})
+    )
+    reconstituees["Solde"] = reconstituees["Solde"] - reconstituees["Mouvement"]
+
+    return pd.concat([precedentes, reconstituees[["Entite", "CompteNum", "Periode", "Solde"]]], ignore_index=True)
+
+
+def variations_bilan(clotures, ouvertures, table_mappings):
+    """Variation de chaque compte de bilan par mois, avec sa catégorie / son détail de mapping."""
+    variations = clotures.merge(ouvertures, on=["Entite", "CompteNum", "Periode"], how="outer",
+                                suffixes=("", "_ouverture")).fillna({"Solde": 0.0, "Solde_ouverture": 0.0})
+    variations["Variation"] = variations["Solde"] - variations["Solde_ouverture"]
+    return variations.merge(
+        table_mappings[["Entite", "CompteNum", "Mapping_BS_category", "Mapping_BS_detail"]],
+        on=["Entite", "CompteNum"], how="left",
+    )
+
+
+def calculer_flux(clotures, mouvements, table_mappings, cfg):
+    """Tableau de flux (COLONNES_FLUX) de tous les mois de `clotures`, toutes entités."""
+    ouvertures = soldes_ouverture(clotures, mouvements, cfg)
+    variations = variations_bilan(clotures, ouvertures, table_mappings)
+
+    categorie  = variations["Mapping_BS_category"]
+    tresorerie = categorie.isin(cfg.FLUX_CATEGORIES_TRESORERIE)
+    change     = variations["CompteNum"] == cfg.COMPTE_ECART_CONVERSION
+    section    = categorie.map(cfg.FLUX_SECTIONS_BS).fillna("Exploitation")
+    ligne      = variations["Mapping_BS_detail"].where(categorie.isin(list(cfg.FLUX_SECTIONS_BS))).fillna(LIGNE_AUTRES)
+
+    flux_bilan = pd.DataFrame({
+        "Entite" : variations["Entite"],
+        "Periode": variations["Periode"],
+        "Section": section.where(~change, LIGNE_CHANGE),
+        "Ligne"  : ligne.where(~change, LIGNE_CHANGE),
+        "Montant": -variations["Variation"],
+    })[~tresorerie]
+
+    stocks = pd.concat([
+        variations[tresorerie].assign(Ligne=LIGNE_OUVERTURE, Montant=variations["Solde_ouverture"]),
+        variations[tresorerie].assign(Ligne=LIGNE_CLOTURE, Montant=variations["Solde"]),
+    ]).assign(Section="Trésorerie")
+
+    # Résultat net et dotations du mois (mouvements avant éliminations : cohérents avec les soldes)
+    pl = mouvements[masque_prefixes(mouvements["CompteId"], CLASSES_PL)].merge(
+        table_mappings[["Entite", "CompteNum", "Mapping_PL_category"]], on=["Entite", "CompteNum"], how="left")
+    da = pl[pl["Mapping_PL_category"].isin(cfg.FLUX_CATEGORIES_DA)]
+    resultat = pl.groupby(["Entite", "Periode"], as_index=False)["Mouvement"].sum()
+    dotations = da.groupby(["Entite", "Periode"], as_index=False)["Mouvement"].sum()
+    flux_pl = pd.concat([
+        resultat.assign(Section="Exploitation", Ligne=LIGNE_RESULTAT, Montant=-resultat["Mouvement"]),
+        dotations.assign(Section="Exploitation", Ligne=LIGNE_DA, Montant=dotations["Mouvement"]),
+        dotations.assign(Section="Investissement", Ligne=LIGNE_DA_RECLASS, Montant=-dotations["Mouvement"]),
+    ])
+    flux_pl = flux_pl[flux_pl["Periode"].isin(clotures["Periode"].unique())]
+
+    df_flux = (
+        pd.concat([flux_pl[COLONNES_FLUX], flux_bilan[COLONNES_FLUX], stocks[COLONNES_FLUX]], ignore_index=True)
+        .groupby(["Entite", "Periode", "Section", "Ligne"], as_index=False)["Montant"].sum()
+    )
+
+    # Contrôle : flux calculés vs variation de trésorerie observée
+    tres = df_flux[df_flux["Section"] == "Trésorerie"].pivot_table(
+        index=["Entite", "Periode"], columns="Ligne", values="Montant", aggfunc="sum"
+    ).reindex(columns=[LIGNE_OUVERTURE, LIGNE_CLOTURE], fill_value=0.0)
+    calcule = df_flux[df_flux["Section"] != "Trésorerie"].groupby(["Entite", "Periode"])["Montant"].sum()
+    index = calcule.index.union(tres.index)
+    ecart = ((tres[LIGNE_CLOTURE] - tres[LIGNE_OUVERTURE]).reindex(index, fill_value=0.0)
+             - calcule.reindex(index, fill_value=0.0))
+    ecarts = ecart.rename("Montant").reset_index().assign(Section="Contrôle", Ligne=LIGNE_ECART)
+
+    return (pd.concat([df_flux, ecarts[COLONNES_FLUX]], ignore_index=True)
+            .sort_values(["Periode", "Entite", "Section", "Ligne"]).reset_index(drop=True))
+
+
+def run(periode, historique, df_comptes, table_mappings, cache_folder=FOLDERS["cache"], cfg=None):
+    """`cfg` (pipeline_config) : sections FLUX_*, premier mois d'exercice, compte d'écart de conversion."""
+    cfg = cfg or config_defaut()
+    log.info(f"\n[cash_flow] Tableau de flux — variations de bilan N / N-1")
+
+    clotures = (historique[(historique["Vue"] == "BS") & historique["Entite"].isin(cfg.ENTITES)]   # Historique partagé entre groupes
+                [["Entite", "CompteNum", "Periode", "Montant"]]
+                .rename(columns={"Montant": "Solde"}))
+    clotures = clotures[clotures["Periode"] <= str(periode)]
+    mouvements = _mouvements_mensuels(sorted(clotures["Periode"].unique()), periode, df_comptes, cache_folder)
+
+    # Mois sans mouvements en cache : pas de résultat net ni d'ouverture reconstituée
+    clotures = clotures[clotures["Periode"].isin(mouvements["Periode"].unique())]
+    df_flux  = calculer_flux(clotures, mouvements, table_mappings, cfg)
+    periodes = sorted(df_flux["Periode"].unique())
+
+    ecarts = df_flux[(df_flux["Ligne"] == LIGNE_ECART) & (df_flux["Montant"].abs() > cfg.FLUX_SEUIL_CONTROLE)]
+    du_mois = df_flux[df_flux["Periode"] == str(periode)]
+    for entite, d in du_mois.groupby("Entite"):
+        par_section = d.groupby("Section")["Montant"].sum()
+        evenement(log, logging.INFO, "cash_flow.entite",
+                  f"  {entite:<10} exploitation {par_section.get('Exploitation', 0):>14,.2f} | "
+                  f"investissement {par_section.get('Investissement', 0):>14,.2f} | "
+                  f"financement {par_section.get('Financement', 0):>14,.2f}",
+                  entite=entite, **{s.lower(): round(float(par_section.get(s, 0)), 2) for s in SECTIONS})
+    for r in ecarts.itertuples():
+        evenement(log, logging.WARNING, "cash_flow.ecart",
+                  f"  ⚠️  {r.Entite} {r.Periode} : flux calculés ≠ variation de trésorerie (écart {r.Montant:,.2f})",
+                  entite=r.Entite, periode=r.Periode, ecart=round(float(r.Montant), 2))
+    if ecarts.empty:
+        log.info(f"  ✅ Variation de trésorerie expliquée ({len(periodes)} mois, {du_mois['Entite'].nunique()} entité(s))")
+
+    return {"df_flux": df_flux, "periodes": periodes}
+
+
+# ── Présentation (onglet Tableau de flux, output_08) ──────────────────────────
+
+def colonne_flux(df_flux, entites, periodes):
+    """
+    {Ligne: montant} d'un périmètre sur une fenêtre de mois (trésorerie : ouverture du premier, clôture
+    du dernier). Entrées / sorties de périmètre en cours de fenêtre : écart entre l'ouverture d'un mois
+    et la clôture du mois précédent (LIGNE_PERIMETRE).
+    """
+    df = df_flux[df_flux["Entite"].isin(entites) & df_flux["Periode"].isin(periodes)]
+    valeurs = df[df["Section"] != "Trésorerie"].groupby(["Section", "Ligne"])["Montant"].sum().to_dict()
+    if not df.empty:
+        tres = df[df["Section"] == "Trésorerie"]
+        premier, dernier = df["Periode"].min(), df["Periode"].max()
+        valeurs[("Trésorerie", LIGNE_OUVERTURE)] = tres.loc[(tres["Ligne"] == LIGNE_OUVERTURE) & (tres["Periode"] == premier), "Montant"].sum()
+        valeurs[("Trésorerie", LIGNE_CLOTURE)]   = tres.loc[(tres["Ligne"] == LIGNE_CLOTURE) & (tres["Periode"] == dernier), "Montant"].sum()
+        ouv = tres[tres["Ligne"] == LIGNE_OUVERTURE].groupby("Periode")["Montant"].sum()
+        clo = tres[tres["Ligne"] == LIGNE_CLOTURE].groupby("Periode")["Montant"].sum()
+        mois = sorted(df["Periode"].unique())
+        valeurs[("Trésorerie", LIGNE_PERIMETRE)] = sum(ouv.get(m, 0.0) - clo.get(p, 0.0) for p, m in zip(mois, mois[1:]))
+    return valeurs
+
+
+def lignes_tableau(df_flux, colonnes):
+    """
+    Structure de l'onglet : [(libellé, type de ligne, [montant par colonne])].
+    colonnes : [{Ligne: montant}] (colonne_flux) — détails de chaque section dans l'ordre alphabétique.
+    """
+    def somme(cles):
+        return [sum(c.get(k, 0) for k in cles) for c in colonnes]
+
+    fixes = {LIGNE_RESULTAT, LIGNE_DA, LIGNE_DA_RECLASS, LIGNE_AUTRES}
+    lignes, flux = [], []
+    for section in SECTIONS:
+        details = sorted({l for s, l in df_flux[["Section", "Ligne"]].drop_duplicates().itertuples(index=False)
+                          if s == section and l not in fixes})
+        ordre = ([LIGNE_RESULTAT, LIGNE_DA] if section == "Exploitation" else []) + details + \
+                ([LIGNE_DA_RECLASS] if section == "Investissement" else []) + \
+                ([LIGNE_AUTRES] if section == "Exploitation" else [])
+        cles = [(section, l) for l in ordre if any((section, l) in c for c in colonnes)]
+        lignes.append((f"FLUX {section.upper()}", "section", None))
+        lignes += [(l, "detail" if l in details else "item", somme([(s, l)])) for s, l in cles]
+        lignes.append((f"Flux de trésorerie — {section.lower()}", "subtotal", somme(cles)))
+        flux += cles
+
+    change = [(LIGNE_CHANGE, LIGNE_CHANGE)]
+    lignes.append((LIGNE_CHANGE, "item", somme(change)))
+    lignes.append(("VARIATION DE TRÉSORERIE", "total", somme(flux + change)))
+    perimetre = somme([("Trésorerie", LIGNE_PERIMETRE)])
+    if any(abs(v) > 0.005 for v in perimetre):
+        lignes.append((LIGNE_PERIMETRE, "item", perimetre))
+    lignes.append((LIGNE_OUVERTURE, "item", somme([("Trésorerie", LIGNE_OUVERTURE)])))
+    lignes.append((LIGNE_CLOTURE, "item", somme([("Trésorerie", LIGNE_CLOTURE)])))
+    lignes.append((LIGNE_ECART, "item", somme([("Contrôle", LIGNE_ECART)])))
+    return lignes
+
+
+def fenetres_flux(periode, periodes, premier_mois):
+    """[(libellé, mois)] : mois courant et cumul de l'exercice (mois disponibles du tableau)."""
+    ytd = fenetres_comparatifs(periode, premier_mois)["YTD"]
+    disponibles = [p for p in ytd if p in set(periodes)]
+    libelle = "YTD" if len(disponibles) == len(ytd) else f"YTD ({len(disponibles)}/{len(ytd)} m)"
+    return [("CONSOLIDÉ", [str(periode)]), (f"CONSOLIDÉ {libelle}", disponibles)]
+
+
+if __name__ == "__main__":
+    from scripts.ledger_store import periodes_en_cache, charger_table
+    from scripts.mapping_historique import charger_mouvements
+
+    periode = periodes_en_cache(FOLDERS["cache"])[-1]
+    result  = run(periode, charger_mouvements(), charger_table(periode, "df_comptes"), charger_table(periode, "mappings"))
+
+    print(f"\nTableau de flux {periode} :")
+    print(result["df_flux"][result["df_flux"]["Periode"] == periode].to_string(index=False))
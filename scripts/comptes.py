@@ -0,0 +1,142 @@
+"""
+comptes.py — Dimension compte partagée par tous les stages (identifiants entiers)
+-----------------------------------------------------------------------------------
+Logique :
+  - Chaque CompteNum reçoit au chargement (load_fec_01) un identifiant entier CompteId : les
+    lignes du ledger ne portent que cet identifiant, le numéro et le libellé FEC de chaque compte
+    (Entite × CompteId) sont retenus une fois (retenir_libelles) et rejoints aux seuls agrégats
+    par compte des stages suivants (avec_libelles)
+  - L'encodage est positionnel (base 37 sur COMPTE_LARGEUR caractères, 0 = fin de numéro) :
+      · déterministe, sans dictionnaire partagé → identique d'un bloc, d'une entité ou d'un run à l'autre
+      · il préserve l'ordre lexicographique : tous les comptes d'une racine (classe '6', racine
+        '613', …) forment une plage contiguë d'identifiants
+    Filtrer par classe ou par racine devient une comparaison d'entiers sur le ledger, au lieu
+    d'un .str[0] / .str.startswith() sur chaque ligne
+  - dimension_comptes() matérialise la table de dimension (numéro, libellé, classe, racines 2/3/4
+    caractères), mise en cache avec les sorties de stages (table 'comptes', cf. ledger_store) :
+    en SQL, ledger JOIN comptes USING (Entite, CompteId)
+
+Limites : numéros de plus de COMPTE_LARGEUR caractères tronqués ; caractères non alphanumériques
+encodés comme une fin de numéro (un CompteNum FEC ne contient que chiffres et lettres).
+"""
+
+import numpy as np
+import pandas as pd
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+COMPTE_LARGEUR = 12                                   # 37**12 < 2**63 : tient dans un int64
+_BASE          = 37
+_POIDS         = _BASE ** np.arange(COMPTE_LARGEUR - 1, -1, -1, dtype='int64')
+
+_CODES = np.zeros(256, dtype='int64')                 # octet → chiffre base 37 (0 = fin / autre)
+_CODES[np.frombuffer(b'0123456789', dtype='uint8')] = np.arange(1, 11)
+_CODES[np.frombuffer(b'ABCDEFGHIJKLMNOPQRSTUVWXYZ', dtype='uint8')] = np.arange(11, 37)
+
+COLONNES_LIBELLES = ['Entite', 'CompteNum', 'CompteLib', 'CompteId']
+
+_libelles = {}   # {(Entite, CompteId): (CompteNum, CompteLib)} — comptes chargés, réutilisé entre deux runs (fpa watch)
+
+
+def _encoder_uniques(comptes):
+    octets = np.array(
+        pd.Series(comptes, dtype=object).astype(str).str.upper().str.encode('ascii', 'replace').tolist(),
+        dtype=f'S{COMPTE_LARGEUR}',
+    )
+    return _CODES[octets.view('uint8').reshape(-1, COMPTE_LARGEUR)] @ _POIDS
+
+
+def encoder_comptes(comptes):
+    """CompteNum (Series / liste) → CompteId int64 ; encodage calculé une fois par compte distinct."""
+    codes, uniques = pd.factorize(pd.Series(comptes), use_na_sentinel=False)
+    if len(uniques) == 0:
+        return np.zeros(0, dtype='int64')
+    return _encoder_uniques(uniques)[codes]
+
+
+def plage_prefixe(prefixe):
+    """[début, fin) des CompteId dont le numéro commence par `prefixe`."""
+    debut = int(_encoder_uniques([prefixe])[0])
+    return debut, debut + int(_BASE ** (COMPTE_LARGEUR - min(len(prefixe), COMPTE_LARGEUR)))
+
+
+def masque_prefixes(ids, prefixes):
+    """Booléen : CompteId appartenant à l'une des racines `prefixes` (classes '6', '7', racine '613'…)."""
+    ids    = np.asarray(ids, dtype='int64')
+    masque = np.zeros(len(ids), dtype=bool)
+    for prefixe in prefixes:
+        debut, fin = plage_prefixe(prefixe)
+        masque |= (ids >= debut) & (ids < fin)
+    return masque
+
+
+def classe_compte(ids):
+    """Classe PCG (premier chiffre) de chaque CompteId ; -1 si le numéro ne commence pas par un chiffre."""
+    premier = np.asarray(ids, dtype='int64') // _POIDS[0]
+    return np.where((premier >= 1) & (premier <= 10), premier - 1, -1).astype('int8')
+
+
+def libelle_classe(ids):
+    """Classe au format ClasseCompte historique ('1'…'7') des agrégats par compte."""
+    return pd.Series(classe_compte(ids)).astype(str).to_numpy()
+
+
+def racine(ids, longueur):
+    """CompteId de la racine à `longueur` caractères (même encodage que le compte racine lui-même)."""
+    pas = _POIDS[longueur - 1]
+    return np.asarray(ids, dtype='int64') // pas * pas
+
+
+def retenir_libelles(df):
+    """
+    Lignes FEC préparées (Entite, CompteNum, CompteLib, CompteId) → mêmes lignes sans CompteNum ni
+    CompteLib, retenus une fois par compte dans la dimension.
+    """
+    comptes = df[COLONNES_LIBELLES].drop_duplicates(['Entite', 'CompteId'])
+    _libelles.update(zip(zip(comptes['Entite'], comptes['CompteId'].tolist()),
+                         zip(comptes['CompteNum'], comptes['CompteLib'])))
+    return df.drop(columns=['CompteNum', 'CompteLib'])
+
+
+def declarer_compte(entites, compte, libelle):
+    """Compte créé par le pipeline (écart de conversion…) : libellé retenu sauf s'il vient déjà d'un FEC."""
+    compte_id = int(encoder_comptes([compte])[0])
+    for e in entites:
+        _libelles.setdefault((e, compte_id), (compte, libelle))
+    return compte_id
+
+
+def libelles_comptes(entites=None):
+    """Comptes retenus : Entite | CompteNum | CompteLib | CompteId (entites : filtre optionnel)."""
+    df = pd.DataFrame([(e, num, lib, i) for (e, i), (num, lib) in _libelles.items()], columns=COLONNES_LIBELLES)
+    df = df.astype({'CompteId': 'int64'})
+    return df if entites is None else df[df['Entite'].isin(entites)].reset_index(drop=True)
+
+
+def avec_libelles(agregat):
+    """Agrégat par (Entite, CompteId) → CompteNum / CompteLib rejoints depuis la dimension."""
+    agregat = agregat.drop(columns=['CompteNum', 'CompteLib'], errors='ignore')
+    df = agregat.merge(libelles_comptes(agregat['Entite'].unique()), on=['Entite', 'CompteId'], how='left')
+    return df[COLONNES_LIBELLES + [c for c in agregat.columns if c not in COLONNES_LIBELLES]]
+
+
+def dimension_comptes(comptes):
+    """
+    comptes : Entite | CompteNum [| CompteLib] (libelles_comptes, mapping PCG) — premier libellé retenu.
+    Table de dimension : Entite | CompteId | CompteNum | CompteLib | Classe | Racine2 | Racine3 | Racine4.
+    """
+    df  = comptes.reindex(columns=['Entite', 'CompteNum', 'CompteLib']).dropna(subset=['CompteNum'])
+    df  = df.drop_duplicates(['Entite', 'CompteNum']).reset_index(drop=True)
+    ids = encoder_comptes(df['CompteNum'])
+    return pd.DataFrame({
+        'Entite'   : df['Entite'].to_numpy(),
+        'CompteId' : ids,
+        'CompteNum': df['CompteNum'].to_numpy(),
+        'CompteLib': df['CompteLib'].to_numpy(),
+        'Classe'   : classe_compte(ids),
+        'Racine2'  : racine(ids, 2),
+        'Racine3'  : racine(ids, 3),
+        'Racine4'  : racine(ids, 4),
+    }).sort_values(['Entite', 'CompteId']).reset_index(drop=True)
@@ -0,0 +1,176 @@
+"""
+consolidation.py — Moteur de consolidation : périmètres, matrice de détention, poids par période
+---------------------------------------------------------------------------------------------------
+Logique :
+  - Périmètres : chaque entité seule + chaque groupe de REPORTING_GROUPS ; un groupe peut contenir
+    des sous-groupes (nom d'un autre groupe), résolus en entités
+  - Matrice de détention A (entité × entité, PARTICIPATIONS) : A[i, j] = part du capital de j
+    détenue directement par i. Pour un périmètre P, pourcentage d'intérêt x = t · (I - A_P)⁻¹,
+    où A_P est A restreinte aux membres de P et t ses têtes (membres non détenus par un autre
+    membre) — détentions indirectes comprises ; les systèmes de tous les groupes sont résolus en
+    un seul appel (matrices empilées), une entité seule est détenue à 100 %
+  - Poids de consolidation par (période, périmètre, entité) :
+      · integration  : 1 en intégration globale, x en intégration proportionnelle (METHODES_CONSOLIDATION)
+      · minoritaires : 1 - x en intégration globale (part des intérêts minoritaires), 0 sinon
+      · 0 hors de la fenêtre DATES_PERIMETRE de l'entité — pour les groupes seulement : le
+        périmètre d'une entité seule reste ses propres comptes
+  - consolider() : montants par entité → montants par périmètre, pour toutes les périodes d'un
+    coup (tenseur période × entité × ligne contracté avec les poids, np.einsum) ; ajouter des
+    entités agrandit les matrices, pas le nombre de boucles Python. Une ligne n'apparaît dans un
+    périmètre que si l'un de ses membres pondérés la porte
+  - Sans PARTICIPATIONS ni DATES_PERIMETRE : poids 1, la consolidation est la somme des entités
+
+Output : perimetres(), matrice_poids(), consolider(), structure_pl()
+"""
+
+import numpy as np
+import pandas as pd
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import REPORTING_GROUPS, PARTICIPATIONS
+from scripts.pipeline_config import config_defaut
+from scripts.journal import journal
+
+log = journal(__name__)
+
+
+METHODES = ("globale", "proportionnelle")
+
+LIGNE_MINORITAIRES  = "Minority interests"
+LIGNE_PART_GROUPE   = "NET INCOME (group share)"
+DETAIL_MINORITAIRES = "Minority interests"
+
+
+def perimetres(groupes=REPORTING_GROUPS):
+    """{périmètre: [entités]} — chaque entité seule + chaque groupe de `groupes` (sous-groupes résolus)."""
+    def entites_de(membre, chemin=()):
+        if membre not in groupes:
+            return [membre]
+        if membre in chemin:
+            raise ValueError(f"Groupes reporting cycliques : {' → '.join(chemin + (membre,))}")
+        return [e for m in groupes[membre] for e in entites_de(m, chemin + (membre,))]
+
+    resolus = {g: list(dict.fromkeys(entites_de(g))) for g in groupes}
+    entites = list(dict.fromkeys(e for ents in resolus.values() for e in ents))
+    return {**{e: [e] for e in entites}, **resolus}
+
+
+def a_minoritaires(participations=PARTICIPATIONS):
+    """Vrai si une participation est inférieure à 100 % (lignes intérêts minoritaires au P&L)."""
+    return any(part < 1 for filiales in participations.values() for part in filiales.values())
+
+
+def structure_pl(cfg=None):
+    """PL_STRUCTURE, suivie des lignes intérêts minoritaires / part du groupe s'il y a des minoritaires."""
+    cfg = cfg or config_defaut()
+    if not a_minoritaires(cfg.PARTICIPATIONS):
+        return cfg.PL_STRUCTURE
+    return [*cfg.PL_STRUCTURE, (LIGNE_MINORITAIRES, "item"), (LIGNE_PART_GROUPE, "total")]
+
+
+def matrice_detention(entites, participations=PARTICIPATIONS):
+    """A[i, j] : part du capital de l'entité j détenue directement par l'entité i (ndarray entité × entité)."""
+    position = {e: i for i, e in enumerate(entites)}
+    A = np.zeros((len(entites), len(entites)))
+    for detentrice, filiales in participations.items():
+        for filiale, part in filiales.items():
+            if detentrice in position and filiale in position:
+                A[position[detentrice], position[filiale]] = part
+    return A
+
+
+def pourcentages_interet(membres, A):
+    """
+    membres : masque booléen périmètre × entité ; A : matrice de détention (entité × entité).
+    Retourne x (périmètre × entité) : intérêt des têtes de chaque périmètre dans ses membres.
+    """
+    M       = membres.astype(float)
+    x       = M.copy()                      # Périmètre d'un seul membre : intérêt 100 %
+    groupes = M.sum(axis=1) > 1
+    if groupes.any():
+        G     = M[groupes]
+        A_P   = A[None, :, :] * G[:, :, None] * G[:, None, :]
+        tetes = G * (A_P.sum(axis=1) == 0)
+        # x = t · (I - A_P)⁻¹  ⇔  (I - A_P)ᵀ · xᵀ = tᵀ : un système par groupe, résolus ensemble
+        I_A   = np.eye(len(A))[None, :, :] - A_P
+        x[groupes] = np.linalg.solve(I_A.transpose(0, 2, 1), tetes[:, :, None])[:, :, 0] * G
+    return x
+
+
+def matrice_poids(perimetres_, periodes, cfg=None):
+    """
+    Poids de consolidation des périmètres `perimetres_` ({périmètre: [entités]}) sur `periodes`.
+    Retourne {perimetres, entites, periodes, interet, integration, minoritaires} ;
+    integration / minoritaires : ndarray période × périmètre × entité, interet : périmètre × entité.
+    """
+    cfg      = cfg or config_defaut()
+    noms     = list(perimetres_)
+    entites  = list(dict.fromkeys(e for ents in perimetres_.values() for e in ents))
+    periodes = [str(p) for p in periodes]
+
+    inconnues = {m for m in cfg.METHODES_CONSOLIDATION.values()} - set(METHODES)
+    if inconnues:
+        raise ValueError(f"Méthode de consolidation inconnue : {', '.join(sorted(inconnues))} ({' | '.join(METHODES)})")
+
+    paires  = pd.DataFrame([(q, e) for q, ents in perimetres_.items() for e in ents], columns=["Perimetre", "Entite"])
+    membres = (pd.crosstab(paires["Perimetre"], paires["Entite"])
+               .reindex(index=noms, columns=entites, fill_value=0).to_numpy() > 0)
+
+    interet = pourcentages_interet(membres, matrice_detention(entites, cfg.PARTICIPATIONS))
+    proportionnelle = np.array([cfg.METHODES_CONSOLIDATION.get(e, "globale") == "proportionnelle" for e in entites])
+    integration  = np.where(proportionnelle, interet, membres.astype(float))
+    minoritaires = np.where(proportionnelle, 0.0, membres * (1 - interet))
+
+    # Entrées / sorties de périmètre : masque période × entité, appliqué aux seuls groupes
+    bornes   = [cfg.DATES_PERIMETRE.get(e) or (None, None) for e in entites]
+    debut    = np.array([b[0] or "000000" for b in bornes], dtype=str)
+    fin      = np.array([b[1] or "999999" for b in bornes], dtype=str)
+    mois     = np.array(periodes, dtype=str)[:, None]
+    presents = (mois >= debut) & (mois <= fin)
+    groupe   = np.array([perimetres_[q] != [q] for q in noms])
+    fenetre  = np.where(groupe[None, :, None], presents[:, None, :], True)
+
+    return {
+        "perimetres"  : noms,
+        "entites"     : entites,
+        "periodes"    : periodes,
+        "interet"     : interet,
+        "integration" : integration[None, :, :] * fenetre,
+        "minoritaires": minoritaires[None, :, :] * fenetre,
+    }
+
+
+def consolider(df, cles, poids, valeur="Montant", ponderation="integration"):
+    """
+    Montants par entité → montants par périmètre, toutes périodes d'un coup.
+    df          : Entite | Periode | *cles | valeur
+    poids       : matrice_poids()
+    ponderation : "integration" (chiffres consolidés) ou "minoritaires" (part des minoritaires)
+    Retourne Perimetre | Periode | *cles | valeur (lignes portées par au moins un membre pondéré).
+    """
+    colonnes = ["Perimetre", "Periode", *cles, valeur]
+    df = df[df["Entite"].isin(poids["entites"]) & df["Periode"].astype(str).isin(poids["periodes"])]
+    codes, lignes = pd.MultiIndex.from_frame(df[cles]).factorize()
+    df, codes = df[codes >= 0], codes[codes >= 0]   # Clés manquantes (NaN) : ignorées, comme un groupby
+    if df.empty:
+        return pd.DataFrame(columns=colonnes)
+
+    i_p = pd.Categorical(df["Periode"].astype(str), categories=poids["periodes"]).codes
+    i_e = pd.Categorical(df["Entite"], categories=poids["entites"]).codes
+    F   = np.zeros((len(poids["periodes"]), len(poids["entites"]), len(lignes)))
+    np.add.at(F, (i_p, i_e, codes), df[valeur].to_numpy(dtype=float))
+    porte = np.zeros(F.shape)
+    porte[i_p, i_e, codes] = 1.0
+
+    W       = poids[ponderation]
+    montant = np.einsum("pqe,pek->pqk", W, F)
+    present = np.einsum("pqe,pek->pqk", (W != 0).astype(float), porte) > 0
+
+    p, q, k  = np.nonzero(present)
+    resultat = pd.DataFrame(list(lignes.take(k)), columns=cles) if len(k) else pd.DataFrame(columns=cles)
+    resultat.insert(0, "Perimetre", np.array(poids["perimetres"], dtype=object)[q])
+    resultat.insert(1, "Periode", np.array(poids["periodes"], dtype=object)[p])
+    resultat[valeur] = montant[p, q, k]
+    return resultat[colonnes]
@@ -0,0 +1,222 @@
+"""
+daemon.py — Service de clôture résident (mode watch)
+------------------------------------------------------
+Logique :
+  - Garde en mémoire, entre deux exécutions, tout ce qui coûte à parser :
+      · mapping PCG + configuration intercos (charger_referentiels)
+      · FEC parsés par entité, avec leurs mouvements du mois / soldes / postings de drill-down
+      · split masse salariale (Silae + mapping RH)
+  - Surveille data/fec, data/rh, data/revenue_cogs, data/capex, data/ifrs16, data/budget et mapping/
+    (polling des mtimes, sans dépendance) ; un fichier n'est pris en compte qu'une fois stable
+    (écriture terminée)
+  - Sur changement, ne recalcule que ce qui en dépend :
+      · FEC_YYYYMM_ENTITE.txt → stages 01–02 de cette entité seulement
+      · mapping_pcg.xlsx      → référentiels + postings de drill-down (FEC non relus)
+      · interco.xlsx          → référentiels seulement
+      · taux_change.xlsx      → référentiels + stages 01–02 des entités hors EUR
+      · data/rh, mapping_rh   → stage 05
+    puis rejoue les stages 03–08 (agrégats, quelques millisecondes) et régénère reporting_YYYYMM.xlsx
+  - Nouvelle période détectée dans data/fec → rechargement complet de cette période
+
+Usage :
+  python fpa.py watch [--intervalle 2] [--drilldown-sheet] [--config groupe.toml]
+"""
+
+import pandas as pd
+import time
+import os
+import sys
+from pathlib import Path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import DAEMON_POLL_S
+from scripts.load_fec_01 import load_fec, detect_fec_files, detect_periode
+from scripts.fx_translation_02b import (
+    convertir_ledger, ecarts_conversion, ajouter_ecarts_conversion, entites_a_convertir,
+)
+from scripts.monthly_movements_02 import get_mouvements_mois, get_mouvements_par_compte, get_soldes_bilan
+from scripts.interco_04 import calculer_montants_intercos
+from scripts.ifrs16_07 import _montant_loyers
+from scripts.ledger_store import reinitialiser_ledger, ecrire_bloc_ledger, dossier_ledger
+from scripts.drilldown import indexer_lignes
+from scripts.validation import nouveaux_controles, fusionner, finaliser
+from scripts.pipeline_config import config_defaut
+from scripts.journal import journal
+
+log = journal(__name__)
+
+
+DOSSIERS_SURVEILLES = ["fec", "rh", "revenue_cogs", "capex", "ifrs16", "budget", "mapping"]
+
+
+def nouvel_etat(cfg=None):
+    return {
+        "cfg"         : cfg or config_defaut(),
+        "periode"     : None,
+        "signatures"  : {},     # {chemin: (mtime_ns, taille)}
+        "referentiels": None,
+        "ledgers"     : {},     # {entité: {chemin, df, df_mois, df_comptes, df_bilan, index, controles, offset_cache}}
+        "rh"          : None,
+    }
+
+
+def _signatures(folders):
+    signatures = {}
+    for cle in DOSSIERS_SURVEILLES:
+        dossier = Path(folders[cle])
+        if not dossier.exists():
+            continue
+        for chemin in dossier.iterdir():
+            if chemin.is_file() and not chemin.name.startswith(("~$", ".")):
+                st = chemin.stat()
+                signatures[str(chemin)] = (st.st_mtime_ns, st.st_size)
+    return signatures
+
+
+def detecter_changements(etat):
+    """Chemins créés, modifiés ou supprimés depuis le dernier rafraîchissement, une fois stables."""
+    cfg       = etat["cfg"]
+    courantes = _signatures(cfg.FOLDERS)
+    if courantes == etat["signatures"]:
+        return set(), courantes
+
+    # Attend la fin des écritures : deux relevés identiques à DAEMON_DEBOUNCE_S d'intervalle
+    while True:
+        time.sleep(cfg.DAEMON_DEBOUNCE_S)
+        suivantes = _signatures(cfg.FOLDERS)
+        if suivantes == courantes:
+            break
+        courantes = suivantes
+
+    anciennes = etat["signatures"]
+    modifies  = {c for c in courantes.keys() | anciennes.keys() if courantes.get(c) != anciennes.get(c)}
+    return modifies, courantes
+
+
+def _charger_entite(etat, entite, chemin):
+    periode, cfg = etat["periode"], etat["cfg"]
+    controles = nouveaux_controles()
+    df        = load_fec(chemin, entite, controles)
+    df        = convertir_ledger(df, periode, etat["referentiels"]["taux"], cfg)
+    df_mois = get_mouvements_mois(df, periode)
+    etat["ledgers"][entite] = {
+        "chemin"      : chemin,
+        "df"          : df,
+        "df_mois"     : df_mois,
+        "df_comptes"  : get_mouvements_par_compte(df_mois),
+        "df_bilan"    : ajouter_ecarts_conversion(get_soldes_bilan(df, periode), ecarts_conversion(df, periode, cfg), cfg),
+        "index"       : indexer_lignes(df, etat["referentiels"]["table_mappings"], periode),
+        "controles"   : controles,
+        "offset_cache": None,   # Position du ledger de l'entité dans le cache (None = à réécrire)
+    }
+
+
+def _synchroniser_cache_ledger(etat):
+    """Réécrit les parts du ledger en cache dont le contenu ou la position globale a changé."""
+    cache  = etat["cfg"].FOLDERS["cache"]
+    offset = 0
+    for num, entite in enumerate(sorted(etat["ledgers"])):
+        ledger = etat["ledgers"][entite]
+        if ledger["offset_cache"] != offset:
+            ecrire_bloc_ledger(etat["periode"], num, ledger["df"], offset, cache)
+            ledger["offset_cache"] = offset
+        offset += len(ledger["df"])
+
+    for part in sorted(dossier_ledger(etat["periode"], cache).glob("*.parquet"))[len(etat["ledgers"]):]:
+        part.unlink()
+
+
+def _entrees(etat):
+    """Entrées de executer_aval reconstituées à partir des ledgers par entité (sans concaténer les FEC)."""
+    referentiels = etat["referentiels"]
+    cfg          = etat["cfg"]
+    ledgers      = [etat["ledgers"][e] for e in sorted(etat["ledgers"])]
+
+    montants_pl = [(0.0, 0.0)] * len(referentiels["df_interco_pl"])
+    montants_bs = [(0.0, 0.0)] * len(referentiels["df_interco_bs"])
+    parts_index, offset = [], 0
+    for ledger in ledgers:
+        # Les montants intercos sont additifs : chaque entité ne contribue qu'à son côté de la paire
+        montants_pl = [(a + da, b + db) for (a, b), (da, db) in zip(montants_pl, calculer_montants_intercos(ledger["df_mois"], referentiels["df_interco_pl"]))]
+        montants_bs = [(a + da, b + db) for (a, b), (da, db) in zip(montants_bs, calculer_montants_intercos(ledger["df"], referentiels["df_interco_bs"]))]
+        parts_index.append(ledger["index"].assign(LigneId=ledger["index"]["LigneId"] + offset))
+        offset += len(ledger["df"])
+
+    return {
+        "df"          : None,
+        "df_mois"     : None,
+        "df_comptes"  : pd.concat([l["df_comptes"] for l in ledgers], ignore_index=True),
+        "df_bilan"    : pd.concat([l["df_bilan"] for l in ledgers], ignore_index=True),
+        "montants_pl" : montants_pl,
+        "montants_bs" : montants_bs,
+        "loyers"      : {
+            e: _montant_loyers(etat["ledgers"][e]["df"], etat["periode"], e, cfg.IFRS16_LOYER_ACCOUNTS)
+            if e in etat["ledgers"] else 0.0
+            for e in cfg.IFRS16_ENTITIES
+        },
+        "parts_index" : parts_index,
+        "controles"   : finaliser(fusionner(*(l["controles"] for l in ledgers)), etat["periode"], cfg),
+    }
+
+
+def rafraichir(etat, modifies, drilldown_sheet=False):
+    """Recharge ce qui dépend des chemins modifiés puis rejoue les stages 03–08."""
+    from main import charger_referentiels, charger_rh, executer_aval
+
+    cfg     = etat["cfg"]
+    debut   = time.perf_counter()
+    noms    = {Path(c).name for c in modifies}
+    periode = detect_periode(cfg.FOLDERS["fec"])
+    fichier_taux = Path(cfg.TAUX_CHANGE_FILE).name
+
+    if periode != etat["periode"]:
+        log.info(f"\n[daemon] Période {periode} — chargement complet")
+        etat.update(periode=periode, ledgers={}, rh=None, referentiels=None)
+        reinitialiser_ledger(periode, cfg.FOLDERS["cache"])
+
+    if etat["referentiels"] is None or {"mapping_pcg.xlsx", "interco.xlsx", fichier_taux} & noms:
+        mapping_modifie = etat["referentiels"] is None or "mapping_pcg.xlsx" in noms
+        etat["referentiels"] = charger_referentiels(cfg)
+        if mapping_modifie:
+            for ledger in etat["ledgers"].values():
+                ledger["index"] = indexer_lignes(ledger["df"], etat["referentiels"]["table_mappings"], periode)
+        if fichier_taux in noms:
+            for entite in entites_a_convertir(list(etat["ledgers"]), cfg):
+                del etat["ledgers"][entite]
+
+    fichiers = detect_fec_files(cfg.FOLDERS["fec"], periode, cfg.ENTITES)
+    for entite in set(etat["ledgers"]) - set(fichiers):
+        log.info(f"[daemon] {entite} : FEC retiré")
+        del etat["ledgers"][entite]
+    for entite, chemin in fichiers.items():
+        if entite not in etat["ledgers"] or chemin in modifies:
+            _charger_entite(etat, entite, chemin)
+
+    if etat["rh"] is None or any(Path(c).parent == Path(cfg.FOLDERS["rh"]) for c in modifies) or "mapping_rh.xlsx" in noms:
+        etat["rh"] = charger_rh(periode, cfg)
+
+    _synchroniser_cache_ledger(etat)
+    resultats = executer_aval(periode, etat["referentiels"], _entrees(etat), etat["rh"], drilldown_sheet, cfg=cfg)
+
+    log.info(f"\n[daemon] ✅ Reporting {periode} régénéré en {time.perf_counter() - debut:.1f} s")
+    return resultats
+
+
+def run(intervalle=DAEMON_POLL_S, drilldown_sheet=False, cfg=None):
+    etat = nouvel_etat(cfg)
+    dossiers = ", ".join(etat["cfg"].FOLDERS[c] for c in DOSSIERS_SURVEILLES)
+    log.info(f"[daemon] Surveillance de {dossiers} toutes les {intervalle} s (Ctrl+C pour arrêter)")
+
+    try:
+        while True:
+            modifies, signatures = detecter_changements(etat)
+            if modifies:
+                try:
+                    rafraichir(etat, modifies, drilldown_sheet)
+                except Exception as e:
+                    # Un fichier invalide ne doit pas arrêter le service : on attend la correction suivante
+                    log.warning(f"\n[daemon] ⚠️  Échec du rafraîchissement — {type(e).__name__} : {e}")
+                etat["signatures"] = signatures
+            time.sleep(intervalle)
+    except KeyboardInterrupt:
+        log.info("\n[daemon] Arrêt demandé")
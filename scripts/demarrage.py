@@ -0,0 +1,115 @@
+"""
+demarrage.py — Temps de démarrage à froid du CLI (fpa bench)
+--------------------------------------------------------------
+Logique :
+  - Chaque commande est lancée CLI_BENCH_REPETITIONS fois dans un interpréteur neuf : le temps
+    mesuré est celui que voit l'utilisateur (démarrage Python + imports + commande) ; minimum
+    et médiane retenus
+  - Commandes mesurées :
+      · fpa --help, fpa detect → commandes légères : pandas / openpyxl ne doivent pas être importés,
+        objectif CLI_DEMARRAGE_MAX_S
+      · import main            → imports du pipeline complet (coût fixe de fpa run / fpa stage)
+  - Détail des imports du pipeline (python -X importtime) : temps propre cumulé par paquet
+    (pandas, pyarrow, duckdb…), pour savoir quoi différer en priorité
+  - Chaque mesure est ajoutée à l'historique (suivi des régressions d'un commit à l'autre)
+
+Output : data/output/bench_demarrage.json — liste de mesures {date, python, commandes, imports}
+"""
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import CLI_BENCH_REPETITIONS, CLI_DEMARRAGE_MAX_S, FOLDERS
+
+
+RACINE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FPA    = os.path.join(RACINE, "fpa.py")
+
+
+def _import_main():
+    return [sys.executable, "-c", f"import sys; sys.path.insert(0, {RACINE!r}); import main"]
+
+
+def commandes_mesurees(config_file=None):
+    """[(libellé, argv, légère)] — légère : soumise à l'objectif CLI_DEMARRAGE_MAX_S."""
+    options = ["--config", config_file] if config_file else []
+    return [
+        ("fpa --help",  [sys.executable, FPA, "--help"], True),
+        ("fpa detect",  [sys.executable, FPA, *options, "detect"], True),
+        ("import main", _import_main(), False),
+    ]
+
+
+def mesurer(argv, repetitions=CLI_BENCH_REPETITIONS):
+    """Durées (s) de `repetitions` exécutions à froid de argv, et code de sortie de la dernière."""
+    durees, code = [], 0
+    for _ in range(repetitions):
+        debut = time.perf_counter()
+        code  = subprocess.run(argv, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL).returncode
+        durees.append(time.perf_counter() - debut)
+    return durees, code
+
+
+def imports_couteux(n=5):
+    """Paquets les plus coûteux à l'import du pipeline (temps propre de leurs modules) : [(paquet, secondes)]."""
+    sortie = subprocess.run([sys.executable, "-X", "importtime", *_import_main()[1:]],
+                            capture_output=True, text=True).stderr
+    couts = {}
+    for ligne in sortie.splitlines():
+        if not ligne.startswith("import time:") or "|" not in ligne:
+            continue
+        propre, _, module = ligne[len("import time:"):].split("|")
+        if not propre.strip().isdigit():
+            continue                                          # Ligne d'en-tête
+        paquet = module.strip().split(".")[0]
+        couts[paquet] = couts.get(paquet, 0) + int(propre) / 1e6
+    return sorted(couts.items(), key=lambda c: -c[1])[:n]
+
+
+def run(repetitions=CLI_BENCH_REPETITIONS, config_file=None, output_folder=FOLDERS["output"]):
+    """Mesure le démarrage à froid, l'ajoute à l'historique. Retourne True si l'objectif est tenu."""
+    print(f"\n[demarrage] {repetitions} exécution(s) à froid par commande — objectif {CLI_DEMARRAGE_MAX_S:.2f} s")
+
+    resultats, tenu = [], True
+    for libelle, argv, legere in commandes_mesurees(config_file):
+        durees, code = mesurer(argv, repetitions)
+        mesure = {
+            "commande": libelle,
+            "min_s"   : round(min(durees), 3),
+            "median_s": round(statistics.median(durees), 3),
+            "code"    : code,
+            "legere"  : legere,
+        }
+        resultats.append(mesure)
+        if legere:
+            ok   = mesure["median_s"] <= CLI_DEMARRAGE_MAX_S
+            tenu = tenu and ok
+            etat = "✅" if ok else "⚠️ "
+        else:
+            etat = "  "
+        print(f"  {etat} {libelle:<12} min {mesure['min_s']:>6.3f} s | médiane {mesure['median_s']:>6.3f} s"
+              + (f"  (code {code})" if code else ""))
+
+    imports = imports_couteux()
+    print("  Imports du pipeline : " + ", ".join(f"{p} {s:.2f} s" for p, s in imports))
+
+    chemin = Path(output_folder) / "bench_demarrage.json"
+    chemin.parent.mkdir(parents=True, exist_ok=True)
+    historique = json.loads(chemin.read_text(encoding="utf-8")) if chemin.exists() else []
+    historique.append({
+        "date"     : datetime.now().isoformat(timespec="seconds"),
+        "python"   : sys.version.split()[0],
+        "commandes": resultats,
+        "imports"  : [{"paquet": p, "propre_s": round(s, 3)} for p, s in imports],
+    })
+    chemin.write_text(json.dumps(historique, ensure_ascii=False, indent=2), encoding="utf-8")
+
+    print(f"[demarrage] Historique : {chemin} ({len(historique)} mesure(s))")
+    return tenu
@@ -0,0 +1,166 @@
+"""
+drilldown.py — Index inversé des chiffres reportés vers les lignes FEC
+------------------------------------------------------------------------
+Logique :
+  - Pour chaque cellule reportée (Vue, Entite, Mapping_*_detail, Periode), l'index
+    conserve la liste des positions (LigneId) des lignes du ledger en cache qui la composent :
+      · Vue 'PL' : mouvements du mois hors journal AN, comptes classes P&L mappés (cf. agreger_pl)
+      · Vue 'BS' : lignes cumulées à fin de mois, comptes classes Bilan mappés (cf. agreger_bilan)
+  - Les éliminations intercos sont portées ligne à ligne : colonne Elimination (description
+    de la paire) et Reporte (False si la ligne est neutralisée dans le chiffre reporté)
+  - L'index est trié par clé et persisté en Parquet (data/cache/YYYYMM/drill_index.parquet) :
+    déplier une cellule = filtre sur l'index + lecture des seuls row groups du ledger concernés
+
+Inputs :
+  - df_ledger      : FEC consolidé (ou un bloc en mode out-of-core, avec sa position de début)
+  - table_mappings : ledger_store.mappings_en_table(mappings)
+  - recap_pl/bs    : récapitulatifs interco_04
+
+Output :
+  - DataFrame : Vue | Entite | Categorie | Detail | Periode | LigneId | Elimination | Reporte
+"""
+
+import numpy as np
+import pandas as pd
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import CLASSES_BILAN, CLASSES_PL, JOURNAL_AN, FOLDERS
+from scripts.comptes import masque_prefixes, encoder_comptes
+from scripts.ledger_store import dossier_periode, lire_lignes, periodes_en_cache, lister_tables, charger_table
+from scripts.journal import journal
+
+log = journal(__name__)
+
+
+CLES_INDEX = ['Vue', 'Entite', 'Categorie', 'Detail', 'Periode']
+
+
+def indexer_lignes(df_ledger, table_mappings, periode, debut=0):
+    """Postings (Vue, Entite, Categorie, Detail, Periode, LigneId) d'un ledger ou d'un bloc."""
+    date_debut = pd.to_datetime(periode, format='%Y%m')
+    date_fin   = date_debut + pd.offsets.MonthEnd(0)
+
+    lignes = pd.DataFrame({
+        'Entite'   : df_ledger['Entite'].to_numpy(),
+        'CompteId' : df_ledger['CompteId'].to_numpy(),
+        'LigneId'  : np.arange(debut, debut + len(df_ledger), dtype='int64'),
+    })
+    dates  = df_ledger['EcritureDate']
+
+    masque_pl = (
+        ((dates >= date_debut) & (dates <= date_fin) & (df_ledger['JournalCode'] != JOURNAL_AN)).to_numpy()
+        & masque_prefixes(df_ledger['CompteId'], CLASSES_PL)
+    )
+    masque_bs = (dates <= date_fin).to_numpy() & masque_prefixes(df_ledger['CompteId'], CLASSES_BILAN)
+
+    vues = [
+        ('PL', masque_pl, 'Mapping_PL_category', 'Mapping_PL_detail'),
+        ('BS', masque_bs, 'Mapping_BS_category', 'Mapping_BS_detail'),
+    ]
+    parts = []
+    for vue, masque, col_cat, col_det in vues:
+        mapping = table_mappings[['Entite', 'CompteNum', col_cat, col_det]].dropna(subset=[col_det])
+        mapping = mapping.assign(CompteId=encoder_comptes(mapping['CompteNum'])).drop(columns='CompteNum')
+        part    = lignes[masque].merge(mapping, on=['Entite', 'CompteId'], how='inner')
+        parts.append(part.rename(columns={col_cat: 'Categorie', col_det: 'Detail'}).assign(Vue=vue))
+
+    index = pd.concat(parts, ignore_index=True)
+    index['Periode'] = str(periode)
+    return index[CLES_INDEX + ['CompteId', 'LigneId']]
+
+
+def _paires_eliminees(recap, col_a, col_b):
+    """{(entité, CompteId): description} pour chaque côté des paires éliminées."""
+    paires = {}
+    if recap is None or recap.empty:
+        return paires
+    for _, r in recap.iterrows():
+        id_a, id_b = encoder_comptes([r[col_a], r[col_b]])
+        paires[(r['Entite_A'], id_a)] = r['Description']
+        paires[(r['Entite_B'], id_b)] = r['Description']
+    return paires
+
+
+def finaliser_index(parts_index, recap_pl, recap_bs):
+    """
+    Concatène les postings, ajoute les éliminations et trie par clé.
+    P&L : les comptes éliminés sont neutralisés dans df_pl_elimine → Reporte = False.
+    Bilan : agreger_bilan n'applique pas les éliminations → Reporte = True, ligne marquée.
+    """
+    index = pd.concat(parts_index, ignore_index=True)
+
+    index['Elimination'] = ''
+    index['Reporte']     = True
+    for vue, recap in (('PL', recap_pl), ('BS', recap_bs)):
+        for (entite, compte), desc in _paires_eliminees(recap, 'Compte_A', 'Compte_B').items():
+            masque = (index['Vue'] == vue) & (index['Entite'] == entite) & (index['CompteId'] == compte)
+            index.loc[masque, 'Elimination'] = desc
+            if vue == 'PL':
+                index.loc[masque, 'Reporte'] = False
+
+    index = index.sort_values(CLES_INDEX + ['LigneId']).reset_index(drop=True)
+    log.info(f"\n[drilldown] Index construit : {index[CLES_INDEX].drop_duplicates().shape[0]} cellules → {len(index)} lignes FEC")
+    return index
+
+
+def sauver_index(periode, index, cache_folder=FOLDERS["cache"]):
+    chemin = dossier_periode(periode, cache_folder) / "drill_index.parquet"
+    chemin.parent.mkdir(parents=True, exist_ok=True)
+    index.to_parquet(chemin, index=False)
+    return chemin
+
+
+def _lignes_postings(periode, postings, vue, cache_folder):
+    lignes = lire_lignes(periode, postings['LigneId'], cache_folder)
+    if 'CompteNum' not in lignes and 'comptes' in lister_tables(periode, cache_folder):
+        # Lignes du ledger : CompteId seul — numéro et libellé relus dans la dimension compte
+        comptes = charger_table(periode, 'comptes', cache_folder)[['Entite', 'CompteId', 'CompteNum', 'CompteLib']]
+        lignes  = lignes.merge(comptes, on=['Entite', 'CompteId'], how='left')
+    lignes = lignes.merge(postings[['LigneId', 'Categorie', 'Detail', 'Elimination', 'Reporte']], on='LigneId')
+
+    signe = -1 if vue == 'PL' else 1
+    lignes['Mouvement_Reporte'] = np.where(lignes['Reporte'], lignes['Mouvement'] * signe, 0.0)
+    return lignes
+
+
+def deplier(periode, entite, detail, vue='PL', cache_folder=FOLDERS["cache"]):
+    """
+    Lignes FEC derrière une cellule reportée, avec colonnes Elimination / Reporte.
+    Mouvement_Reporte : contribution de la ligne au chiffre publié (convention P&L : produits > 0).
+    """
+    import pyarrow.parquet as pq
+
+    chemin = dossier_periode(periode, cache_folder) / "drill_index.parquet"
+    postings = pq.read_table(chemin, filters=[
+        ('Vue', '=', vue), ('Entite', '=', entite), ('Detail', '=', detail), ('Periode', '=', str(periode)),
+    ]).to_pandas()
+
+    if postings.empty:
+        return pd.DataFrame()
+
+    lignes = _lignes_postings(periode, postings, vue, cache_folder)
+    return lignes.sort_values(['CompteNum', 'EcritureDate', 'LigneId']).reset_index(drop=True)
+
+
+def lignes_vue(periode, index, vue='PL', cache_folder=FOLDERS["cache"]):
+    """Toutes les lignes FEC d'une vue, avec leur clé d'index (feuille de drill-down output_08)."""
+    lignes = _lignes_postings(periode, index[index['Vue'] == vue], vue, cache_folder)
+    return lignes.sort_values(['Entite', 'Detail', 'CompteNum', 'EcritureDate', 'LigneId']).reset_index(drop=True)
+
+
+def run(entite, detail, vue='PL', periode=None, cache_folder=FOLDERS["cache"]):
+    periode = periode or periodes_en_cache(cache_folder)[-1]
+    lignes  = deplier(periode, entite, detail, vue, cache_folder)
+
+    if lignes.empty:
+        print(f"[drilldown] Aucune ligne pour {vue} {entite} · {detail} ({periode})")
+        return lignes
+
+    colonnes = ['LigneId', 'JournalCode', 'EcritureNum', 'EcritureDate', 'CompteNum', 'PieceRef',
+                'EcritureLib', 'Debit', 'Credit', 'Elimination', 'Mouvement_Reporte']
+    print(f"[drilldown] {vue} {entite} · {detail} ({periode}) — {len(lignes)} ligne(s) FEC")
+    print(lignes[colonnes].to_string(index=False))
+    print(f"\n  Total reporté : {lignes['Mouvement_Reporte'].sum():,.2f}")
+    return lignes
@@ -0,0 +1,155 @@
+"""
+export_colonnaire.py — Export Parquet / Arrow des sorties de stages pour les outils BI (stage 08)
+---------------------------------------------------------------------------------------------------
+Logique :
+  - Publication, à côté du reporting Excel, des tables utiles en aval : df_mapped, df_pl_final,
+    df_bilan_mapped, df_opex_rh, recap_pl, recap_bs, df_ifrs16
+  - Schéma stable (SCHEMAS, version SCHEMA_VERSION) : colonnes, ordre et types fixés ici, quel que
+    soit le mois — colonne absente → nulls, table vide → fichier vide avec le même schéma (ex.
+    recap_pl sans interco ce mois-ci) ; colonnes hors schéma non exportées
+  - Partitionnement par période (convention Hive, lisible par DuckDB / Spark / pyarrow.dataset) :
+      export/<table>/periode=YYYYMM/<table>_YYYYMM.parquet   (ou .arrow)
+    une clôture ne réécrit que la partition de sa période
+  - Écriture dans un thread lancé avant la génération Excel (lancer) et attendu après (attendre) :
+    pyarrow libère le GIL pendant la conversion et l'écriture, openpyxl n'est pas ralenti
+  - Chaque fichier est écrit sous un nom temporaire puis renommé : un lecteur ne voit jamais de
+    partition à moitié écrite
+  - Format : EXPORT_FORMAT — "parquet" (compressé) ou "arrow" (IPC / Feather v2, mappable en
+    mémoire sans décodage) ; None : pas d'export
+
+Output : data/output/export/<table>/periode=YYYYMM/… + _schema.json (version et colonnes de chaque table)
+"""
+
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import FOLDERS, EXPORT_FORMAT
+from scripts.journal import journal
+
+log = journal(__name__)
+
+
+SCHEMA_VERSION = 1
+FORMATS        = {"parquet": ".parquet", "arrow": ".arrow"}
+
+# Colonnes exportées : (nom, type Arrow) — toute évolution incrémente SCHEMA_VERSION
+SCHEMAS = {
+    "df_mapped": [
+        ("Entite", "string"), ("CompteNum", "string"), ("CompteLib", "string"), ("CompteId", "int64"),
+        ("ClasseCompte", "string"), ("Debit", "float64"), ("Credit", "float64"), ("Mouvement", "float64"),
+        ("Mapping_PL_category", "string"), ("Mapping_PL_detail", "string"),
+        ("Mapping_BS_category", "string"), ("Mapping_BS_detail", "string"),
+    ],
+    "df_pl_final": [
+        ("Entite", "string"), ("Mapping_PL_category", "string"), ("Mapping_PL_detail", "string"), ("Mouvement", "float64"),
+    ],
+    "df_bilan_mapped": [
+        ("Entite", "string"), ("Mapping_BS_category", "string"), ("Mapping_BS_detail", "string"), ("Solde", "float64"),
+    ],
+    "df_opex_rh": [
+        ("Entite", "string"), ("BU", "string"), ("Type", "string"), ("Mapping_PL", "string"), ("Mouvement", "float64"),
+    ],
+    "recap_pl": [
+        ("Description", "string"), ("Entite_A", "string"), ("Compte_A", "string"), ("Montant_A", "float64"),
+        ("Entite_B", "string"), ("Compte_B", "string"), ("Montant_B", "float64"), ("Ecart", "float64"), ("Commentaire", "string"),
+    ],
+    "recap_bs": [
+        ("Description", "string"), ("Entite_A", "string"), ("Compte_A", "string"), ("Solde_A", "float64"),
+        ("Entite_B", "string"), ("Compte_B", "string"), ("Solde_B", "float64"), ("Ecart", "float64"), ("Commentaire", "string"),
+    ],
+    "df_ifrs16": [
+        ("Entite", "string"), ("Ligne", "string"), ("Montant", "float64"),
+    ],
+}
+
+
+def dossier_export(output_folder=FOLDERS["output"]):
+    return Path(output_folder) / "export"
+
+
+def schema_arrow(nom):
+    """pa.Schema de la table `nom`, avec la version du schéma en métadonnée."""
+    import pyarrow as pa
+    return pa.schema([(c, pa.type_for_alias(t)) for c, t in SCHEMAS[nom]],
+                     metadata={"fpa.schema_version": str(SCHEMA_VERSION)})
+
+
+def en_table(df, schema):
+    """DataFrame → pa.Table au schéma exact `schema` (colonnes manquantes : nulls ; types convertis)."""
+    import pyarrow as pa
+    colonnes = []
+    for champ in schema:
+        if df is not None and champ.name in df.columns:
+            valeurs = df[champ.name]
+            if pa.types.is_string(champ.type):
+                valeurs = valeurs.astype(object).where(valeurs.notna(), None)
+            colonnes.append(pa.array(valeurs, type=champ.type, from_pandas=True))
+        else:
+            colonnes.append(pa.nulls(0 if df is None else len(df), type=champ.type))
+    return pa.Table.from_arrays(colonnes, schema=schema)
+
+
+def ecrire_partition(nom, df, periode, dossier, format=EXPORT_FORMAT):
+    """Écrit la partition `periode` de la table `nom`. Retourne (chemin, lignes)."""
+    import pyarrow.feather as feather
+    import pyarrow.parquet as pq
+
+    table  = en_table(df, schema_arrow(nom))
+    cible  = Path(dossier) / nom / f"periode={periode}"
+    cible.mkdir(parents=True, exist_ok=True)
+    chemin = cible / f"{nom}_{periode}{FORMATS[format]}"
+    temporaire = chemin.with_name(f".{chemin.name}.tmp")
+
+    if format == "arrow":
+        feather.write_feather(table, temporaire, compression="uncompressed")
+    else:
+        pq.write_table(table, temporaire)
+    os.replace(temporaire, chemin)
+    return chemin, table.num_rows
+
+
+def ecrire_schema(dossier):
+    """_schema.json : version et colonnes (nom, type Arrow) de chaque table exportée."""
+    Path(dossier).mkdir(parents=True, exist_ok=True)
+    (Path(dossier) / "_schema.json").write_text(json.dumps({
+        "version": SCHEMA_VERSION,
+        "tables" : {nom: [{"colonne": c, "type": t} for c, t in colonnes] for nom, colonnes in SCHEMAS.items()},
+    }, ensure_ascii=False, indent=2), encoding="utf-8")
+
+
+def exporter(tables, periode, output_folder=FOLDERS["output"], format=EXPORT_FORMAT):
+    """Écrit toutes les tables de `tables` ({nom: DataFrame}, noms de SCHEMAS). Retourne {nom: chemin}."""
+    debut   = time.perf_counter()
+    dossier = dossier_export(output_folder)
+    ecrire_schema(dossier)
+
+    chemins, lignes = {}, 0
+    for nom in SCHEMAS:
+        chemins[nom], n = ecrire_partition(nom, tables.get(nom), periode, dossier, format)
+        lignes += n
+
+    log.info(f"[export] {len(chemins)} table(s) {format} — {lignes} lignes — {dossier} "
+             f"(periode={periode}, {time.perf_counter() - debut:.2f}s)")
+    return chemins
+
+
+def lancer(tables, periode, output_folder=FOLDERS["output"], format=EXPORT_FORMAT):
+    """Démarre l'export dans un thread (pendant la génération Excel). Retourne un futur à passer à attendre(), ou None."""
+    if format is None:
+        return None
+    if format not in FORMATS:
+        raise ValueError(f"Format d'export inconnu : {format} ({' | '.join(FORMATS)})")
+    pool   = ThreadPoolExecutor(max_workers=1, thread_name_prefix="export")
+    future = pool.submit(exporter, tables, periode, output_folder, format)
+    pool.shutdown(wait=False)
+    return future
+
+
+def attendre(future):
+    """Attend la fin de l'export lancé par lancer() ; les erreurs d'écriture sont relevées ici."""
+    return future.result() if future is not None else None
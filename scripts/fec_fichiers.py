@@ -0,0 +1,63 @@
+"""
+fec_fichiers.py — Détection des fichiers FEC (période, entités) sans charger pandas
+--------------------------------------------------------------------------------------
+Logique :
+  - Simple lecture de répertoire : utilisée par load_fec_01 et par les commandes légères
+    du CLI (fpa detect), qui doivent répondre sans le coût d'import de pandas / openpyxl
+  - Format attendu : FEC_YYYYMM_ENTITE.txt
+
+Output : {entité: chemin} pour une période, période la plus récente, périodes disponibles
+"""
+
+import os
+import re
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import ENTITES
+from scripts.journal import journal
+
+log = journal(__name__)
+
+
+MOTIF_FEC = re.compile(r'^FEC_(\d{6})_(\w+)\.txt$')
+
+
+def periodes_disponibles(input_folder):
+    """{période: [fichiers]} des FEC présents dans `input_folder`, périodes triées."""
+    periodes = {}
+    for fichier in sorted(os.listdir(input_folder)):
+        match = MOTIF_FEC.match(fichier)
+        if match:
+            periodes.setdefault(match.group(1), []).append(fichier)
+    return dict(sorted(periodes.items()))
+
+
+def detect_fec_files(input_folder, periode, entites=ENTITES):
+    entites_trouvees = {}
+
+    for fichier in os.listdir(input_folder):
+        match = re.match(rf'^FEC_{periode}_(\w+)\.txt$', fichier)
+        if match:
+            nom_entite = match.group(1).upper()
+            if nom_entite in entites:
+                entites_trouvees[nom_entite] = os.path.join(input_folder, fichier)
+                log.info(f"  Fichier détecté : {fichier} → Entité {nom_entite}")
+            else:
+                log.warning(f"  Attention : entité inconnue dans {fichier} — ignoré")
+
+    if not entites_trouvees:
+        raise FileNotFoundError(f"Aucun fichier FEC trouvé pour la période {periode} dans {input_folder}")
+
+    return entites_trouvees
+
+
+def detect_periode(input_folder):
+    periodes = periodes_disponibles(input_folder)
+
+    if not periodes:
+        raise FileNotFoundError(f"Aucun fichier FEC trouvé dans {input_folder}")
+
+    periode = list(periodes)[-1]
+    log.info(f"Période détectée automatiquement : {periode}")
+    return periode
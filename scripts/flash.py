@@ -0,0 +1,216 @@
+"""
+flash.py — Clôture flash : premiers chiffres P&L publiés au fil du pipeline (--flash)
+----------------------------------------------------------------------------------------
+Logique :
+  - Un instantané par étape, publié dès que ses chiffres sont calculables (sans attendre l'Excel) :
+      · fec       : à la fin du chargement de chaque FEC — totaux PCG bruts du mois pour l'entité
+                    (CA sur FLASH_RACINES_CA, EBITDA estimé sur FLASH_RACINES_EBITDA), en devise
+                    fonctionnelle ; en mode out-of-core, un seul instantané après la lecture par blocs
+                    (déjà converti en devise groupe par le stage 02b)
+      · mapping   : après le mapping PCG (stage 03) — catégories P&L et sous-totaux du reporting,
+                    avant éliminations, hors masse salariale RH / IFRS 16 / CAPEX
+      · intercos  : après les éliminations intercos (stage 04)
+      · definitif : chiffres reportés (agrégats par périmètre), identiques aux onglets P&L
+  - Indicateurs par entité : CA, EBITDA, Résultat ; total = somme des entités publiées, omis (None)
+    tant que des entités sont en devise fonctionnelle hors devise groupe (étape fec)
+  - Chaque instantané :
+      · réécrit flash_YYYYMM.json (dernier état + historique), par remplacement atomique : un
+        lecteur (fpa flash, tableau de bord) ne voit jamais un fichier partiel
+      · ajoute ses lignes à flash_YYYYMM.csv (une ligne par entité et par instantané)
+  - Sans --flash, flash vaut None et les fonctions publier_* ne font rien
+
+Output : data/output/flash/YYYYMM/flash_YYYYMM.json + flash_YYYYMM.csv
+"""
+
+import csv
+import json
+import logging
+import os
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import FOLDERS, CLASSES_PL, JOURNAL_AN, DEVISE_GROUPE, FLASH_RACINES_CA, FLASH_RACINES_EBITDA, FLASH_LIGNES_CA
+from scripts.comptes import masque_prefixes
+from scripts.pipeline_config import config_defaut
+from scripts.monthly_movements_02 import get_mois_periode
+from scripts.output_08 import SUBTOTALS, _pl_dict_reporte
+from scripts.journal import journal, evenement
+
+log = journal(__name__)
+
+
+INDICATEURS  = ("CA", "EBITDA", "Resultat")
+COLONNES_CSV = ["Horodatage", "T_s", "Etape", "Entite", "Devise", *INDICATEURS]
+
+
+def dossier_flash(periode, output_folder=FOLDERS["output"]):
+    return Path(output_folder) / "flash" / str(periode)
+
+
+def nouveau_flash(periode, cfg=None):
+    """
+    État de la clôture flash de `periode` (l'historique CSV d'une clôture précédente est remplacé).
+    cfg : configuration de la clôture (pipeline_config) — entités, devises, racines FLASH_*, dossier de sortie.
+    """
+    cfg     = cfg or config_defaut()
+    dossier = dossier_flash(periode, cfg.FOLDERS["output"])
+    dossier.mkdir(parents=True, exist_ok=True)
+    with open(dossier / f"flash_{periode}.csv", "w", newline="", encoding="utf-8") as f:
+        csv.writer(f).writerow(COLONNES_CSV)
+
+    log.info(f"\n[flash] Instantanés P&L → {dossier}")
+    return {
+        "periode"    : str(periode),
+        "cfg"        : cfg,
+        "entites"    : list(cfg.ENTITES),
+        "devises"    : {e: cfg.DEVISES_ENTITES.get(e, DEVISE_GROUPE) for e in cfg.ENTITES},
+        "dossier"    : dossier,
+        "demarre_le" : datetime.now().isoformat(timespec="seconds"),
+        "debut"      : time.perf_counter(),
+        "dernier"    : {},   # {entité: indicateurs de la dernière étape publiée}
+        "instantanes": [],
+    }
+
+
+# ── Indicateurs ───────────────────────────────────────────────────────────────
+
+def _arrondis(valeurs):
+    return {k: round(float(valeurs.get(k, 0)), 2) for k in INDICATEURS}
+
+
+def indicateurs_pcg(mouvements, racines_ca=FLASH_RACINES_CA, racines_ebitda=FLASH_RACINES_EBITDA):
+    """
+    Indicateurs bruts par entité à partir des mouvements du mois (Entite, CompteId, Mouvement),
+    sans mapping : produits créditeurs → signes inversés comme dans agreger_pl.
+    """
+    pl = mouvements[masque_prefixes(mouvements['CompteId'], CLASSES_PL)]
+    resultats = {}
+    for entite, df in pl.groupby('Entite', sort=False):
+        ids = df['CompteId']
+        resultats[entite] = _arrondis({
+            "CA"      : -df.loc[masque_prefixes(ids, racines_ca), 'Mouvement'].sum(),
+            "EBITDA"  : -df.loc[masque_prefixes(ids, racines_ebitda), 'Mouvement'].sum(),
+            "Resultat": -df['Mouvement'].sum(),
+        })
+    return resultats
+
+
+def indicateurs_pl(categories, lignes_ca=FLASH_LIGNES_CA):
+    """Indicateurs d'un P&L par catégorie {Mapping_PL_category: montant} (convention agreger_pl)."""
+    d = dict(categories)
+    for ligne, fn in SUBTOTALS.items():
+        d[ligne] = fn(d)
+    return _arrondis({
+        "CA"      : sum(d.get(l, 0) for l in lignes_ca),
+        "EBITDA"  : d["EBITDA"],
+        "Resultat": d["NET INCOME"],
+    })
+
+
+def _par_entite(pl, lignes_ca=FLASH_LIGNES_CA):
+    """Entite | Mapping_PL_category | Mouvement → {entité: indicateurs}."""
+    sommes = pl.groupby(['Entite', 'Mapping_PL_category'])['Mouvement'].sum()
+    return {entite: indicateurs_pl(cat.droplevel('Entite').to_dict(), lignes_ca)
+            for entite, cat in sommes.groupby(level='Entite', sort=False)}
+
+
+# ── Publication ───────────────────────────────────────────────────────────────
+
+def _ecrire_json(flash, chemin):
+    temporaire = chemin.with_suffix(".json.tmp")
+    temporaire.write_text(json.dumps(flash, ensure_ascii=False, indent=2, default=str), encoding="utf-8")
+    os.replace(temporaire, chemin)
+
+
+def _total(dernier):
+    """Somme des entités publiées ; None tant qu'elles ne sont pas toutes dans la même devise."""
+    if len({v["devise"] for v in dernier.values()}) > 1:
+        return None
+    return {k: round(sum(v[k] for v in dernier.values()), 2) for k in INDICATEURS}
+
+
+def publier(flash, etape, valeurs, converti=True):
+    """
+    Ajoute l'instantané `etape` ({entité: indicateurs}) et réécrit les sorties flash.
+    converti : montants en devise groupe (après le stage 02b) ; sinon en devise fonctionnelle.
+    """
+    if flash is None or not valeurs:
+        return
+    t_s        = round(time.perf_counter() - flash["debut"], 3)
+    horodatage = datetime.now().isoformat(timespec="milliseconds")
+
+    devises = {e: DEVISE_GROUPE if converti else flash["devises"].get(e, DEVISE_GROUPE) for e in valeurs}
+    for entite, v in valeurs.items():
+        flash["dernier"][entite] = {"etape": etape, "t_s": t_s, "devise": devises[entite], **v}
+    total = _total(flash["dernier"])
+    flash["instantanes"].append({"etape": etape, "t_s": t_s, "horodatage": horodatage, "entites": valeurs, "total": total})
+
+    dossier, periode = flash["dossier"], flash["periode"]
+    _ecrire_json({
+        "periode"    : periode,
+        "demarre_le" : flash["demarre_le"],
+        "etape"      : etape,
+        "complet"    : all(e in flash["dernier"] for e in flash["entites"]),
+        "entites"    : flash["dernier"],
+        "total"      : total,
+        "instantanes": flash["instantanes"],
+    }, dossier / f"flash_{periode}.json")
+    with open(dossier / f"flash_{periode}.csv", "a", newline="", encoding="utf-8") as f:
+        csv.writer(f).writerows(
+            [horodatage, t_s, etape, entite, devises[entite], *(v[k] for k in INDICATEURS)]
+            for entite, v in valeurs.items()
+        )
+
+    evenement(log, logging.INFO, "flash.instantane",
+              f"  ⚡ Flash {etape:<9} +{t_s:.2f}s — EBITDA " + " | ".join(f"{e} {v['EBITDA']:,.0f}" for e, v in valeurs.items())
+              + f" (total {len(flash['dernier'])}/{len(flash['entites'])} entité(s) : "
+              + (f"{total['EBITDA']:,.0f})" if total else "devises mixtes)"),
+              etape=etape, t_s=t_s, entites=valeurs, total=total)
+
+
+def publier_fec(flash, df_entite):
+    """Étape fec : un FEC chargé (lignes préparées par load_fec, avant 02b) → totaux PCG bruts du mois."""
+    if flash is None:
+        return
+    date_debut, date_fin = get_mois_periode(flash["periode"])
+    mois = df_entite[
+        (df_entite['EcritureDate'] >= date_debut) &
+        (df_entite['EcritureDate'] <= date_fin)  &
+        (df_entite['JournalCode']  != JOURNAL_AN)
+    ]
+    publier(flash, "fec", indicateurs_pcg(mois, flash["cfg"].FLASH_RACINES_CA, flash["cfg"].FLASH_RACINES_EBITDA),
+            converti=False)
+
+
+def publier_mapping(flash, df_mapped):
+    """Étape mapping : mouvements par compte mappés (appliquer_mapping), avant éliminations."""
+    if flash is None:
+        return
+    pl = df_mapped[masque_prefixes(df_mapped['CompteId'], CLASSES_PL) & df_mapped['Mapping_PL_detail'].notna()]
+    publier(flash, "mapping", _par_entite(pl.assign(Mouvement=-pl['Mouvement']), flash["cfg"].FLASH_LIGNES_CA))
+
+
+def publier_intercos(flash, df_pl_final):
+    """Étape intercos : P&L agrégé après éliminations (agreger_pl)."""
+    if flash is None:
+        return
+    publier(flash, "intercos", _par_entite(df_pl_final, flash["cfg"].FLASH_LIGNES_CA))
+
+
+def publier_definitif(flash, pl_reporte):
+    """Étape definitif : chiffres reportés de chaque entité (agregats_par_perimetre)."""
+    if flash is None:
+        return
+    valeurs = {}
+    for entite in flash["entites"]:
+        d, _ = _pl_dict_reporte(pl_reporte, entite)
+        if d:
+            valeurs[entite] = _arrondis({
+                "CA"      : sum(d.get(l, 0) for l in flash["cfg"].FLASH_LIGNES_CA),
+                "EBITDA"  : d.get("EBITDA", 0),
+                "Resultat": d.get("NET INCOME", 0),
+            })
+    publier(flash, "definitif", valeurs)
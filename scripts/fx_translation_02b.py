@@ -0,0 +1,184 @@
+"""
+fx_translation_02b.py — Conversion des filiales hors EUR (méthode du cours de clôture)
+----------------------------------------------------------------------------------------
+Logique :
+  - Les entités dont la devise fonctionnelle (DEVISES_ENTITES) diffère de DEVISE_GROUPE sont
+    converties ligne à ligne sur le ledger, avant les agrégats du stage 02 : mouvements du mois,
+    soldes bilan, intercos, IFRS 16 et drill-down travaillent ensuite tous en devise groupe
+  - Taux par ligne, sans recherche ligne à ligne :
+      · les couples (devise, mois) distincts du ledger sont résolus en une jointure as-of
+        (pd.merge_asof) sur la table de taux, puis mis en cache pour les runs / blocs suivants
+      · les lignes récupèrent leur taux par une jointure sur (devise, mois)
+  - Taux appliqués :
+      · comptes de P&L (classes 6–7)            → taux moyen du mois de l'écriture
+      · capitaux propres (classe 1)             → taux moyen du mois de l'écriture (historique)
+      · autres comptes de bilan (classes 2–5)   → taux de clôture de la période
+  - Couple (devise, mois) absent de la table : taux implicite des lignes du FEC saisies en devise
+    groupe (Idevise = DEVISE_GROUPE, Montantdevise renseigné), à défaut alerte et taux 1
+  - Écart de conversion (CTA) : en devise locale les écritures sont équilibrées ; après conversion,
+    la somme des lignes au bilan n'est plus nulle. Son opposé est porté en capitaux propres
+    sur COMPTE_ECART_CONVERSION (ligne ajoutée aux soldes bilan)
+
+Table de taux (TAUX_CHANGE_FILE) : Devise | Date | Taux_moyen | Taux_cloture   (1 EUR = x devise)
+Colonnes ajoutées au ledger converti : Devise | Taux | Mouvement_local
+Paramètres (devises, compte d'écart) : `cfg` (pipeline_config), défaut config.py
+"""
+
+import logging
+import numpy as np
+import pandas as pd
+import os
+import sys
+from pathlib import Path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import TAUX_CHANGE_FILE, CLASSES_PL
+from scripts.monthly_movements_02 import get_mois_periode
+from scripts.comptes import masque_prefixes, libelle_classe, declarer_compte, avec_libelles
+from scripts.pipeline_config import config_defaut
+from scripts.journal import journal, evenement
+
+log = journal(__name__)
+
+
+_cache_taux = {}   # {(table, devise, 'YYYYMM'): (taux_moyen, taux_cloture)} — table = fichier + mtime
+
+
+def entites_a_convertir(entites, cfg=None):
+    cfg = cfg or config_defaut()
+    return [e for e in entites if cfg.DEVISES_ENTITES.get(e, cfg.DEVISE_GROUPE) != cfg.DEVISE_GROUPE]
+
+
+def load_taux(taux_file=TAUX_CHANGE_FILE):
+    """
+    Table de taux triée par date. Les taux résolus sont mis en cache par table (fichier + mtime) :
+    le rechargement d'un fichier modifié invalide ses seules entrées, pas celles d'un autre groupe.
+    """
+    existe = Path(taux_file).exists()
+    source = (os.path.abspath(taux_file), Path(taux_file).stat().st_mtime_ns if existe else None)
+    for cle in [c for c in _cache_taux if c[0][0] == source[0] and c[0] != source]:
+        del _cache_taux[cle]
+
+    if not existe:
+        df = pd.DataFrame({"Devise": pd.Series(dtype=str), "Date": pd.Series(dtype="datetime64[ns]"),
+                           "Taux_moyen": pd.Series(dtype=float), "Taux_cloture": pd.Series(dtype=float)})
+    else:
+        df = pd.read_excel(taux_file)
+        df["Devise"] = df["Devise"].astype(str).str.strip().str.upper()
+        df["Date"]   = pd.to_datetime(df["Date"])
+        df = df.sort_values("Date").reset_index(drop=True)
+    df.attrs["source"] = source
+    return df
+
+
+def _taux_implicites(df, devise_groupe):
+    """(devise, mois) → taux implicite des lignes saisies en devise groupe (Montantdevise)."""
+    lignes = df[(df["Idevise"] == devise_groupe) & df["Montantdevise"].notna() & (df["Montantdevise"] != 0)]
+    if lignes.empty:
+        return {}
+    agg = lignes.assign(Local=(lignes["Debit"] + lignes["Credit"]).abs(), Groupe=lignes["Montantdevise"].abs()) \
+                .groupby(["Devise", "Mois"])[["Local", "Groupe"]].sum()
+    return {cle: r["Local"] / r["Groupe"] for cle, r in agg.iterrows()}
+
+
+def resoudre_taux(paires, taux, implicites=None):
+    """
+    Taux (moyen, clôture) des couples (devise, mois 'YYYYMM') : une seule jointure as-of pour
+    les couples absents du cache. Retourne {(devise, mois): (taux_moyen, taux_cloture)}.
+    """
+    source     = taux.attrs.get("source")
+    manquantes = [p for p in paires if (source, *p) not in _cache_taux]
+    if manquantes:
+        req = pd.DataFrame(manquantes, columns=["Devise", "Mois"])
+        req["Date"] = pd.to_datetime(req["Mois"], format="%Y%m") + pd.offsets.MonthEnd(0)
+        if taux.empty:   # Pas de table de taux : taux implicites, à défaut taux 1
+            trouves = req.assign(Taux_moyen=np.nan, Taux_cloture=np.nan)
+        else:
+            trouves = pd.merge_asof(req.sort_values("Date"), taux.astype({"Date": req["Date"].dtype}),
+                                    on="Date", by="Devise", direction="backward")
+        for r in trouves.itertuples(index=False):
+            if pd.notna(r.Taux_moyen):
+                _cache_taux[(source, r.Devise, r.Mois)] = (float(r.Taux_moyen), float(r.Taux_cloture))
+            elif implicites and (r.Devise, r.Mois) in implicites:
+                t = float(implicites[(r.Devise, r.Mois)])
+                evenement(log, logging.WARNING, "fx.taux_implicite",
+                          f"  ⚠️  {r.Devise} {r.Mois} : absent de la table de taux — taux implicite FEC {t:.4f}",
+                          devise=r.Devise, mois=r.Mois, taux=t)
+                _cache_taux[(source, r.Devise, r.Mois)] = (t, t)
+            else:
+                evenement(log, logging.WARNING, "fx.taux_absent", f"  ⚠️  {r.Devise} {r.Mois} : aucun taux disponible — taux 1 appliqué",
+                          devise=r.Devise, mois=r.Mois)
+                _cache_taux[(source, r.Devise, r.Mois)] = (1.0, 1.0)
+    return {p: _cache_taux[(source, *p)] for p in paires}
+
+
+def convertir_ledger(df, periode, taux, cfg=None):
+    """
+    Convertit en devise groupe les lignes des entités hors EUR (ledger complet ou bloc).
+    Sans entité hors EUR configurée, le ledger est renvoyé tel quel (aucun surcoût) ; sinon les
+    colonnes Devise / Taux / Mouvement_local sont ajoutées à toutes les lignes (schéma stable entre blocs).
+    """
+    cfg = cfg or config_defaut()
+    if not entites_a_convertir(cfg.DEVISES_ENTITES, cfg):
+        return df
+
+    df = df.copy()
+    df["Devise"]          = cfg.DEVISE_GROUPE
+    df["Taux"]            = 1.0
+    df["Mouvement_local"] = df["Mouvement"]
+    a_convertir = df["Entite"].isin(entites_a_convertir(df["Entite"].unique(), cfg))
+    if not a_convertir.any():
+        return df
+
+    _, date_fin = get_mois_periode(periode)
+    mois_cloture = date_fin.strftime("%Y%m")
+
+    lignes = df.loc[a_convertir, ["Entite", "CompteId", "EcritureDate", "Debit", "Credit", "Mouvement",
+                                  "Montantdevise", "Idevise"]].copy()
+    lignes["Devise"] = lignes["Entite"].map(cfg.DEVISES_ENTITES)
+    lignes["Mois"]   = lignes["EcritureDate"].dt.strftime("%Y%m")
+
+    paires = set(zip(lignes["Devise"], lignes["Mois"])) | {(d, mois_cloture) for d in lignes["Devise"].unique()}
+    resolus = resoudre_taux(sorted(paires), taux, _taux_implicites(lignes, cfg.DEVISE_GROUPE))
+    table = pd.DataFrame([(d, m, tm, tc) for (d, m), (tm, tc) in resolus.items()],
+                         columns=["Devise", "Mois", "Taux_moyen", "Taux_cloture"])
+
+    lignes = lignes.reset_index().merge(table[["Devise", "Mois", "Taux_moyen"]], on=["Devise", "Mois"], how="left")
+    cloture = table[table["Mois"] == mois_cloture].set_index("Devise")["Taux_cloture"]
+    taux_ligne = np.where(
+        masque_prefixes(lignes["CompteId"], CLASSES_PL + ["1"]),
+        lignes["Taux_moyen"].to_numpy(),
+        lignes["Devise"].map(cloture).to_numpy(),
+    )
+
+    idx = lignes["index"].to_numpy()
+    df.loc[idx, "Devise"] = lignes["Devise"].to_numpy()
+    df.loc[idx, "Taux"]   = taux_ligne
+    for col in ("Debit", "Credit", "Mouvement"):
+        df.loc[idx, col] = lignes[col].to_numpy() / taux_ligne
+    return df
+
+
+def ecarts_conversion(df_converti, periode, cfg=None):
+    """{entité: CTA} — opposé de la somme convertie des lignes au bilan (entités hors EUR)."""
+    if "Mouvement_local" not in df_converti:
+        return {}
+    cfg = cfg or config_defaut()
+    _, date_fin = get_mois_periode(periode)
+    lignes = df_converti[(df_converti["Devise"] != cfg.DEVISE_GROUPE) & (df_converti["EcritureDate"] <= date_fin)]
+    return (-lignes.groupby("Entite")["Mouvement"].sum()).to_dict()
+
+
+def ajouter_ecarts_conversion(df_bilan, ctas, cfg=None):
+    """Ajoute aux soldes bilan une ligne d'écart de conversion par entité convertie."""
+    if not ctas:
+        return df_bilan
+    cfg       = cfg or config_defaut()
+    compte_id = declarer_compte(list(ctas), cfg.COMPTE_ECART_CONVERSION, "Écarts de conversion")
+    lignes    = avec_libelles(pd.DataFrame({"Entite": list(ctas), "CompteId": compte_id, "Solde": list(ctas.values())}))
+    lignes["ClasseCompte"] = libelle_classe(lignes["CompteId"])
+    log.info("\nÉcarts de conversion (CTA) :")
+    for e, montant in ctas.items():
+        evenement(log, logging.INFO, "fx.cta", f"  {e} ({cfg.DEVISES_ENTITES[e]}) : {montant:>12,.2f} {cfg.DEVISE_GROUPE}",
+                  entite=e, devise=cfg.DEVISES_ENTITES[e], cta=round(montant, 2))
+    return pd.concat([df_bilan, lignes], ignore_index=True)
@@ -1,66 +1,227 @@
 """
-ifrs16_07.py — Retraitement IFRS 16
---------------------------------------
+ifrs16_07.py — Retraitement IFRS 16 (moteur d'échéanciers de baux)
+---------------------------------------------------------------------
 Logique :
-  - Extrait les loyers comptabilisés depuis le FEC (comptes par entité dans config)
-  - Neutralise le loyer de l'EBITDA
-  - Enregistre un amortissement ROU en D&A (montant identique)
-  - Impact EBIT = 0
+  - Lit le registre des baux (IFRS16_REGISTRE_FILE) : une ligne par bail
+      Entite | Bail | Date_debut | Duree_mois | Loyer_mensuel | Taux_annuel | Terme (optionnel)
+    Terme : 'échu' (paiement en fin de mois, défaut) ou 'à échoir' (paiement en début de mois)
+  - Calcule en une passe NumPy, pour tous les baux et tous les mois (matrice baux × mois) :
+      · dette locative d'ouverture / de clôture (valeur actuelle des loyers restants)
+      · charge d'intérêts (dette après paiement × taux mensuel)
+      · droit d'utilisation (ROU) = dette initiale, amorti linéairement sur la durée du bail
+  - L'échéancier est mis en cache (data/cache/ifrs16/) sous l'empreinte du registre :
+    recalculé seulement quand le registre change
+  - Impacts du mois par entité :
+      · loyer neutralisé de l'EBITDA (+ loyers contractuels du mois)
+      · amortissement ROU en D&A
+      · intérêts sur dette locative en résultat financier
+  - Les loyers comptabilisés dans le FEC (IFRS16_LOYER_ACCOUNTS) sont rapprochés des loyers
+    du registre (alerte si écart)
+  - Sans registre : repli sur l'ancien traitement (loyer comptabilisé = amortissement ROU)
 
 Inputs :
-  - df_fec  : DataFrame consolidé (depuis load_fec_01.py)
-  - period  : str au format 'YYYYMM'
+  - df_fec         : DataFrame consolidé (depuis load_fec_01.py)
+  - period         : str au format 'YYYYMM'
+  - loyers         : dict optionnel {entité: loyer comptabilisé} déjà agrégé (mode out-of-core)
+  - registre_file  : chemin du registre des baux (défaut : config.IFRS16_REGISTRE_FILE)
+  - cfg            : configuration de la clôture (pipeline_config) — entités, comptes de loyers, cache
 
 Output :
   - dict avec clés :
-      'loyers_pid'      : float
-      'loyers_celsius'  : float
-      'rou_pid'         : float
-      'rou_celsius'     : float
-      'df_ifrs16'       : DataFrame — détail pour output_08.py
+      'impacts'        : {entité: {'loyer', 'amortissement', 'interets', 'dette', 'rou'}}
+      'df_ifrs16'      : DataFrame — détail pour output_08.py (onglet Retraitements)
+      'df_echeancier'  : DataFrame — échéancier du mois par bail
 """
 
+import logging
+import numpy as np
 import pandas as pd
 import os
 import sys
+from pathlib import Path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from config import IFRS16_LOYER_ACCOUNTS, IFRS16_ENTITIES
+from config import IFRS16_LOYER_ACCOUNTS, IFRS16_REGISTRE_FILE, FOLDERS
+from scripts.comptes import masque_prefixes
+from scripts.pipeline_config import config_defaut
+from scripts.ledger_store import empreinte_fichiers, table_derivee
+from scripts.journal import journal, evenement
 
+log = journal(__name__)
 
-def _extract_loyers(df_fec: pd.DataFrame, period: str, entity: str) -> float:
+
+COLONNES_REGISTRE   = ["Entite", "Bail", "Date_debut", "Duree_mois", "Loyer_mensuel", "Taux_annuel"]
+COLONNES_ECHEANCIER = ["Entite", "Bail", "Periode", "Dette_ouverture", "Paiement", "Interets",
+                       "Dette_cloture", "Amortissement", "ROU_cloture"]
+
+
+# ── Loyers comptabilisés (FEC) ────────────────────────────────────────────────
+
+def _montant_loyers(df_fec: pd.DataFrame, period: str, entity: str, loyer_accounts: dict = IFRS16_LOYER_ACCOUNTS) -> float:
+    """Loyers non arrondis — additifs, sommables bloc par bloc (mode out-of-core)."""
     period_dt = pd.to_datetime(period, format="%Y%m").to_period("M")
-    prefix    = IFRS16_LOYER_ACCOUNTS[entity]
+    prefix    = loyer_accounts[entity]
     mask = (
-        df_fec["CompteNum"].astype(str).str.startswith(prefix)
+        masque_prefixes(df_fec["CompteId"], [prefix])
         & (df_fec["EcritureDate"].dt.to_period("M") == period_dt)
         & (df_fec["Entite"] == entity)
     )
-    return round(float((df_fec[mask]["Debit"] - df_fec[mask]["Credit"]).sum()), 2)
+    return float((df_fec[mask]["Debit"] - df_fec[mask]["Credit"]).sum())
+
+
+def _extract_loyers(df_fec: pd.DataFrame, period: str, entity: str, loyer_accounts: dict = IFRS16_LOYER_ACCOUNTS) -> float:
+    return round(_montant_loyers(df_fec, period, entity, loyer_accounts), 2)
+
+
+# ── Registre des baux ─────────────────────────────────────────────────────────
+
+def load_registre(registre_file=IFRS16_REGISTRE_FILE):
+    df = pd.read_excel(registre_file, dtype={"Entite": str, "Bail": str})
+    manquantes = [c for c in COLONNES_REGISTRE if c not in df.columns]
+    if manquantes:
+        raise ValueError(f"Registre des baux {registre_file} : colonnes manquantes {manquantes}")
+
+    df = df.dropna(subset=["Entite", "Date_debut", "Duree_mois", "Loyer_mensuel"]).copy()
+    df["Entite"]     = df["Entite"].str.strip()
+    df["Date_debut"] = pd.to_datetime(df["Date_debut"])
+    df["Duree_mois"] = df["Duree_mois"].astype(int)
+    df["Taux_annuel"] = df["Taux_annuel"].fillna(0.0).astype(float)
+    terme = df["Terme"] if "Terme" in df.columns else pd.Series("échu", index=df.index)
+    df["A_echoir"] = terme.fillna("échu").astype(str).str.lower().str.contains("choir")
+    return df.reset_index(drop=True)
+
+
+# ── Moteur d'échéanciers ──────────────────────────────────────────────────────
+
+def _annuite(taux, nb_mois):
+    """Valeur actuelle de nb_mois paiements unitaires échus au taux mensuel `taux` (vectorisé)."""
+    nb_mois = np.maximum(nb_mois, 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        va = (1 - (1 + taux) ** -nb_mois) / taux
+    return np.where(taux > 0, va, nb_mois)
+
+
+def calculer_echeancier(registre):
+    """
+    Échéancier complet de tous les baux, tous les mois calculés d'un coup (matrices baux × mois).
+    Retourne un DataFrame long : une ligne par (bail, mois actif), colonnes COLONNES_ECHEANCIER.
+    """
+    if registre.empty:
+        return pd.DataFrame(columns=COLONNES_ECHEANCIER)
+
+    debut    = registre["Date_debut"].dt.year.to_numpy() * 12 + registre["Date_debut"].dt.month.to_numpy() - 1
+    n        = registre["Duree_mois"].to_numpy()[:, None]
+    loyer    = registre["Loyer_mensuel"].to_numpy(dtype=float)[:, None]
+    taux     = ((1 + registre["Taux_annuel"].to_numpy()) ** (1 / 12) - 1)[:, None]
+    a_echoir = registre["A_echoir"].to_numpy()[:, None]
+
+    mois  = np.arange(debut.min(), (debut + registre["Duree_mois"].to_numpy()).max())
+    k     = mois[None, :] - debut[:, None]                 # rang du mois dans le bail
+    actif = (k >= 0) & (k < n)
+
+    # Dette d'ouverture = VA des loyers restants (le loyer du mois inclus s'il est payé en début de mois)
+    restants_apres = _annuite(taux, n - k - 1)
+    ouverture = np.where(a_echoir, loyer * (1 + restants_apres), loyer * _annuite(taux, n - k))
+    interets  = taux * (ouverture - np.where(a_echoir, loyer, 0.0))
+    cloture   = ouverture + interets - loyer
+
+    # ROU = dette initiale, amortie linéairement sur la durée
+    rou_initial   = ouverture[np.arange(len(registre)), debut - mois[0]][:, None]
+    amortissement = np.broadcast_to(rou_initial / n, k.shape)
+    rou_cloture   = rou_initial - amortissement * (k + 1)
+
+    lignes, colonnes = np.nonzero(actif)
+    m = mois[colonnes]
+    return pd.DataFrame({
+        "Entite"         : registre["Entite"].to_numpy()[lignes],
+        "Bail"           : registre["Bail"].to_numpy()[lignes],
+        "Periode"        : [f"{a}{b:02d}" for a, b in zip(m // 12, m % 12 + 1)],
+        "Dette_ouverture": ouverture[actif],
+        "Paiement"       : np.broadcast_to(loyer, k.shape)[actif],
+        "Interets"       : interets[actif],
+        "Dette_cloture"  : np.where(np.abs(cloture) < 1e-6, 0.0, cloture)[actif],
+        "Amortissement"  : amortissement[actif],
+        "ROU_cloture"    : np.where(np.abs(rou_cloture) < 1e-6, 0.0, rou_cloture)[actif],
+    })
+
+
+def get_echeancier(registre_file=IFRS16_REGISTRE_FILE, cache_folder=FOLDERS["cache"]):
+    """Échéancier du registre, depuis la mémoire ou le cache Parquet tant que le registre ne change pas."""
+    empreinte = empreinte_fichiers(registre_file)
+    echeancier, origine = table_derivee("ifrs16", "echeancier", empreinte,
+                                         lambda: calculer_echeancier(load_registre(registre_file)), cache_folder)
+    if origine == "cache":
+        log.info(f"[ifrs16_07] Échéancier en cache ({empreinte}) : {echeancier['Bail'].nunique()} baux")
+    elif origine == "calcul":
+        log.info(f"[ifrs16_07] Échéancier calculé : {echeancier['Bail'].nunique()} baux, "
+                 f"{echeancier['Periode'].nunique()} mois")
+    return echeancier
+
+
+# ── Point d'entrée ────────────────────────────────────────────────────────────
+
+def _impacts_legacy(loyers):
+    """Sans registre : loyer comptabilisé neutralisé et repris à l'identique en amortissement ROU."""
+    return {e: {"loyer": l, "amortissement": l, "interets": 0.0, "dette": 0.0, "rou": 0.0} for e, l in loyers.items()}
+
 
+def run(df_fec: pd.DataFrame, period: str, loyers: dict = None, registre_file: str = IFRS16_REGISTRE_FILE,
+        cfg=None) -> dict:
+    """`loyers` : {entité: montant} précalculés (mode out-of-core) — df_fec n'est alors pas lu."""
+    cfg = cfg or config_defaut()
+    if loyers is None:
+        loyers = {e: _extract_loyers(df_fec, period, e, cfg.IFRS16_LOYER_ACCOUNTS) for e in cfg.IFRS16_ENTITIES}
+    else:
+        loyers = {e: round(loyers.get(e, 0.0), 2) for e in cfg.IFRS16_ENTITIES}
 
-def run(df_fec: pd.DataFrame, period: str) -> dict:
-    loyers = {e: _extract_loyers(df_fec, period, e) for e in IFRS16_ENTITIES}
+    if not Path(registre_file).exists():
+        log.warning(f"[ifrs16_07] ⚠️  Registre des baux absent ({registre_file}) — loyer comptabilisé repris en ROU D&A")
+        impacts       = _impacts_legacy(loyers)
+        df_echeancier = pd.DataFrame(columns=COLONNES_ECHEANCIER)
+    else:
+        echeancier    = get_echeancier(registre_file, cfg.FOLDERS["cache"])
+        df_echeancier = echeancier[echeancier["Periode"] == str(period)].reset_index(drop=True)
+        par_entite    = df_echeancier.groupby("Entite")[["Paiement", "Amortissement", "Interets", "Dette_cloture", "ROU_cloture"]].sum()
+        impacts = {
+            e: {
+                "loyer"        : round(r["Paiement"], 2),
+                "amortissement": round(r["Amortissement"], 2),
+                "interets"     : round(r["Interets"], 2),
+                "dette"        : round(r["Dette_cloture"], 2),
+                "rou"          : round(r["ROU_cloture"], 2),
+            }
+            for e, r in par_entite.iterrows()
+        }
+        # Rapprochement loyers comptabilisés (FEC) / loyers du registre
+        for e, comptabilise in loyers.items():
+            ecart = comptabilise - impacts.get(e, {}).get("loyer", 0.0)
+            if abs(ecart) > cfg.SEUIL_ECART_INTERCO:
+                evenement(log, logging.WARNING, "ifrs16.ecart_loyers",
+                          f"[ifrs16_07] ⚠️  {e} : loyers FEC {comptabilise:,.2f} € vs registre — écart {ecart:,.2f} €",
+                          entite=e, ecart=round(ecart, 2))
 
+    lignes = [("Loyer neutralisé (EBITDA)", "loyer", 1), ("Amortissement ROU (D&A)", "amortissement", -1)]
+    if not df_echeancier.empty:
+        lignes += [("Intérêts dette locative (Fin.)", "interets", -1), ("Dette locative (clôture)", "dette", 1),
+                   ("Droit d'utilisation (clôture)", "rou", 1)]
     df_ifrs16 = pd.DataFrame(
-        [{"Entite": e, "Ligne": "Loyer neutralisé (EBITDA)", "Montant":  loyers[e]} for e in IFRS16_ENTITIES] +
-        [{"Entite": e, "Ligne": "Amortissement ROU (D&A)",   "Montant": -loyers[e]} for e in IFRS16_ENTITIES]
+        [{"Entite": e, "Ligne": ligne, "Montant": signe * i[cle]} for ligne, cle, signe in lignes for e, i in impacts.items()],
+        columns=["Entite", "Ligne", "Montant"],
     )
 
-    for e in IFRS16_ENTITIES:
-        print(f"[ifrs16_07] {e} — Loyer : {loyers[e]:>10,.2f} € | ROU D&A : {-loyers[e]:>10,.2f} €")
+    for e, i in impacts.items():
+        evenement(log, logging.INFO, "ifrs16.entite",
+                  f"[ifrs16_07] {e} — Loyer : {i['loyer']:>10,.2f} € | ROU D&A : {-i['amortissement']:>10,.2f} € "
+                  f"| Intérêts : {0.0 - i['interets']:>9,.2f} €", entite=e, **i)
 
     return {
-        "loyers_pid":     loyers["PID"],
-        "loyers_celsius": loyers["CELSIUS"],
-        "rou_pid":        loyers["PID"],
-        "rou_celsius":    loyers["CELSIUS"],
-        "df_ifrs16":      df_ifrs16,
+        "impacts"      : impacts,
+        "df_ifrs16"    : df_ifrs16,
+        "df_echeancier": df_echeancier,
     }
 
 
 if __name__ == "__main__":
-    from config import FOLDERS
     from scripts.load_fec_01 import load_fec_entites, detect_periode
 
     periode = detect_periode(FOLDERS["fec"])
@@ -68,4 +229,4 @@ if __name__ == "__main__":
     result  = run(df_fec, periode)
 
     print("\nDétail IFRS 16 :")
-    print(result["df_ifrs16"].to_string(index=False))
\ No newline at end of file
+    print(result["df_ifrs16"].to_string(index=False))
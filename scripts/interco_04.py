@@ -1,9 +1,15 @@
+import logging
 import pandas as pd
 import os
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from config import SEUIL_ECART_INTERCO
+from scripts.interco_rapprochement import resume_paire, _cote
+from scripts.comptes import encoder_comptes
+from scripts.journal import journal, evenement
+
+log = journal(__name__)
 
 
 def load_interco(mapping_folder):
@@ -16,56 +22,73 @@ def load_interco(mapping_folder):
         for col in df.columns:
             df[col] = df[col].fillna('').str.strip()
 
-    print(f"\nConfiguration intercos chargée :")
-    print(f"  Intercos P&L : {len(df_interco_pl)} paires")
-    print(f"  Intercos BS  : {len(df_interco_bs)} paires")
+    log.info(f"\nConfiguration intercos chargée :")
+    log.info(f"  Intercos P&L : {len(df_interco_pl)} paires")
+    log.info(f"  Intercos BS  : {len(df_interco_bs)} paires")
     return df_interco_pl, df_interco_bs
 
 
-def _extraire_montant(df, entite, compte, filtre_lib):
-    """Extrait le montant net (Mouvement) pour un compte/entité avec filtre optionnel."""
-    masque = (df['Entite'] == entite) & (df['CompteNum'] == compte)
+def _masque_compte(df, entite, compte):
+    """Lignes (ou agrégats) de `entite` sur le compte `compte` (numéro interco.xlsx) : comparaison sur CompteId."""
+    return (df['Entite'] == entite) & (df['CompteId'] == encoder_comptes([compte])[0])
 
-    if filtre_lib:
-        mots = [m.strip().upper() for m in filtre_lib.split(',')]
-        masque &= df['EcritureLib'].str.upper().apply(lambda x: any(m in str(x) for m in mots))
 
-    return df[masque]['Mouvement'].sum()
+def calculer_montants_intercos(df, df_interco):
+    """
+    Montants (A, B) de chaque paire configurée — additifs : sommables bloc par bloc.
+    Une jointure (Entite, CompteId) → (paire, côté) et un masque vectorisé par filtre EcritureLib
+    distinct (interco_rapprochement._cote), puis une seule agrégation par (paire, côté).
+    """
+    if df_interco.empty:
+        return []
+    lignes = df[['Entite', 'CompteId', 'EcritureLib', 'Mouvement']]
+    cotes  = pd.concat([_cote(lignes, df_interco, 'A'), _cote(lignes, df_interco, 'B')], ignore_index=True)
+    montants = (cotes.groupby(['Paire', 'Cote'])['Mouvement'].sum().unstack('Cote')
+                .reindex(index=df_interco.index, columns=['A', 'B']).fillna(0.0))
+    return list(montants.itertuples(index=False, name=None))
 
 
-def _log_elimination(desc, ecart, montant_ref, comment=''):
-    if abs(ecart) > SEUIL_ECART_INTERCO:
+def _log_elimination(desc, ecart, montant_ref, comment='', detail='', seuil=SEUIL_ECART_INTERCO):
+    if abs(ecart) > seuil:
         msg = f"  ⚠️  {desc} : écart de {ecart:,.2f} — élimination forcée"
         if comment:
             msg += f" ({comment})"
-        print(msg)
+        if detail:
+            msg += f"\n      → {detail}"
+        evenement(log, logging.WARNING, "interco.ecart", msg, paire=desc, ecart=round(ecart, 2), commentaire=comment)
     else:
-        print(f"  ✅ {desc} : élimination équilibrée ({montant_ref:,.2f})")
+        evenement(log, logging.INFO, "interco.elimination", f"  ✅ {desc} : élimination équilibrée ({montant_ref:,.2f})",
+                  paire=desc, montant=round(montant_ref, 2))
 
 
-def eliminer_intercos_pl(df_fec_mois, df_mapped, df_interco_pl):
-    print(f"\nÉlimination intercos P&L...")
+def eliminer_intercos_pl(df_fec_mois, df_mapped, df_interco_pl, montants=None, rapprochement=None,
+                         seuil=SEUIL_ECART_INTERCO):
+    """
+    `montants`      : paires (A, B) précalculées (mode out-of-core) — df_fec_mois n'est alors pas lu.
+    `rapprochement` : synthèse interco_rapprochement — détaille l'écart des paires non équilibrées.
+    """
+    log.info(f"\nÉlimination intercos P&L...")
 
     df_elimine = df_mapped.copy()
     recaps     = []
 
-    for _, row in df_interco_pl.iterrows():
-        entite_a, compte_a, filtre_a = row['Entite_A'], row['Compte_Entite_A'], row['Filtre_EcritureLib_A']
-        entite_b, compte_b, filtre_b = row['Entite_B'], row['Compte_Entite_B'], row['Filtre_EcritureLib_B']
-        desc, comment = row['Description'], row.get('Commentaire', '')
+    if montants is None:
+        montants = calculer_montants_intercos(df_fec_mois, df_interco_pl)
 
-        montant_a = _extraire_montant(df_fec_mois, entite_a, compte_a, filtre_a)
-        montant_b = _extraire_montant(df_fec_mois, entite_b, compte_b, filtre_b)
+    for (_, row), (montant_a, montant_b) in zip(df_interco_pl.iterrows(), montants):
+        entite_a, compte_a = row['Entite_A'], row['Compte_Entite_A']
+        entite_b, compte_b = row['Entite_B'], row['Compte_Entite_B']
+        desc, comment = row['Description'], row.get('Commentaire', '')
 
         if montant_a == 0 and montant_b == 0:
-            print(f"  ℹ️  {desc} : aucun mouvement ce mois — ignoré")
+            log.info(f"  ℹ️  {desc} : aucun mouvement ce mois — ignoré")
             continue
 
         ecart = montant_a + montant_b
-        _log_elimination(desc, ecart, montant_a, comment)
+        _log_elimination(desc, ecart, montant_a, comment, resume_paire(rapprochement, 'PL', desc), seuil)
 
-        df_elimine.loc[(df_elimine['Entite'] == entite_a) & (df_elimine['CompteNum'] == compte_a), 'Mouvement'] = 0
-        df_elimine.loc[(df_elimine['Entite'] == entite_b) & (df_elimine['CompteNum'] == compte_b), 'Mouvement'] = 0
+        df_elimine.loc[_masque_compte(df_elimine, entite_a, compte_a), 'Mouvement'] = 0
+        df_elimine.loc[_masque_compte(df_elimine, entite_b, compte_b), 'Mouvement'] = 0
 
         recaps.append({
             'Description': desc, 'Entite_A': entite_a, 'Compte_A': compte_a,
@@ -76,29 +99,36 @@ def eliminer_intercos_pl(df_fec_mois, df_mapped, df_interco_pl):
     return df_elimine, pd.DataFrame(recaps)
 
 
-def eliminer_intercos_bs(df_fec_ytd, df_bilan_mapped, df_interco_bs):
-    print(f"\nÉlimination intercos Bilan...")
+def eliminer_intercos_bs(df_fec_ytd, df_bilan_mapped, df_interco_bs, montants=None, rapprochement=None,
+                         seuil=SEUIL_ECART_INTERCO):
+    """
+    `montants` : paires (A, B) précalculées (mode out-of-core). Si df_fec_ytd vaut None,
+    seul le récapitulatif est produit (pas de copie du FEC éliminé).
+    `rapprochement` : synthèse interco_rapprochement — détaille l'écart des paires non équilibrées.
+    """
+    log.info(f"\nÉlimination intercos Bilan...")
 
-    df_elimine = df_fec_ytd.copy()
+    df_elimine = df_fec_ytd.copy() if df_fec_ytd is not None else None
     recaps     = []
 
-    for _, row in df_interco_bs.iterrows():
-        entite_a, compte_a, filtre_a = row['Entite_A'], row['Compte_Entite_A'], row['Filtre_EcritureLib_A']
-        entite_b, compte_b, filtre_b = row['Entite_B'], row['Compte_Entite_B'], row['Filtre_EcritureLib_B']
-        desc, comment = row['Description'], row.get('Commentaire', '')
+    if montants is None:
+        montants = calculer_montants_intercos(df_fec_ytd, df_interco_bs)
 
-        solde_a = _extraire_montant(df_fec_ytd, entite_a, compte_a, filtre_a)
-        solde_b = _extraire_montant(df_fec_ytd, entite_b, compte_b, filtre_b)
+    for (_, row), (solde_a, solde_b) in zip(df_interco_bs.iterrows(), montants):
+        entite_a, compte_a = row['Entite_A'], row['Compte_Entite_A']
+        entite_b, compte_b = row['Entite_B'], row['Compte_Entite_B']
+        desc, comment = row['Description'], row.get('Commentaire', '')
 
         if solde_a == 0 and solde_b == 0:
-            print(f"  ℹ️  {desc} : aucun solde — ignoré")
+            log.info(f"  ℹ️  {desc} : aucun solde — ignoré")
             continue
 
         ecart = solde_a + solde_b
-        _log_elimination(desc, ecart, solde_a, comment)
+        _log_elimination(desc, ecart, solde_a, comment, resume_paire(rapprochement, 'BS', desc), seuil)
 
-        df_elimine.loc[(df_elimine['Entite'] == entite_a) & (df_elimine['CompteNum'] == compte_a), 'Mouvement'] = 0
-        df_elimine.loc[(df_elimine['Entite'] == entite_b) & (df_elimine['CompteNum'] == compte_b), 'Mouvement'] = 0
+        if df_elimine is not None:
+            df_elimine.loc[_masque_compte(df_elimine, entite_a, compte_a), 'Mouvement'] = 0
+            df_elimine.loc[_masque_compte(df_elimine, entite_b, compte_b), 'Mouvement'] = 0
 
         recaps.append({
             'Description': desc, 'Entite_A': entite_a, 'Compte_A': compte_a,
@@ -0,0 +1,107 @@
+"""
+interco_historique.py — Historique des écarts intercos (paire × mois)
+-----------------------------------------------------------------------
+Logique :
+  - Une seule passe groupée sur les lignes des comptes intercos du ledger en cache
+    (interco_rapprochement.lignes_intercos) : montants A / B de chaque paire de interco.xlsx
+    pour chaque mois présent dans le ledger, sans rejouer eliminer_intercos_pl mois par mois
+      · paires P&L   : mouvements du mois hors À Nouveaux
+      · paires Bilan : soldes cumulés à chaque fin de mois (À Nouveaux inclus)
+  - Mêmes règles de sélection que le stage 04 (entité, compte, filtre EcritureLib)
+  - Les résultats sont persistés dans data/cache/interco_historique.parquet : les mois recalculés
+    remplacent les précédents pour les paires de la clôture (le FEC le plus récent fait foi pour
+    les mois qu'il couvre ; les paires des autres groupes du cache partagé sont conservées)
+
+Colonnes : Vue | Description | Mois | Montant_A | Montant_B | Ecart | Periode   (Periode = clôture source)
+"""
+
+import pandas as pd
+import os
+import sys
+from pathlib import Path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import FOLDERS, JOURNAL_AN
+from scripts.monthly_movements_02 import get_mois_periode
+from scripts.interco_rapprochement import lignes_intercos, _cote
+from scripts.journal import journal
+from scripts.ledger_store import verrou_cache
+
+log = journal(__name__)
+
+
+COLONNES_HISTORIQUE = ["Vue", "Description", "Mois", "Montant_A", "Montant_B", "Ecart", "Periode"]
+
+
+def chemin_historique(cache_folder=FOLDERS["cache"]):
+    return Path(cache_folder) / "interco_historique.parquet"
+
+
+def charger_historique(cache_folder=FOLDERS["cache"]):
+    chemin = chemin_historique(cache_folder)
+    if not chemin.exists():
+        return pd.DataFrame(columns=COLONNES_HISTORIQUE)
+    return pd.read_parquet(chemin)
+
+
+def _montants_par_mois(lignes, df_interco, cumul):
+    """(Paire, Mois) → Montant_A, Montant_B ; cumul=True : soldes de fin de mois."""
+    cotes = pd.concat([_cote(lignes, df_interco, "A"), _cote(lignes, df_interco, "B")], ignore_index=True)
+    if cotes.empty:
+        return pd.DataFrame(columns=["Paire", "Mois", "Montant_A", "Montant_B"])
+
+    cotes["Mois"] = cotes["EcritureDate"].dt.to_period("M")
+    montants = cotes.groupby(["Paire", "Mois", "Cote"])["Mouvement"].sum().unstack("Cote") \
+                    .reindex(columns=["A", "B"]).fillna(0.0)
+
+    if cumul:
+        # Tous les mois de la plage, même sans mouvement, puis cumul par paire
+        mois  = pd.period_range(cotes["Mois"].min(), cotes["Mois"].max(), freq="M")
+        index = pd.MultiIndex.from_product([montants.index.levels[0], mois], names=["Paire", "Mois"])
+        montants = montants.reindex(index, fill_value=0.0).groupby(level="Paire").cumsum()
+
+    montants = montants.rename(columns={"A": "Montant_A", "B": "Montant_B"}).reset_index()
+    montants["Mois"] = montants["Mois"].dt.strftime("%Y%m")
+    return montants
+
+
+def calculer_historique(lignes, df_interco_pl, df_interco_bs, periode):
+    """Montants et écarts de chaque paire pour chaque mois du ledger jusqu'à la fin de `periode`."""
+    _, date_fin = get_mois_periode(periode)
+    lignes = lignes[lignes["EcritureDate"] <= date_fin]
+
+    parts = []
+    for vue, df_interco, perimetre, cumul in [
+        ("PL", df_interco_pl, lignes[lignes["JournalCode"] != JOURNAL_AN], False),
+        ("BS", df_interco_bs, lignes, True),
+    ]:
+        montants = _montants_par_mois(perimetre, df_interco, cumul)
+        montants["Vue"]         = vue
+        montants["Description"] = montants["Paire"].map(df_interco["Description"])
+        parts.append(montants)
+
+    historique = pd.concat(parts, ignore_index=True)
+    historique["Ecart"]   = historique["Montant_A"] + historique["Montant_B"]
+    historique["Periode"] = str(periode)
+    return historique[COLONNES_HISTORIQUE]
+
+
+def mettre_a_jour_historique(periode, df_interco_pl, df_interco_bs, cache_folder=FOLDERS["cache"]):
+    """Recalcule l'historique depuis le ledger en cache de `periode` et le persiste. Retourne l'historique complet."""
+    lignes   = lignes_intercos(periode, df_interco_pl, df_interco_bs, cache_folder)
+    nouveaux = calculer_historique(lignes, df_interco_pl, df_interco_bs, periode)
+
+    with verrou_cache("interco_historique", cache_folder):
+        historique = charger_historique(cache_folder)
+        paires     = pd.concat([df_interco_pl["Description"], df_interco_bs["Description"]])
+        remplacees = historique["Mois"].isin(nouveaux["Mois"]) & historique["Description"].isin(paires)
+        historique = pd.concat([historique[~remplacees], nouveaux], ignore_index=True)
+        historique = historique.sort_values(["Vue", "Description", "Mois"]).reset_index(drop=True)
+
+        chemin = chemin_historique(cache_folder)
+        chemin.parent.mkdir(parents=True, exist_ok=True)
+        historique.to_parquet(chemin, index=False)
+
+    log.info(f"[interco_historique] {nouveaux['Mois'].nunique()} mois recalculés — "
+          f"historique : {historique['Mois'].nunique()} mois, {historique['Description'].nunique()} paires")
+    return historique
@@ -0,0 +1,229 @@
+"""
+interco_rapprochement.py — Rapprochement ligne à ligne des intercos (stage 04)
+--------------------------------------------------------------------------------
+Logique :
+  - Lit dans le ledger en cache (ledger_store) les seules lignes des comptes intercos configurés
+    (interco.xlsx), avec les mêmes règles que interco_04 : entité, compte et filtre EcritureLib,
+    mouvements du mois hors À Nouveaux pour les paires P&L, toutes les lignes pour les paires Bilan
+  - Apparie les lignes du côté A et du côté B de chaque paire par jointures de hachage sur des
+    clés de blocage, jamais par boucles imbriquées :
+      1. rapproché : montants opposés au centime (clé Paire × centimes), dates à moins de
+         INTERCO_FENETRE_JOURS ; un jeton commun départage les candidats
+      2. partiel   : lignes restantes partageant un jeton PieceRef / EcritureLib normalisé
+         (clé Paire × jeton), de sens opposés, dans la même fenêtre ; l'écart est reporté
+      3. orphelin  : lignes sans contrepartie
+  - Appariement 1-1 glouton et vectorisé : chaque ligne A garde son meilleur candidat, puis chaque
+    ligne B le sien ; on recommence sur les candidats restants
+  - Jetons : alphanumériques d'au moins INTERCO_JETON_MIN caractères contenant un chiffre, réduits
+    à leurs chiffres sans zéros de tête (F000123 ≡ FA-000123 ≡ 123). Un jeton porté par plus de
+    INTERCO_JETON_FREQ_MAX lignes d'un côté (année, mois…) n'est pas discriminant et est ignoré
+
+Output :
+  - lignes   : Vue | Description | Cote | LigneId | Entite | CompteNum | ... | Statut | Rapprochement | Ecart
+  - synthese : par paire, nombre de rapprochements exacts / partiels, de lignes orphelines et décomposition
+               de l'écart de la paire (écarts des partiels + montants orphelins)
+"""
+
+import numpy as np
+import pandas as pd
+import re
+import os
+import sys
+from pathlib import Path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import FOLDERS, JOURNAL_AN, INTERCO_FENETRE_JOURS, INTERCO_JETON_MIN, INTERCO_JETON_FREQ_MAX
+from scripts.monthly_movements_02 import get_mois_periode
+from scripts.ledger_store import dossier_ledger
+from scripts.comptes import encoder_comptes
+from scripts.pipeline_config import config_defaut
+from scripts.journal import journal
+
+log = journal(__name__)
+
+
+COLONNES_LEDGER = ['LigneId', 'Entite', 'CompteId', 'JournalCode', 'EcritureDate', 'PieceRef', 'EcritureLib',
+                   'Mouvement']
+COLONNES_LIGNES = ['LigneId', 'Entite', 'CompteNum', 'JournalCode', 'EcritureDate', 'PieceRef', 'EcritureLib',
+                   'Mouvement']   # CompteNum : numéro du compte dans interco.xlsx
+COLONNES_SYNTHESE = ['Vue', 'Description', 'Lignes_A', 'Lignes_B', 'Rapprochees', 'Partielles', 'Orphelines',
+                     'Ecart_partiels', 'Montant_orphelins', 'Ecart_total']
+
+
+def lignes_intercos(periode, df_interco_pl, df_interco_bs, cache_folder=FOLDERS["cache"]):
+    """Lignes du ledger en cache sur les comptes intercos configurés (filtre poussé au Parquet)."""
+    comptes = sorted({
+        c for df in (df_interco_pl, df_interco_bs) for col in ('Compte_Entite_A', 'Compte_Entite_B')
+        for c in df[col] if c
+    })
+    if not comptes:
+        return pd.DataFrame(columns=COLONNES_LEDGER)
+    return pd.read_parquet(dossier_ledger(periode, cache_folder), columns=COLONNES_LEDGER,
+                           filters=[('CompteId', 'in', encoder_comptes(comptes).tolist())])
+
+
+def _masque_filtre(libelles, filtre_lib):
+    """Un des mots du filtre (séparés par des virgules) présent dans EcritureLib, sans tenir compte de la casse."""
+    mots = [re.escape(m.strip().upper()) for m in filtre_lib.split(',')]
+    return libelles.fillna('').str.upper().str.contains('|'.join(mots), regex=True)
+
+
+def _cote(df_lignes, df_interco, cote):
+    """Lignes du côté A ou B de chaque paire : jointure sur (Entite, CompteId) puis filtre EcritureLib."""
+    cles = df_interco[[f'Entite_{cote}', f'Compte_Entite_{cote}', f'Filtre_EcritureLib_{cote}']]
+    cles = cles.set_axis(['Entite', 'CompteNum', 'Filtre'], axis=1).rename_axis('Paire').reset_index()
+    cles['CompteId'] = encoder_comptes(cles['CompteNum'])
+    lignes = df_lignes.merge(cles, on=['Entite', 'CompteId'])
+
+    garde = pd.Series(True, index=lignes.index)
+    for filtre, idx in lignes.groupby('Filtre').groups.items():
+        if filtre:
+            garde[idx] = _masque_filtre(lignes.loc[idx, 'EcritureLib'], filtre)
+    lignes = lignes[garde & (lignes['Mouvement'] != 0)].drop(columns='Filtre').reset_index(drop=True)
+    return lignes.assign(Cle=np.arange(len(lignes)), Cote=cote)
+
+
+def _jetons(lignes, longueur_min=INTERCO_JETON_MIN, freq_max=INTERCO_JETON_FREQ_MAX):
+    """(Paire, Cle, Jeton) — jetons discriminants de PieceRef + EcritureLib."""
+    textes = (lignes['PieceRef'].fillna('') + ' ' + lignes['EcritureLib'].fillna('')).str.upper()
+    jetons = pd.DataFrame({
+        'Paire': lignes['Paire'].to_numpy(),
+        'Cle'  : lignes['Cle'].to_numpy(),
+        'Jeton': textes.str.findall(r'[A-Z0-9]+').to_numpy(),
+    }).explode('Jeton').dropna()
+    jetons = jetons[(jetons['Jeton'].str.len() >= longueur_min) & jetons['Jeton'].str.contains(r'\d')]
+    jetons['Jeton'] = jetons['Jeton'].str.replace(r'\D', '', regex=True).str.lstrip('0')
+    jetons = jetons[jetons['Jeton'] != ''].drop_duplicates()
+
+    frequence = jetons.groupby(['Paire', 'Jeton'])['Cle'].transform('size')
+    return jetons[frequence <= freq_max]
+
+
+def _apparier(candidats, tri, croissant):
+    """Appariement 1-1 glouton des candidats (Cle_A, Cle_B) classés selon `tri`."""
+    candidats = candidats.sort_values(tri + ['Cle_A', 'Cle_B'], ascending=croissant + [True, True])
+    retenus   = [candidats.iloc[:0]]
+    while len(candidats):
+        choix = candidats.drop_duplicates('Cle_A').drop_duplicates('Cle_B')
+        retenus.append(choix)
+        candidats = candidats[~candidats['Cle_A'].isin(choix['Cle_A']) & ~candidats['Cle_B'].isin(choix['Cle_B'])]
+    return pd.concat(retenus, ignore_index=True)
+
+
+def _candidats(cles, a, b, fenetre):
+    """Complète des couples (Cle_A, Cle_B) avec dates / montants et applique la fenêtre de dates."""
+    cand = cles.merge(a[['Cle', 'EcritureDate', 'Mouvement']].add_suffix('_A'), on='Cle_A') \
+               .merge(b[['Cle', 'EcritureDate', 'Mouvement']].add_suffix('_B'), on='Cle_B')
+    cand['Jours'] = (cand['EcritureDate_A'] - cand['EcritureDate_B']).dt.days.abs()
+    return cand[cand['Jours'] <= fenetre]
+
+
+def rapprocher(df_lignes, df_interco, vue, fenetre=INTERCO_FENETRE_JOURS,
+               jeton_min=INTERCO_JETON_MIN, jeton_freq_max=INTERCO_JETON_FREQ_MAX):
+    """
+    Rapproche les lignes du ledger (COLONNES_LEDGER) des paires de `df_interco` pour une vue ('PL' ou 'BS').
+    Retourne (lignes, synthese).
+    """
+    a, b = _cote(df_lignes, df_interco, 'A'), _cote(df_lignes, df_interco, 'B')
+
+    # Couples partageant au moins un jeton (clé de blocage Paire × jeton)
+    jetons_a, jetons_b = _jetons(a, jeton_min, jeton_freq_max), _jetons(b, jeton_min, jeton_freq_max)
+    communs = jetons_a.merge(jetons_b, on=['Paire', 'Jeton'], suffixes=('_A', '_B')) \
+                      .groupby(['Cle_A', 'Cle_B']).size().rename('Jetons').reset_index()
+
+    # 1 — Montants opposés au centime (clé de blocage Paire × centimes)
+    cles = a[['Paire', 'Cle']].assign(Centimes=(a['Mouvement'] * 100).round().astype('int64')).merge(
+        b[['Paire', 'Cle']].assign(Centimes=-(b['Mouvement'] * 100).round().astype('int64')),
+        on=['Paire', 'Centimes'], suffixes=('_A', '_B'),
+    )[['Cle_A', 'Cle_B']]
+    cand = _candidats(cles, a, b, fenetre).merge(communs, on=['Cle_A', 'Cle_B'], how='left').fillna({'Jetons': 0})
+    exacts = _apparier(cand, ['Jetons', 'Jours'], [False, True]).assign(Statut='rapproché')
+
+    # 2 — Jeton commun, montants différents, sur les lignes restantes
+    restants = communs[~communs['Cle_A'].isin(exacts['Cle_A']) & ~communs['Cle_B'].isin(exacts['Cle_B'])]
+    cand = _candidats(restants, a, b, fenetre)
+    cand = cand[cand['Mouvement_A'] * cand['Mouvement_B'] < 0]
+    cand = cand.assign(Ecart_abs=(cand['Mouvement_A'] + cand['Mouvement_B']).abs())
+    partiels = _apparier(cand, ['Jetons', 'Ecart_abs', 'Jours'], [False, True, True]).assign(Statut='partiel')
+
+    paires = pd.concat([exacts, partiels], ignore_index=True)
+    paires['Rapprochement'] = np.arange(1, len(paires) + 1)
+    paires['Ecart'] = paires['Mouvement_A'] + paires['Mouvement_B']
+
+    lignes = pd.concat([
+        a.merge(paires[['Cle_A', 'Statut', 'Rapprochement', 'Ecart']], left_on='Cle', right_on='Cle_A', how='left'),
+        b.merge(paires[['Cle_B', 'Statut', 'Rapprochement', 'Ecart']], left_on='Cle', right_on='Cle_B', how='left'),
+    ], ignore_index=True)
+    lignes['Statut']        = lignes['Statut'].fillna('orphelin')
+    lignes['Rapprochement'] = lignes['Rapprochement'].astype('Int64')
+    lignes['Vue']           = vue
+    lignes['Description']   = lignes['Paire'].map(df_interco['Description'])
+    lignes = lignes[['Vue', 'Description', 'Cote'] + COLONNES_LIGNES + ['Statut', 'Rapprochement', 'Ecart']] \
+        .sort_values(['Description', 'Statut', 'Rapprochement', 'Cote', 'EcritureDate']).reset_index(drop=True)
+
+    return lignes, _synthese(lignes, df_interco, vue)
+
+
+def _synthese(lignes, df_interco, vue):
+    cote_a    = lignes['Cote'] == 'A'
+    orphelins = lignes['Statut'] == 'orphelin'
+    comptes = lignes.assign(
+        Lignes_A          = cote_a,
+        Lignes_B          = ~cote_a,
+        Rapprochees       = cote_a & (lignes['Statut'] == 'rapproché'),
+        Partielles        = cote_a & (lignes['Statut'] == 'partiel'),
+        Orphelines        = orphelins,
+        Ecart_partiels    = lignes['Ecart'].where(cote_a & (lignes['Statut'] == 'partiel'), 0.0),
+        Montant_orphelins = lignes['Mouvement'].where(orphelins, 0.0),
+    ).groupby('Description')[COLONNES_SYNTHESE[2:-1]].sum()
+
+    synthese = comptes.reindex(df_interco['Description'], fill_value=0).reset_index()
+    synthese['Vue']         = vue
+    synthese['Ecart_total'] = synthese['Ecart_partiels'] + synthese['Montant_orphelins']
+    return synthese[COLONNES_SYNTHESE]
+
+
+def resume_paire(synthese, vue, description):
+    """Résumé d'une paire pour les logs du stage 04 ('' si la paire n'a pas été rapprochée)."""
+    if synthese is None:
+        return ''
+    ligne = synthese[(synthese['Vue'] == vue) & (synthese['Description'] == description)]
+    if ligne.empty:
+        return ''
+    r = ligne.iloc[0]
+    return (f"{r['Rapprochees']} rapprochement(s) exact(s), {r['Partielles']} partiel(s) "
+            f"(écart {r['Ecart_partiels']:,.2f}), {r['Orphelines']} ligne(s) orpheline(s) ({r['Montant_orphelins']:,.2f})")
+
+
+def run(periode, df_interco_pl, df_interco_bs, cache_folder=FOLDERS["cache"], cfg=None):
+    """Rapprochement des paires P&L (mois) et Bilan (toutes lignes). Retourne {'lignes', 'synthese'}."""
+    cfg = cfg or config_defaut()
+    parametres = dict(fenetre=cfg.INTERCO_FENETRE_JOURS, jeton_min=cfg.INTERCO_JETON_MIN,
+                      jeton_freq_max=cfg.INTERCO_JETON_FREQ_MAX)
+    date_debut, date_fin = get_mois_periode(periode)
+    lignes = lignes_intercos(periode, df_interco_pl, df_interco_bs, cache_folder)
+    mois   = lignes[(lignes['EcritureDate'] >= date_debut) & (lignes['EcritureDate'] <= date_fin) &
+                    (lignes['JournalCode'] != JOURNAL_AN)]
+
+    resultats = [rapprocher(mois, df_interco_pl, 'PL', **parametres),
+                 rapprocher(lignes, df_interco_bs, 'BS', **parametres)]
+    resultat  = {
+        'lignes'  : pd.concat([r[0] for r in resultats], ignore_index=True),
+        'synthese': pd.concat([r[1] for r in resultats], ignore_index=True),
+    }
+
+    log.info(f"\nRapprochement intercos ligne à ligne :")
+    for r in resultat['synthese'].itertuples(index=False):
+        log.info(f"  {r.Vue} · {r.Description} : {r.Rapprochees} exact(s), {r.Partielles} partiel(s), "
+              f"{r.Orphelines} ligne(s) orpheline(s)")
+    return resultat
+
+
+def sauver_rapprochement(resultat, periode, output_folder):
+    """Classeur rapprochement_interco_YYYYMM.xlsx : onglets Synthèse et Lignes."""
+    Path(output_folder).mkdir(parents=True, exist_ok=True)
+    chemin = Path(output_folder) / f"rapprochement_interco_{periode}.xlsx"
+    with pd.ExcelWriter(chemin, engine='openpyxl') as writer:
+        resultat['synthese'].to_excel(writer, sheet_name='Synthèse', index=False)
+        resultat['lignes'].to_excel(writer, sheet_name='Lignes', index=False)
+    return str(chemin)
@@ -0,0 +1,104 @@
+"""
+journal.py — Journal des stages : niveaux, événements structurés (JSON), aperçus paresseux
+---------------------------------------------------------------------------------------------
+Logique :
+  - Chaque module écrit dans son journal (journal(__name__) → logger 'fpa.<module>') au lieu de print :
+      · DEBUG   : aperçus de DataFrames, détail ligne à ligne (répartitions, comptes non mappés…)
+      · INFO    : progression des stages (ce qu'affichaient les print)
+      · WARNING : anomalies ⚠️ ; ERROR : échecs ❌
+  - Les aperçus coûteux (to_string, groupby de contrôle) sont enveloppés dans Paresseux / apercu :
+    ils ne sont calculés que si le niveau est actif, au moment de l'écriture
+  - Deux formats de sortie (console) :
+      · texte : message seul, sur stdout — rendu identique aux print historiques
+      · json  : un événement par ligne (ts, niveau, module, evenement, message + champs)
+    LOG_FICHIER ajoute une copie JSON lines des événements, quel que soit le format console
+  - evenement() attache des champs structurés (entité, lignes, écart…) ; les champs callables ne
+    sont évalués que si le niveau est actif
+  - Sans appel à configurer_journal (script lancé seul, notebook) : configuration de config.py
+    appliquée au premier journal demandé
+
+Paramètres : LOG_NIVEAU, LOG_FORMAT, LOG_FICHIER (config.py) ; main.py / fpa : --log-niveau, --log-format
+"""
+
+import json
+import logging
+import os
+import re
+import sys
+from datetime import datetime
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import LOG_NIVEAU, LOG_FORMAT, LOG_FICHIER
+
+
+RACINE_JOURNAL = "fpa"
+FORMATS        = ("texte", "json")
+_PREFIXE       = re.compile(r"^\s*\[\w+\]\s*")   # Préfixe « [module] » des messages texte
+
+
+class Paresseux:
+    """Valeur calculée seulement à l'écriture du message (str) : fn() n'est jamais appelée si le niveau est inactif."""
+    __slots__ = ("fn",)
+
+    def __init__(self, fn):
+        self.fn = fn
+
+    def __str__(self):
+        return str(self.fn())
+
+
+def apercu(df, colonnes=None, index=False):
+    """Aperçu to_string d'un DataFrame, rendu à la demande."""
+    return Paresseux(lambda: (df if colonnes is None else df[colonnes]).to_string(index=index))
+
+
+class _FormatJSON(logging.Formatter):
+    def format(self, record):
+        evt = {
+            "ts"       : datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "niveau"   : record.levelname,
+            "module"   : record.name.removeprefix(f"{RACINE_JOURNAL}."),
+            "evenement": getattr(record, "evenement", None),
+            "message"  : _PREFIXE.sub("", record.getMessage()).strip(),
+            **getattr(record, "champs", {}),
+        }
+        return json.dumps(evt, ensure_ascii=False, default=str)
+
+
+def configurer_journal(niveau=LOG_NIVEAU, format=LOG_FORMAT, fichier=LOG_FICHIER):
+    """(Re)configure le journal 'fpa' : niveau, format console, copie JSON lines optionnelle."""
+    if format not in FORMATS:
+        raise ValueError(f"Format de journal inconnu : {format} ({' | '.join(FORMATS)})")
+    racine = logging.getLogger(RACINE_JOURNAL)
+    for handler in list(racine.handlers):
+        racine.removeHandler(handler)
+        handler.close()
+
+    console = logging.StreamHandler(sys.stdout)
+    console.setFormatter(_FormatJSON() if format == "json" else logging.Formatter("%(message)s"))
+    racine.addHandler(console)
+    if fichier:
+        os.makedirs(os.path.dirname(os.path.abspath(fichier)), exist_ok=True)
+        copie = logging.FileHandler(fichier, encoding="utf-8")
+        copie.setFormatter(_FormatJSON())
+        racine.addHandler(copie)
+
+    racine.setLevel(niveau.upper() if isinstance(niveau, str) else niveau)
+    racine.propagate = False
+    return racine
+
+
+def journal(nom):
+    """Journal d'un module (nom = __name__ ; 'scripts.load_fec_01' → 'fpa.load_fec_01')."""
+    racine = logging.getLogger(RACINE_JOURNAL)
+    if not racine.handlers:
+        configurer_journal()
+    return logging.getLogger(f"{RACINE_JOURNAL}.{nom.rsplit('.', 1)[-1]}")
+
+
+def evenement(log, niveau, nom, message, **champs):
+    """Événement structuré : message + champs (callables évalués seulement si `niveau` est actif)."""
+    if not log.isEnabledFor(niveau):
+        return
+    champs = {cle: valeur() if callable(valeur) else valeur for cle, valeur in champs.items()}
+    log.log(niveau, message, extra={"evenement": nom, "champs": champs})
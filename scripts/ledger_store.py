@@ -0,0 +1,249 @@
+"""
+ledger_store.py — Cache colonnaire (Parquet) du ledger et des sorties de stages
+---------------------------------------------------------------------------------
+Arborescence (une par période) :
+  data/cache/YYYYMM/
+    ledger/part-00000.parquet, ...   # FEC consolidé (une part par bloc en mode out-of-core),
+                                     # comptes identifiés par CompteId seul (cf. comptes.parquet)
+                                     # colonne LigneId = position globale de la ligne
+    mappings.parquet                 # mapping_pcg.xlsx, toutes entités (colonne Entite)
+    comptes.parquet                  # Dimension compte : Entite | CompteId | CompteNum | CompteLib | Classe | Racine2/3/4
+    empreinte.json                   # Empreinte des fichiers d'entrée ayant produit le cache
+    df_mapped.parquet, df_pl_final.parquet, df_bilan_mapped.parquet, recap_pl.parquet, ...
+
+  data/cache/<domaine>/<nom>_<empreinte>.parquet   # Tables dérivées d'un fichier d'entrée
+                                                   # (échéancier IFRS 16, variation CAPEX, prévisionnel)
+  data/cache/.verrous/<table>.lock                 # Verrous des tables partagées entre groupes
+                                                   # (cube P&L, historiques, additions CAPEX)
+
+Le cache est réécrit à chaque exécution du pipeline ; il sert de source aux outils de
+drill-down (cf. scripts/query.py) sans recharger ni reparser les FEC. Les tables dérivées ne
+sont recalculées que lorsque l'empreinte de leurs entrées change (table_derivee). Les tables
+partagées mises à jour par lecture-modification-écriture le sont sous verrou_cache : les clôtures
+multi-groupes en parallèle (main.cloturer_groupes) ne perdent pas les lignes l'une de l'autre.
+"""
+
+import hashlib
+import json
+import numpy as np
+import pandas as pd
+import re
+import shutil
+import os
+import sys
+from contextlib import contextmanager
+from pathlib import Path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import FOLDERS
+from scripts.journal import journal
+
+log = journal(__name__)
+
+try:
+    import fcntl
+except ImportError:   # Windows
+    fcntl = None
+    import msvcrt
+
+
+LEDGER_ROW_GROUP = 65_536   # Lignes par row group : granularité de lecture de lire_lignes
+
+_derivees = {}   # {dossier/nom: (empreinte, table)} — réutilisé entre deux runs (fpa watch, pool multi-groupes)
+
+
+def dossier_periode(periode, cache_folder=FOLDERS["cache"]):
+    return Path(cache_folder) / str(periode)
+
+
+def dossier_ledger(periode, cache_folder=FOLDERS["cache"]):
+    return dossier_periode(periode, cache_folder) / "ledger"
+
+
+def reinitialiser_ledger(periode, cache_folder=FOLDERS["cache"]):
+    dossier = dossier_ledger(periode, cache_folder)
+    if dossier.exists():
+        shutil.rmtree(dossier)
+    dossier.mkdir(parents=True)
+    return dossier
+
+
+def ecrire_bloc_ledger(periode, num_bloc, bloc, debut=0, cache_folder=FOLDERS["cache"]):
+    """`debut` : position globale de la première ligne du bloc (colonne LigneId)."""
+    bloc = bloc.assign(LigneId=np.arange(debut, debut + len(bloc), dtype='int64'))
+    bloc.to_parquet(
+        dossier_ledger(periode, cache_folder) / f"part-{num_bloc:05d}.parquet",
+        index=False, row_group_size=LEDGER_ROW_GROUP,
+    )
+
+
+def sauver_ledger(periode, df, cache_folder=FOLDERS["cache"]):
+    reinitialiser_ledger(periode, cache_folder)
+    ecrire_bloc_ledger(periode, 0, df, 0, cache_folder)
+    log.info(f"[ledger_store] Ledger {periode} mis en cache ({len(df)} lignes)")
+
+
+def sauver_tables(periode, tables, cache_folder=FOLDERS["cache"]):
+    """tables : {nom: DataFrame} — les tables None ou sans colonnes sont ignorées."""
+    dossier = dossier_periode(periode, cache_folder)
+    dossier.mkdir(parents=True, exist_ok=True)
+
+    for nom, df in tables.items():
+        if df is None or len(df.columns) == 0:
+            continue
+        df.to_parquet(dossier / f"{nom}.parquet", index=False)
+
+    log.info(f"[ledger_store] {len(tables)} table(s) mises en cache dans {dossier}")
+
+
+def empreinte_entrees(periode, folders=FOLDERS):
+    """
+    Empreinte des fichiers d'entrée d'une période (nom, taille, mtime) : FEC et Silae de la période,
+    mappings, split CA/COGS, CAPEX, registre des baux, budget / forecast. Change dès qu'un fichier est
+    déposé ou corrigé.
+    """
+    fichiers = []
+    for cle, motif in [("fec", f"FEC_{periode}_*"), ("rh", f"silae_{periode}_*"), ("mapping", "*.xlsx"),
+                       ("revenue_cogs", "*.xlsx"), ("capex", "*.xlsx"), ("ifrs16", "*.xlsx"),
+                       ("budget", "*.xlsx")]:
+        fichiers += sorted(Path(folders[cle]).glob(motif))
+
+    h = hashlib.sha256()
+    for f in fichiers:
+        st = f.stat()
+        h.update(f"{f.as_posix()}|{st.st_size}|{st.st_mtime_ns}\n".encode())
+    return h.hexdigest()
+
+
+def empreinte_tables(periode, noms, cache_folder=FOLDERS["cache"]):
+    """
+    Empreinte des tables mises en cache pour une période (nom, taille, mtime des Parquet écrits par
+    sauver_tables) : change à chaque réécriture, y compris quand seule la configuration a changé.
+    """
+    h = hashlib.sha256()
+    for nom in noms:
+        chemin = dossier_periode(periode, cache_folder) / f"{nom}.parquet"
+        if chemin.exists():
+            st = chemin.stat()
+            h.update(f"{nom}|{st.st_size}|{st.st_mtime_ns}\n".encode())
+    return h.hexdigest()
+
+
+def sauver_empreinte(periode, empreinte, cache_folder=FOLDERS["cache"]):
+    chemin = dossier_periode(periode, cache_folder) / "empreinte.json"
+    chemin.write_text(json.dumps({"periode": str(periode), "empreinte": empreinte}))
+
+
+def lire_empreinte(periode, cache_folder=FOLDERS["cache"]):
+    chemin = dossier_periode(periode, cache_folder) / "empreinte.json"
+    return json.loads(chemin.read_text())["empreinte"] if chemin.exists() else None
+
+
+def mappings_en_table(mappings):
+    """{entité: mapping} (load_mapping_pcg) → une seule table avec colonne Entite."""
+    if not mappings:
+        return pd.DataFrame()
+    return pd.concat([m.assign(Entite=e) for e, m in mappings.items()], ignore_index=True)
+
+
+def charger_table(periode, nom, cache_folder=FOLDERS["cache"]):
+    if nom == "ledger":
+        return pd.read_parquet(dossier_ledger(periode, cache_folder))
+    return pd.read_parquet(dossier_periode(periode, cache_folder) / f"{nom}.parquet")
+
+
+def lire_lignes(periode, ligne_ids, cache_folder=FOLDERS["cache"]):
+    """
+    Lignes du ledger aux positions `ligne_ids` (LigneId), sans relire tout le ledger :
+    seuls les row groups Parquet contenant ces positions sont décodés.
+    """
+    import pyarrow.parquet as pq
+
+    ids      = np.unique(np.asarray(ligne_ids, dtype='int64'))
+    debut    = 0
+    morceaux = []
+
+    for chemin in sorted(dossier_ledger(periode, cache_folder).glob("*.parquet")):
+        pf = pq.ParquetFile(chemin)
+        for rg in range(pf.num_row_groups):
+            n   = pf.metadata.row_group(rg).num_rows
+            sel = ids[(ids >= debut) & (ids < debut + n)] - debut
+            if len(sel):
+                morceaux.append(pf.read_row_group(rg).take(sel).to_pandas())
+            debut += n
+
+    return pd.concat(morceaux, ignore_index=True) if morceaux else pd.DataFrame()
+
+
+def lister_tables(periode, cache_folder=FOLDERS["cache"]):
+    """{nom: chemin} — le ledger est exposé comme un glob sur ses parts."""
+    dossier = dossier_periode(periode, cache_folder)
+    tables  = {p.stem: str(p) for p in sorted(dossier.glob("*.parquet"))}
+    if dossier_ledger(periode, cache_folder).exists():
+        tables["ledger"] = str(dossier_ledger(periode, cache_folder) / "*.parquet")
+    return tables
+
+
+def periodes_en_cache(cache_folder=FOLDERS["cache"]):
+    if not Path(cache_folder).exists():
+        return []
+    return sorted(p.name for p in Path(cache_folder).iterdir() if p.is_dir() and re.match(r'^\d{6}$', p.name))
+
+
+def empreinte_fichiers(*fichiers):
+    """Empreinte du contenu des fichiers (sha256, 16 caractères) ; les fichiers absents sont ignorés."""
+    h = hashlib.sha256()
+    for f in fichiers:
+        if Path(f).exists():
+            h.update(Path(f).read_bytes())
+    return h.hexdigest()[:16]
+
+
+def table_derivee(domaine, nom, empreinte, calculer, cache_folder=FOLDERS["cache"]):
+    """
+    Table dérivée d'entrées d'empreinte `empreinte` : depuis la mémoire, sinon depuis
+    data/cache/<domaine>/<nom>_<empreinte>.parquet, sinon calculer() — le résultat est alors écrit
+    et les versions précédentes de la table supprimées.
+    Retourne (table, origine) avec origine ∈ {"memoire", "cache", "calcul"}.
+    """
+    dossier = Path(cache_folder) / domaine
+    chemin  = dossier / f"{nom}_{empreinte}.parquet"
+    cle     = os.path.abspath(dossier / nom)
+    if cle in _derivees and _derivees[cle][0] == empreinte and chemin.exists():
+        return _derivees[cle][1], "memoire"
+
+    if chemin.exists():
+        table, origine = pd.read_parquet(chemin), "cache"
+    else:
+        table, origine = calculer(), "calcul"
+        dossier.mkdir(parents=True, exist_ok=True)
+        for ancien in dossier.glob(f"{nom}_*.parquet"):
+            ancien.unlink()
+        table.to_parquet(chemin, index=False)
+
+    _derivees[cle] = (empreinte, table)
+    return table, origine
+
+
+@contextmanager
+def verrou_cache(nom, cache_folder=FOLDERS["cache"]):
+    """
+    Verrou exclusif inter-processus sur la table partagée `nom` du cache, tenu le temps d'une
+    lecture-modification-écriture. Non réentrant : ne pas imbriquer deux verrous du même nom.
+    """
+    chemin = Path(cache_folder) / ".verrous" / f"{nom}.lock"
+    chemin.parent.mkdir(parents=True, exist_ok=True)
+    with open(chemin, "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
@@ -1,14 +1,19 @@
+import logging
 import pandas as pd
 import os
-import re
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from config import ENTITES
+from config import ENTITES, OUT_OF_CORE_MEMORY_MB, OUT_OF_CORE_OCTETS_LIGNE, OUT_OF_CORE_PART_BLOC
+from scripts.validation import accumuler
+from scripts.comptes import encoder_comptes, retenir_libelles
+from scripts.fec_fichiers import detect_fec_files, detect_periode   # Détection sans pandas (fpa detect)
+from scripts.journal import journal, evenement, Paresseux
 
+log = journal(__name__)
 
-def load_fec(filepath, nom_entite):
-    df = pd.read_csv(filepath, sep='\t', encoding='utf-8', dtype=str)
+
+def _preparer_fec(df, nom_entite):
     df.columns = df.columns.str.strip()
 
     df['EcritureDate'] = pd.to_datetime(df['EcritureDate'], format='%Y%m%d')
@@ -18,66 +23,94 @@ def load_fec(filepath, nom_entite):
 
     for col in ['CompteNum', 'CompteLib', 'JournalCode']:
         df[col] = df[col].str.strip()
+    df['CompteId'] = encoder_comptes(df['CompteNum'])   # Dimension compte (scripts/comptes.py)
+
+    # Montant en devise (colonnes FEC 16–17, souvent vides) : utilisé par la conversion (stage 02b)
+    for col in ['Montantdevise', 'Idevise']:
+        if col not in df:
+            df[col] = None
+    df['Montantdevise'] = pd.to_numeric(df['Montantdevise'].str.replace(',', '.'), errors='coerce')
+    df['Idevise']       = df['Idevise'].fillna('').str.strip().str.upper()
 
     df['CompAuxNum'] = df['CompAuxNum'].fillna('').str.strip()
     df['CompAuxLib'] = df['CompAuxLib'].fillna('').str.strip()
     df['Entite']     = nom_entite
-
-    print(f"  {nom_entite} : {len(df)} lignes chargées")
     return df
 
 
-def detect_fec_files(input_folder, periode):
-    entites_trouvees = {}
+def load_fec(filepath, nom_entite, controles=None):
+    """controles : accumulateur validation.nouveaux_controles(), alimenté dans la même passe."""
+    df = pd.read_csv(filepath, sep='\t', encoding='utf-8', dtype=str)
+    df = _preparer_fec(df, nom_entite)
+    accumuler(controles, df)
+    df = retenir_libelles(df)   # Lignes : CompteId seul ; numéro et libellé dans la dimension compte
 
-    for fichier in os.listdir(input_folder):
-        match = re.match(rf'^FEC_{periode}_(\w+)\.txt$', fichier)
-        if match:
-            nom_entite = match.group(1).upper()
-            if nom_entite in ENTITES:
-                entites_trouvees[nom_entite] = os.path.join(input_folder, fichier)
-                print(f"  Fichier détecté : {fichier} → Entité {nom_entite}")
-            else:
-                print(f"  Attention : entité inconnue dans {fichier} — ignoré")
+    evenement(log, logging.INFO, "fec.charge", f"  {nom_entite} : {len(df)} lignes chargées",
+              entite=nom_entite, lignes=len(df))
+    return df
 
-    if not entites_trouvees:
-        raise FileNotFoundError(f"Aucun fichier FEC trouvé pour la période {periode} dans {input_folder}")
 
-    return entites_trouvees
+def lire_comptes_fec(filepath, nom_entite):
+    """Comptes distincts d'un FEC (CompteNum, CompteLib) : lecture des deux seules colonnes utiles."""
+    df = pd.read_csv(filepath, sep='\t', encoding='utf-8', dtype=str,
+                     usecols=lambda c: c.strip() in ('CompteNum', 'CompteLib'))
+    df.columns = df.columns.str.strip()
+    df = df.apply(lambda col: col.str.strip()).drop_duplicates('CompteNum')
+    df['Entite'] = nom_entite
+    return df[['Entite', 'CompteNum', 'CompteLib']]
 
 
-def detect_periode(input_folder):
-    periodes = set()
+def taille_bloc(memoire_mb=OUT_OF_CORE_MEMORY_MB):
+    """Nombre de lignes FEC par bloc pour rester sous le plafond mémoire (Mo)."""
+    return max(1_000, int(memoire_mb * 1024 * 1024 * OUT_OF_CORE_PART_BLOC // OUT_OF_CORE_OCTETS_LIGNE))
 
-    for fichier in os.listdir(input_folder):
-        match = re.match(r'^FEC_(\d{6})_\w+\.txt$', fichier)
-        if match:
-            periodes.add(match.group(1))
 
-    if not periodes:
-        raise FileNotFoundError(f"Aucun fichier FEC trouvé dans {input_folder}")
+def iter_fec_blocs(filepath, nom_entite, chunksize, controles=None):
+    """Lit un FEC par blocs de `chunksize` lignes, chaque bloc préparé (et contrôlé) comme load_fec."""
+    nb_lignes = 0
+    with pd.read_csv(filepath, sep='\t', encoding='utf-8', dtype=str, chunksize=chunksize) as reader:
+        for bloc in reader:
+            nb_lignes += len(bloc)
+            bloc = _preparer_fec(bloc, nom_entite)
+            accumuler(controles, bloc)
+            yield retenir_libelles(bloc)
 
-    periode = sorted(periodes)[-1]
-    print(f"Période détectée automatiquement : {periode}")
-    return periode
+    evenement(log, logging.INFO, "fec.charge", f"  {nom_entite} : {nb_lignes} lignes lues par blocs de {chunksize}",
+              entite=nom_entite, lignes=nb_lignes, bloc=chunksize)
 
 
-def load_fec_entites(input_folder, periode):
-    print(f"\nChargement des FEC pour la période {periode}...")
+def load_fec_entites(input_folder, periode, controles=None, entites=ENTITES, apres_entite=None):
+    """apres_entite : fonction appelée avec le FEC de chaque entité dès son chargement (clôture flash)."""
+    log.info(f"\nChargement des FEC pour la période {periode}...")
 
-    entites = detect_fec_files(input_folder, periode)
-    dfs     = [load_fec(fp, ent) for ent, fp in entites.items()]
+    fichiers = detect_fec_files(input_folder, periode, entites)
+    dfs      = []
+    for ent, fp in fichiers.items():
+        dfs.append(load_fec(fp, ent, controles))
+        if apres_entite is not None:
+            apres_entite(dfs[-1])
     df      = pd.concat(dfs, ignore_index=True)
 
-    print(f"\nConsolidation terminée :")
-    print(f"  Entités chargées  : {list(df['Entite'].unique())}")
-    print(f"  Total lignes      : {len(df)}")
-    print(f"  Période couverte  : {df['EcritureDate'].min().strftime('%d/%m/%Y')} → {df['EcritureDate'].max().strftime('%d/%m/%Y')}")
-    print(f"  Comptes distincts : {df['CompteNum'].nunique()}")
+    log.info(f"\nConsolidation terminée :")
+    evenement(log, logging.INFO, "fec.consolide", f"  Entités chargées  : {list(fichiers)}\n  Total lignes      : {len(df)}",
+              entites=list(fichiers), lignes=len(df))
+    # Parcours complets du ledger : seulement en DEBUG
+    log.debug("  Période couverte  : %s → %s", Paresseux(lambda: df['EcritureDate'].min().strftime('%d/%m/%Y')),
+              Paresseux(lambda: df['EcritureDate'].max().strftime('%d/%m/%Y')))
+    log.debug("  Comptes distincts : %s", Paresseux(lambda: df['CompteId'].nunique()))
 
     return df
 
 
+def iter_fec_entites(input_folder, periode, chunksize, controles=None, entites=ENTITES):
+    """Équivalent par blocs de load_fec_entites : ne matérialise jamais le FEC consolidé."""
+    log.info(f"\nLecture par blocs des FEC pour la période {periode}...")
+
+    fichiers = detect_fec_files(input_folder, periode, entites)
+    for ent, fp in fichiers.items():
+        yield from iter_fec_blocs(fp, ent, chunksize, controles)
+
+
 if __name__ == "__main__":
     from config import FOLDERS
     periode = detect_periode(FOLDERS["fec"])
@@ -0,0 +1,311 @@
+"""
+mapping_historique.py — Versions du mapping PCG et retraitement de l'historique (fpa restate)
+-----------------------------------------------------------------------------------------------
+Logique :
+  - À chaque clôture, deux tables compactes sont tenues à jour dans data/cache/ :
+      · mouvements_historique.parquet : montants par entité × compte × mois, tels qu'ils entrent
+        dans les agrégations du stage 03 — mouvements P&L après éliminations intercos et devise
+        groupe (df_pl_elimine), soldes de bilan (df_bilan) ; le mois clôturé remplace sa version
+        précédente pour les seules entités clôturées (cache partagé entre groupes)
+      · mapping_versions.parquet : chaque version distincte du mapping PCG (entités de la clôture), avec
+        mapping_versions.json : empreinte et date de chaque version, version utilisée par chaque
+        mois × entité (deux groupes clôturant le même mois peuvent avoir des mappings différents)
+  - Mois clôturés avant la mise en place de l'historique : repris depuis leurs tables en cache
+    (importer_cache, appelé par fpa restate)
+  - Une version n'est créée que si le contenu du mapping change (retour à un mapping antérieur →
+    version existante réutilisée)
+  - Retraitement (retraiter) : une seule jointure historique × versions (version d'origine de
+    chaque mois × entité et version cible) puis une agrégation par entité × mois × catégorie ×
+    détail ; seules les entités couvertes par la version cible sont retraitées ; aucun FEC
+    rechargé, aucun stage rejoué
+  - Le diff liste chaque ligne dont le montant change (Avant, Après, Écart), au niveau des agrégats
+    du mapping (df_pl_final / df_bilan_mapped) : la masse salariale RH, IFRS 16 et CAPEX, ajoutés
+    au stage 08, ne dépendent pas du mapping PCG
+
+Colonnes :
+  mouvements_historique : Vue | Entite | CompteNum | CompteLib | CompteId | Periode | Montant   (Vue PL | BS)
+  mapping_versions      : Version | Entite | CompteNum | Mapping_PL_detail | Mapping_PL_category
+                          | Mapping_BS_detail | Mapping_BS_category
+  diff                  : Vue | Entite | Periode | Categorie | Detail | Version_avant | Version_apres
+                          | Avant | Apres | Ecart
+
+Output : data/output/retraitement_mapping_vN.xlsx (onglets Écarts, Comptes remappés)
+"""
+
+import hashlib
+import json
+import os
+import sys
+from datetime import datetime
+from pathlib import Path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+
+from config import FOLDERS, CLASSES_PL
+from scripts.comptes import masque_prefixes, encoder_comptes
+from scripts.pipeline_config import config_defaut
+from scripts.journal import journal
+from scripts.ledger_store import verrou_cache
+
+log = journal(__name__)
+
+
+COLONNES_MOUVEMENTS = ["Vue", "Entite", "CompteNum", "CompteLib", "CompteId", "Periode", "Montant"]
+COLONNES_MAPPING    = ["Entite", "CompteNum", "Mapping_PL_detail", "Mapping_PL_category",
+                       "Mapping_BS_detail", "Mapping_BS_category"]
+COLONNES_DIFF       = ["Vue", "Entite", "Periode", "Categorie", "Detail", "Version_avant", "Version_apres",
+                       "Avant", "Apres", "Ecart"]
+SEUIL_ECART         = 0.005   # Écart d'arrondi ignoré dans le diff (€)
+
+
+def chemin_mouvements(cache_folder=FOLDERS["cache"]):
+    return Path(cache_folder) / "mouvements_historique.parquet"
+
+
+def chemin_versions(cache_folder=FOLDERS["cache"]):
+    return Path(cache_folder) / "mapping_versions.parquet"
+
+
+def chemin_index(cache_folder=FOLDERS["cache"]):
+    return Path(cache_folder) / "mapping_versions.json"
+
+
+def charger_mouvements(cache_folder=FOLDERS["cache"]):
+    chemin = chemin_mouvements(cache_folder)
+    if not chemin.exists():
+        return pd.DataFrame(columns=COLONNES_MOUVEMENTS)
+    return pd.read_parquet(chemin)
+
+
+def charger_versions(cache_folder=FOLDERS["cache"]):
+    chemin = chemin_versions(cache_folder)
+    if not chemin.exists():
+        return pd.DataFrame(columns=["Version", *COLONNES_MAPPING])
+    return pd.read_parquet(chemin)
+
+
+def charger_index(cache_folder=FOLDERS["cache"]):
+    """{'versions': [{version, empreinte, enregistree_le, source}], 'periodes': {YYYYMM: {entite: version}}}."""
+    chemin = chemin_index(cache_folder)
+    if not chemin.exists():
+        return {"versions": [], "periodes": {}}
+    return json.loads(chemin.read_text(encoding="utf-8"))
+
+
+def _sauver_index(index, cache_folder):
+    chemin = chemin_index(cache_folder)
+    chemin.parent.mkdir(parents=True, exist_ok=True)
+    chemin.write_text(json.dumps(index, ensure_ascii=False, indent=2), encoding="utf-8")
+
+
+def versions_origine(index, periodes=None):
+    """
+    Version de mapping de chaque mois × entité : Periode | Entite | Version_avant.
+    Index antérieur au suivi par entité ({YYYYMM: version}) : Entite '*' (toutes entités).
+    """
+    lignes = [(p, e, v)
+              for p, versions in index["periodes"].items() if periodes is None or p in periodes
+              for e, v in (versions.items() if isinstance(versions, dict) else [("*", versions)])]
+    return pd.DataFrame(lignes, columns=["Periode", "Entite", "Version_avant"])
+
+
+def _normaliser(table_mappings):
+    """Table de mapping comparable d'une version à l'autre : colonnes fixes, lignes triées."""
+    if table_mappings.empty:
+        return pd.DataFrame(columns=COLONNES_MAPPING)
+    return table_mappings[COLONNES_MAPPING].sort_values(["Entite", "CompteNum"], kind="stable").reset_index(drop=True)
+
+
+def empreinte_mapping(table_mappings):
+    """sha256 du contenu du mapping (toutes entités), indépendant de l'ordre des lignes."""
+    df = _normaliser(table_mappings)
+    h  = hashlib.sha256(repr(list(df.columns)).encode())
+    h.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return h.hexdigest()
+
+
+def enregistrer_version(table_mappings, source, cache_folder=FOLDERS["cache"]):
+    """
+    Version du mapping `table_mappings` (ledger_store.mappings_en_table) : existante si son contenu
+    est déjà connu, nouvelle sinon. source : origine (clôture YYYYMM, fpa restate). Retourne le numéro.
+    """
+    empreinte = empreinte_mapping(table_mappings)
+    with verrou_cache("mapping_historique", cache_folder):
+        index = charger_index(cache_folder)
+        for v in index["versions"]:
+            if v["empreinte"] == empreinte:
+                return v["version"]
+
+        version  = max((v["version"] for v in index["versions"]), default=0) + 1
+        versions = pd.concat([charger_versions(cache_folder), _normaliser(table_mappings).assign(Version=version)],
+                             ignore_index=True)
+        versions.to_parquet(chemin_versions(cache_folder), index=False)
+
+        index["versions"].append({"version": version, "empreinte": empreinte, "source": str(source),
+                                  "enregistree_le": datetime.now().isoformat(timespec="seconds")})
+        _sauver_index(index, cache_folder)
+    log.info(f"[mapping_historique] Mapping PCG : nouvelle version v{version} ({source})")
+    return version
+
+
+def mettre_a_jour_mouvements(periode, df_pl_elimine, df_bilan, version, cache_folder=FOLDERS["cache"], entites=None):
+    """
+    Remplace les lignes (`periode`, `entites`) de l'historique (P&L après éliminations + soldes bilan)
+    et note leur version de mapping. entites : entités clôturées (défaut : celles des mouvements).
+    """
+    pl = df_pl_elimine[masque_prefixes(df_pl_elimine["CompteId"], CLASSES_PL)]
+    nouveaux = pd.concat([
+        pl[["Entite", "CompteNum", "CompteLib", "CompteId", "Mouvement"]].rename(columns={"Mouvement": "Montant"}).assign(Vue="PL"),
+        df_bilan[["Entite", "CompteNum", "CompteLib", "CompteId", "Solde"]].rename(columns={"Solde": "Montant"}).assign(Vue="BS"),
+    ], ignore_index=True).assign(Periode=str(periode))[COLONNES_MOUVEMENTS]
+
+    entites = list(entites) if entites is not None else sorted(nouveaux["Entite"].unique())
+
+    with verrou_cache("mapping_historique", cache_folder):
+        historique = charger_mouvements(cache_folder)
+        remplacees = (historique["Periode"] == str(periode)) & historique["Entite"].isin(entites)
+        historique = pd.concat([historique[~remplacees], nouveaux], ignore_index=True)
+        historique = historique.sort_values(["Periode", "Vue", "Entite", "CompteId"]).reset_index(drop=True)
+
+        chemin = chemin_mouvements(cache_folder)
+        chemin.parent.mkdir(parents=True, exist_ok=True)
+        historique.to_parquet(chemin, index=False)
+
+        index = charger_index(cache_folder)
+        versions = index["periodes"].get(str(periode), {})
+        if not isinstance(versions, dict):   # Index antérieur au suivi par entité : version du mois entier
+            versions = dict.fromkeys(historique.loc[historique["Periode"] == str(periode), "Entite"].unique(), versions)
+        index["periodes"][str(periode)] = dict(sorted({**versions, **dict.fromkeys(entites, version)}.items()))
+        index["periodes"] = dict(sorted(index["periodes"].items()))
+        _sauver_index(index, cache_folder)
+
+    log.info(f"[mapping_historique] Période {periode} (mapping v{version}) — historique : "
+             f"{historique['Periode'].nunique()} mois, {len(historique)} lignes compte")
+    return historique
+
+
+def importer_cache(cache_folder=FOLDERS["cache"], sauf=()):
+    """
+    Reprise des mois clôturés avant l'historique : pour chaque période du cache absente de
+    l'historique, ses tables df_pl_elimine, df_bilan et mappings alimentent l'historique et les
+    versions (sans relire de FEC). Retourne les périodes importées.
+    sauf : périodes écartées — la clôture en cours, enregistrée ensuite par mettre_a_jour_mouvements.
+    """
+    from scripts.ledger_store import periodes_en_cache, lister_tables, charger_table
+
+    connues   = charger_index(cache_folder)["periodes"]
+    importees = []
+    for periode in periodes_en_cache(cache_folder):
+        if periode in connues or periode in sauf or not {"df_pl_elimine", "df_bilan", "mappings"} <= set(lister_tables(periode, cache_folder)):
+            continue
+        pl, bilan = (charger_table(periode, nom, cache_folder) for nom in ("df_pl_elimine", "df_bilan"))
+        if "CompteId" not in pl:   # Cache antérieur à la dimension compte
+            pl, bilan = (df.assign(CompteId=encoder_comptes(df["CompteNum"])) for df in (pl, bilan))
+        version = enregistrer_version(charger_table(periode, "mappings", cache_folder), f"cache {periode}", cache_folder)
+        mettre_a_jour_mouvements(periode, pl, bilan, version, cache_folder)
+        importees.append(periode)
+    return importees
+
+
+def retraiter(version=None, periodes=None, cache_folder=FOLDERS["cache"]):
+    """
+    Diff des agrégats mappés de chaque mois de l'historique entre sa version d'origine et `version`
+    (défaut : la plus récente). periodes : mois à retraiter (défaut : tout l'historique).
+    Retourne les lignes modifiées (COLONNES_DIFF), triées par Vue, Periode, Entite.
+    """
+    index = charger_index(cache_folder)
+    if not index["versions"]:
+        raise FileNotFoundError(f"Aucune version de mapping dans {cache_folder} — lancer d'abord une clôture")
+    version = version or index["versions"][-1]["version"]
+    if version not in {v["version"] for v in index["versions"]}:
+        raise ValueError(f"Version de mapping inconnue : v{version}")
+
+    historique = charger_mouvements(cache_folder)
+    if periodes is not None:
+        historique = historique[historique["Periode"].isin([str(p) for p in periodes])]
+    versions   = charger_versions(cache_folder)
+    historique = historique[historique["Entite"].isin(versions.loc[versions["Version"] == version, "Entite"].unique())]
+
+    # Version d'origine de chaque ligne : celle de son mois × entité, sinon celle du mois entier (ancien index)
+    origines = versions_origine(index)
+    par_entite = historique[["Periode", "Entite"]].merge(origines, on=["Periode", "Entite"], how="left")["Version_avant"]
+    par_mois   = historique[["Periode"]].merge(origines[origines["Entite"] == "*"].drop(columns="Entite"),
+                                              on="Periode", how="left")["Version_avant"]
+    origine    = par_entite.fillna(par_mois).astype("Int64").to_numpy()
+
+    # Chaque ligne compte deux fois : sous la version d'origine de son mois, sous la version cible
+    lignes = pd.concat([
+        historique.assign(Etat="Avant", Version=origine, Version_avant=origine),
+        historique.assign(Etat="Apres", Version=version, Version_avant=origine),
+    ], ignore_index=True)
+    lignes = lignes.merge(versions, on=["Version", "Entite", "CompteNum"], how="left")
+
+    parts = []
+    for vue, signe in [("PL", -1), ("BS", 1)]:   # P&L : signe inversé comme dans agreger_pl
+        df = lignes[(lignes["Vue"] == vue) & lignes[f"Mapping_{vue}_detail"].notna()]
+        parts.append(
+            df.groupby(["Entite", "Periode", f"Mapping_{vue}_category", f"Mapping_{vue}_detail", "Version_avant", "Etat"])
+            ["Montant"].sum().mul(signe).unstack("Etat", fill_value=0.0)
+            .reindex(columns=["Avant", "Apres"], fill_value=0.0).reset_index()
+            .rename(columns={f"Mapping_{vue}_category": "Categorie", f"Mapping_{vue}_detail": "Detail"})
+            .assign(Vue=vue)
+        )
+
+    diff = pd.concat(parts, ignore_index=True).assign(Version_apres=version)
+    diff["Ecart"] = diff["Apres"] - diff["Avant"]
+    diff = diff[diff["Ecart"].abs() > SEUIL_ECART]
+    return diff[COLONNES_DIFF].sort_values(["Vue", "Periode", "Entite", "Categorie", "Detail"]).reset_index(drop=True)
+
+
+def comptes_remappes(version_avant, version_apres, cache_folder=FOLDERS["cache"]):
+    """Comptes dont l'affectation diffère entre deux versions : Entite | CompteNum | <colonnes> _avant / _apres."""
+    versions = charger_versions(cache_folder)
+    avant = versions[versions["Version"] == version_avant].drop(columns="Version")
+    apres = versions[versions["Version"] == version_apres].drop(columns="Version")
+    comp  = avant.merge(apres, on=["Entite", "CompteNum"], how="outer", suffixes=("_avant", "_apres"))
+
+    colonnes = COLONNES_MAPPING[2:]
+    change = pd.Series(False, index=comp.index)
+    for col in colonnes:
+        a, b = comp[f"{col}_avant"], comp[f"{col}_apres"]
+        change |= ~((a == b) | (a.isna() & b.isna()))
+    return comp[change].reset_index(drop=True)
+
+
+def run(periodes=None, version=None, cfg=None):
+    """
+    fpa restate : enregistre le mapping_pcg.xlsx courant comme version (si nouveau) puis retraite
+    l'historique sous cette version (ou `version`). Retourne le chemin du classeur de diff.
+    """
+    from scripts.pcg_mapping_03 import load_mapping_pcg
+    from scripts.ledger_store import mappings_en_table
+
+    cfg   = cfg or config_defaut()
+    cache = cfg.FOLDERS["cache"]
+    importer_cache(cache)
+    courante = enregistrer_version(mappings_en_table(load_mapping_pcg(cfg.FOLDERS["mapping"], cfg.ENTITES)),
+                                   "fpa restate", cache)
+    version = version or courante
+    diff    = retraiter(version, periodes, cache)
+
+    retraits = versions_origine(charger_index(cache), None if periodes is None else [str(p) for p in periodes])
+    retraits = retraits[retraits["Entite"].isin([*cfg.ENTITES, "*"])]
+    origines = sorted(set(retraits["Version_avant"]))
+    remappes = pd.concat([comptes_remappes(v, version, cache).assign(Version_avant=v, Version_apres=version)
+                          for v in origines if v != version] or [pd.DataFrame()], ignore_index=True)
+
+    log.info(f"\n[mapping_historique] Retraitement sous le mapping v{version} — "
+             f"{retraits['Periode'].nunique()} mois retraité(s) (versions d'origine : {', '.join(f'v{v}' for v in origines)})")
+    if diff.empty:
+        log.info("  ✅ Aucun agrégat modifié")
+    for (vue, periode), lignes in diff.groupby(["Vue", "Periode"]):
+        log.info(f"  {vue} {periode} : {len(lignes)} ligne(s) modifiée(s), écart absolu {lignes['Ecart'].abs().sum():,.2f}")
+
+    Path(cfg.FOLDERS["output"]).mkdir(parents=True, exist_ok=True)
+    chemin = Path(cfg.FOLDERS["output"]) / f"retraitement_mapping_v{version}.xlsx"
+    with pd.ExcelWriter(chemin, engine="openpyxl") as writer:
+        diff.to_excel(writer, sheet_name="Écarts", index=False)
+        remappes.to_excel(writer, sheet_name="Comptes remappés", index=False)
+    log.info(f"[mapping_historique] Diff : {chemin}")
+    return str(chemin)
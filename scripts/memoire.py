@@ -0,0 +1,138 @@
+"""
+memoire.py — Budget mémoire du pipeline (--memory-budget)
+-----------------------------------------------------------
+Logique :
+  - Avant chaque stage coûteux, estime son empreinte à partir de la taille des fichiers
+    et du nombre de lignes, et la compare à la marge restante (budget - RSS courant)
+  - Si l'estimation dépasse la marge, bascule le stage sur sa variante par blocs / en flux :
+      · 01–02 chargement FEC + soldes bilan  → out_of_core.agreger_fec_par_blocs
+      · 08 onglet Drill-down P&L             → classeur séparé en écriture seule (openpyxl write_only)
+    Sans variante possible, lève BudgetMemoireDepasse avant l'allocation (erreur propre
+    plutôt qu'un arrêt du process par le noyau)
+  - Relève le RSS réel après chaque stage (pic + détail par étape) et s'arrête proprement
+    dès que le budget est franchi
+
+Le budget est un dict (nouveau_budget) passé aux stages ; None = pas de budget (comportement historique).
+"""
+
+import os
+import sys
+from pathlib import Path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import ENTITES, OUT_OF_CORE_OCTETS_LIGNE, MEMOIRE_FACTEUR_CHARGEMENT, MEMOIRE_OCTETS_CELLULE
+from scripts.load_fec_01 import detect_fec_files
+from scripts.journal import journal
+
+log = journal(__name__)
+
+
+class BudgetMemoireDepasse(MemoryError):
+    """Le budget mémoire serait (ou est) dépassé et le stage n'a pas de variante par blocs."""
+
+
+def rss_mb():
+    """RSS courant du process (Mo). Hors Linux : pic de RSS (resource), faute de mieux."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError, AttributeError):
+        import resource
+        pic = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return pic / 2**20 if sys.platform == "darwin" else pic / 1024
+
+
+def nouveau_budget(budget_mb):
+    if budget_mb is None:
+        return None
+    return {"budget_mb": budget_mb, "pic_mb": rss_mb(), "etapes": []}
+
+
+def marge_mb(budget):
+    return budget["budget_mb"] - rss_mb()
+
+
+def tient(budget, besoin_mb):
+    """True si `besoin_mb` supplémentaires restent sous le budget (toujours True sans budget)."""
+    return budget is None or besoin_mb <= marge_mb(budget)
+
+
+def mesurer(budget, etape, detail=True):
+    """
+    Relève le RSS après `etape` ; lève BudgetMemoireDepasse si le budget est franchi.
+    detail=False : relevé intermédiaire (ex. par bloc), compté dans le pic mais pas listé.
+    """
+    if budget is None:
+        return
+    rss = rss_mb()
+    budget["pic_mb"] = max(budget["pic_mb"], rss)
+    if detail:
+        budget["etapes"].append((etape, rss))
+    if rss > budget["budget_mb"]:
+        raise BudgetMemoireDepasse(
+            f"RSS de {rss:.0f} Mo après '{etape}', au-delà du budget de {budget['budget_mb']} Mo"
+        )
+
+
+def exiger(budget, etape, besoin_mb):
+    """Contrôle préalable d'un stage sans variante par blocs."""
+    if not tient(budget, besoin_mb):
+        raise BudgetMemoireDepasse(
+            f"'{etape}' nécessite ~{besoin_mb:.0f} Mo, marge disponible {marge_mb(budget):.0f} Mo "
+            f"(budget {budget['budget_mb']} Mo) — augmenter --memory-budget"
+        )
+
+
+def _lignes_fichier(chemin, echantillon=1 << 20):
+    """Nombre de lignes estimé d'un fichier texte à partir de son premier Mo."""
+    taille = Path(chemin).stat().st_size
+    with open(chemin, "rb") as f:
+        debut = f.read(echantillon)
+    if not debut:
+        return 0
+    return int(taille / max(len(debut) / max(debut.count(b"\n"), 1), 1))
+
+
+def estimer_chargement_mb(input_folder, periode, entites=ENTITES):
+    """Empreinte estimée des stages 01–02 en mémoire (FEC parsés + temporaires de parsing)."""
+    lignes = sum(_lignes_fichier(fp) for fp in detect_fec_files(input_folder, periode, entites).values())
+    return lignes * OUT_OF_CORE_OCTETS_LIGNE * MEMOIRE_FACTEUR_CHARGEMENT / 2**20
+
+
+def estimer_onglet_mb(nb_lignes, nb_colonnes):
+    """Empreinte estimée d'un onglet openpyxl (mode normal : toutes les cellules en mémoire)."""
+    return nb_lignes * nb_colonnes * MEMOIRE_OCTETS_CELLULE / 2**20
+
+
+def planifier_chargement(budget, input_folder, periode, out_of_core, memoire_mb, entites=ENTITES):
+    """
+    Mode des stages 01–02 compte tenu du budget. Retourne (out_of_core, memoire_mb) :
+    bascule en lecture par blocs si le chargement en mémoire ne tient pas dans la marge.
+    """
+    if budget is None:
+        return out_of_core, memoire_mb
+
+    mesurer(budget, "00 démarrage")   # Relevé compté dans le pic, la marge en découle
+    rss   = budget["etapes"][-1][1]
+    marge = budget["budget_mb"] - rss
+    if marge <= 0:
+        raise BudgetMemoireDepasse(
+            f"budget de {budget['budget_mb']} Mo déjà atteint au démarrage (RSS {rss:.0f} Mo)"
+        )
+    if not out_of_core:
+        besoin = estimer_chargement_mb(input_folder, periode, entites)
+        if besoin <= marge:
+            log.info(f"[memoire] Chargement en mémoire : ~{besoin:.0f} Mo estimés, marge {marge:.0f} Mo")
+            return False, memoire_mb
+        log.warning(f"[memoire] ⚠️  Chargement estimé à ~{besoin:.0f} Mo > marge {marge:.0f} Mo → lecture par blocs")
+
+    # Le plafond du mode par blocs est borné par la marge du budget
+    return True, int(min(memoire_mb, marge))
+
+
+def synthese(budget):
+    if budget is None:
+        return
+    log.info(f"\n[memoire] Pic RSS : {budget['pic_mb']:.0f} Mo / budget {budget['budget_mb']} Mo")
+    for etape, rss in budget["etapes"]:
+        log.info(f"  {etape:<28} {rss:>8.0f} Mo")
@@ -1,9 +1,17 @@
+import logging
 import pandas as pd
 import os
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from config import CLASSES_BILAN, JOURNAL_AN
+from scripts.comptes import masque_prefixes, libelle_classe, avec_libelles
+from scripts.journal import journal, evenement, Paresseux
+
+log = journal(__name__)
+
+
+CLES_COMPTE = ['Entite', 'CompteId']   # Numéro et libellé rejoints après agrégation (comptes.avec_libelles)
 
 
 def get_mois_periode(periode):
@@ -15,8 +23,8 @@ def get_mois_periode(periode):
 def get_mouvements_mois(df, periode):
     date_debut, date_fin = get_mois_periode(periode)
 
-    print(f"\nExtraction P&L — mouvements du mois {periode}")
-    print(f"  Fenêtre : {date_debut.strftime('%d/%m/%Y')} → {date_fin.strftime('%d/%m/%Y')}")
+    log.info(f"\nExtraction P&L — mouvements du mois {periode}")
+    log.info(f"  Fenêtre : {date_debut.strftime('%d/%m/%Y')} → {date_fin.strftime('%d/%m/%Y')}")
 
     df_mois = df[
         (df['EcritureDate'] >= date_debut) &
@@ -24,47 +32,56 @@ def get_mouvements_mois(df, periode):
         (df['JournalCode']  != JOURNAL_AN)
     ].copy()
 
-    print(f"  Lignes extraites  : {len(df_mois)}")
-    print(f"  Entités présentes : {list(df_mois['Entite'].unique())}")
+    evenement(log, logging.INFO, "mouvements.mois", f"  Lignes extraites  : {len(df_mois)}",
+              periode=str(periode), lignes=len(df_mois))
+    log.debug("  Entités présentes : %s", Paresseux(lambda: list(df_mois['Entite'].unique())))
     return df_mois
 
 
 def get_soldes_bilan(df, periode):
     _, date_fin = get_mois_periode(periode)
 
-    print(f"\nExtraction Bilan — soldes cumulés au {date_fin.strftime('%d/%m/%Y')}")
+    log.info(f"\nExtraction Bilan — soldes cumulés au {date_fin.strftime('%d/%m/%Y')}")
 
     df_ytd = df[df['EcritureDate'] <= date_fin].copy()
 
-    soldes = df_ytd.groupby(
-        ['Entite', 'CompteNum', 'CompteLib'], as_index=False
-    ).agg(Solde=('Mouvement', 'sum'))
+    soldes = df_ytd.groupby(CLES_COMPTE, as_index=False).agg(Solde=('Mouvement', 'sum'))
 
-    soldes['ClasseCompte'] = soldes['CompteNum'].str[0]
-    soldes_bilan = soldes[soldes['ClasseCompte'].isin(CLASSES_BILAN)].copy()
+    soldes_bilan = filtrer_soldes_bilan(soldes)
 
-    print(f"  Lignes YTD    : {len(df_ytd)}")
-    print(f"  Comptes bilan : {len(soldes_bilan)}")
+    evenement(log, logging.INFO, "soldes.bilan", f"  Lignes YTD    : {len(df_ytd)}\n  Comptes bilan : {len(soldes_bilan)}",
+              lignes=len(df_ytd), comptes=len(soldes_bilan))
     return soldes_bilan
 
 
+def filtrer_soldes_bilan(soldes):
+    """Comptes de bilan d'un agrégat (Entite, CompteId, Solde), avec numéro et libellé de compte."""
+    soldes = avec_libelles(soldes[masque_prefixes(soldes['CompteId'], CLASSES_BILAN)])
+    soldes['ClasseCompte'] = libelle_classe(soldes['CompteId'])
+    return soldes
+
+
+def _repartition_par_classe(mouvements):
+    par_classe = mouvements.groupby('ClasseCompte')['Mouvement'].agg(['size', 'sum'])
+    return "\n".join(f"  Classe {classe} : {nb} comptes — Mouvement net : {net:,.2f}"
+                     for classe, nb, net in par_classe.itertuples())
+
+
 def get_mouvements_par_compte(df_mois):
-    mouvements = df_mois.groupby(
-        ['Entite', 'CompteNum', 'CompteLib'], as_index=False
-    ).agg(
+    # Accepte aussi des agrégats partiels (mêmes colonnes Debit/Credit/Mouvement) : mode out-of-core
+    mouvements = df_mois.groupby(CLES_COMPTE, as_index=False).agg(
         Debit     = ('Debit',     'sum'),
         Credit    = ('Credit',    'sum'),
         Mouvement = ('Mouvement', 'sum')
     )
 
-    mouvements['ClasseCompte'] = mouvements['CompteNum'].str[0]
-    mouvements = mouvements.sort_values(['Entite', 'CompteNum']).reset_index(drop=True)
+    mouvements = avec_libelles(mouvements)
+    mouvements['ClasseCompte'] = libelle_classe(mouvements['CompteId'])
+    mouvements = mouvements.sort_values(['Entite', 'CompteId']).reset_index(drop=True)
 
-    print(f"\nAgrégation par compte :")
-    print(f"  Comptes distincts : {mouvements['CompteNum'].nunique()}")
-    print(f"\nRépartition par classe :")
-    for classe, grp in mouvements.groupby('ClasseCompte'):
-        print(f"  Classe {classe} : {len(grp)} comptes — Mouvement net : {grp['Mouvement'].sum():,.2f}")
+    log.info(f"\nAgrégation par compte :")
+    log.info(f"  Comptes distincts : {mouvements['CompteId'].nunique()}")
+    log.debug("\nRépartition par classe :\n%s", Paresseux(lambda: _repartition_par_classe(mouvements)))
 
     return mouvements
 
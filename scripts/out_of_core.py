@@ -0,0 +1,152 @@
+"""
+out_of_core.py — Exécution par blocs des stages 01–04 et 07
+-------------------------------------------------------------
+Logique :
+  - Lit les FEC par blocs (load_fec_01.iter_fec_entites), sans jamais concaténer le FEC,
+    et convertit chaque bloc en devise groupe (fx_translation_02b, taux mis en cache par devise × mois)
+  - Maintient des agrégats partiels à chaque bloc :
+      · mouvements du mois par (Entite, CompteId)               → stage 02/03
+      · soldes cumulés par (Entite, CompteId)                    → stage 02/03
+      · montants (A, B) de chaque paire interco P&L et Bilan     → stage 04
+      · loyers IFRS 16 par entité                               → stage 07
+      · écarts de conversion par entité hors EUR                 → stage 02b
+  - Les agrégats partiels sont recompactés régulièrement : la mémoire reste bornée
+    par la taille d'un bloc + le nombre de comptes distincts, pas par le nombre de lignes
+
+Les agrégats finaux ont exactement la forme des sorties en mémoire
+(get_mouvements_par_compte, get_soldes_bilan, calculer_montants_intercos, _extract_loyers) :
+les stages suivants et output_08 produisent donc le même reporting.
+"""
+
+import numpy as np
+import pandas as pd
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import JOURNAL_AN, OUT_OF_CORE_MEMORY_MB
+from scripts.load_fec_01 import iter_fec_entites, taille_bloc
+from scripts.monthly_movements_02 import get_mois_periode, get_mouvements_par_compte, filtrer_soldes_bilan, CLES_COMPTE
+from scripts.interco_04 import calculer_montants_intercos
+from scripts.ifrs16_07 import _montant_loyers
+from scripts.fx_translation_02b import convertir_ledger, ecarts_conversion, ajouter_ecarts_conversion
+from scripts.ledger_store import reinitialiser_ledger, ecrire_bloc_ledger
+from scripts.drilldown import indexer_lignes
+from scripts.validation import nouveaux_controles, compacter, finaliser
+from scripts.memoire import mesurer
+from scripts.pipeline_config import config_defaut
+from scripts.journal import journal
+
+log = journal(__name__)
+
+
+COMPACTER_TOUS_N = 16   # Recompacte les agrégats partiels tous les N blocs
+
+
+def _compacter(parts, colonnes):
+    if not parts:
+        return []
+    return [pd.concat(parts, ignore_index=True).groupby(CLES_COMPTE, as_index=False)[colonnes].sum()]
+
+
+def agreger_fec_par_blocs(input_folder, periode, df_interco_pl, df_interco_bs, memoire_mb=OUT_OF_CORE_MEMORY_MB,
+                          cache_ledger=True, table_mappings=None, budget=None, taux=None, cfg=None):
+    """
+    cache_ledger   : écrit chaque bloc comme une part du ledger en cache (ledger_store).
+    table_mappings : si fourni (ledger_store.mappings_en_table), indexe aussi les lignes
+                     pour le drill-down (drilldown.indexer_lignes) → clé 'index_parts'.
+    budget         : budget mémoire (memoire.nouveau_budget), relevé après chaque compactage.
+    taux           : table de taux (fx_translation_02b.load_taux) pour les entités hors EUR.
+    cfg            : configuration de la clôture (pipeline_config) — entités, IFRS 16, devises, cache.
+
+    Retourne un dict :
+      'df_comptes'  : équivalent de get_mouvements_par_compte(get_mouvements_mois(df))
+      'df_bilan'    : équivalent de get_soldes_bilan(df)
+      'montants_pl' : paires (A, B) pour eliminer_intercos_pl(montants=...)
+      'montants_bs' : paires (A, B) pour eliminer_intercos_bs(montants=...)
+      'loyers'      : {entité: loyer} pour ifrs16_07.run(loyers=...)
+      'controles'   : rapport d'intégrité FEC (validation.finaliser)
+    """
+    cfg   = cfg or config_defaut()
+    cache = cfg.FOLDERS["cache"]
+    date_debut, date_fin = get_mois_periode(periode)
+    chunksize = taille_bloc(memoire_mb)
+    log.info(f"\nMode out-of-core : plafond {memoire_mb} Mo → blocs de {chunksize} lignes")
+
+    parts_mois, parts_soldes, parts_index = [], [], []
+    montants_pl = np.zeros((len(df_interco_pl), 2))
+    montants_bs = np.zeros((len(df_interco_bs), 2))
+    loyers      = dict.fromkeys(cfg.IFRS16_ENTITIES, 0.0)
+    ctas        = {}
+
+    nb_lignes, nb_blocs = 0, 0
+    date_min, date_max  = None, None
+
+    if cache_ledger:
+        reinitialiser_ledger(periode, cache)
+
+    controles = nouveaux_controles()
+
+    for bloc in iter_fec_entites(input_folder, periode, chunksize, controles, cfg.ENTITES):
+        if taux is not None:
+            bloc = convertir_ledger(bloc, periode, taux, cfg)
+            for e, montant in ecarts_conversion(bloc, periode, cfg).items():
+                ctas[e] = ctas.get(e, 0.0) + montant
+        if cache_ledger:
+            ecrire_bloc_ledger(periode, nb_blocs, bloc, nb_lignes, cache)
+        if table_mappings is not None:
+            parts_index.append(indexer_lignes(bloc, table_mappings, periode, nb_lignes))
+        nb_lignes += len(bloc)
+        nb_blocs  += 1
+        date_min = bloc['EcritureDate'].min() if date_min is None else min(date_min, bloc['EcritureDate'].min())
+        date_max = bloc['EcritureDate'].max() if date_max is None else max(date_max, bloc['EcritureDate'].max())
+
+        bloc_mois = bloc[
+            (bloc['EcritureDate'] >= date_debut) &
+            (bloc['EcritureDate'] <= date_fin)  &
+            (bloc['JournalCode']  != JOURNAL_AN)
+        ]
+        parts_mois.append(
+            bloc_mois.groupby(CLES_COMPTE, as_index=False)[['Debit', 'Credit', 'Mouvement']].sum()
+        )
+        parts_soldes.append(
+            bloc[bloc['EcritureDate'] <= date_fin]
+            .groupby(CLES_COMPTE, as_index=False)
+            .agg(Solde=('Mouvement', 'sum'))
+        )
+
+        if len(df_interco_pl):
+            montants_pl += np.array(calculer_montants_intercos(bloc_mois, df_interco_pl))
+        if len(df_interco_bs):
+            montants_bs += np.array(calculer_montants_intercos(bloc, df_interco_bs))
+        for e in loyers:
+            loyers[e] += _montant_loyers(bloc, periode, e, cfg.IFRS16_LOYER_ACCOUNTS)
+
+        if nb_blocs % COMPACTER_TOUS_N == 0:
+            parts_mois   = _compacter(parts_mois,   ['Debit', 'Credit', 'Mouvement'])
+            parts_soldes = _compacter(parts_soldes, ['Solde'])
+            compacter(controles)
+            mesurer(budget, f"01–02 bloc {nb_blocs}", detail=False)
+
+    if nb_blocs == 0:
+        raise FileNotFoundError(f"Aucune ligne FEC lue pour la période {periode} dans {input_folder}")
+
+    df_comptes = get_mouvements_par_compte(pd.concat(parts_mois, ignore_index=True))
+    soldes     = _compacter(parts_soldes, ['Solde'])[0]
+    df_bilan   = ajouter_ecarts_conversion(filtrer_soldes_bilan(soldes), ctas, cfg)
+
+    log.info(f"\nConsolidation par blocs terminée :")
+    log.info(f"  Blocs lus         : {nb_blocs}")
+    log.info(f"  Total lignes      : {nb_lignes}")
+    log.info(f"  Période couverte  : {date_min.strftime('%d/%m/%Y')} → {date_max.strftime('%d/%m/%Y')}")
+    log.info(f"  Comptes bilan     : {len(df_bilan)}")
+
+    return {
+        'df_comptes' : df_comptes,
+        'df_bilan'   : df_bilan,
+        'montants_pl': [tuple(m) for m in montants_pl],
+        'montants_bs': [tuple(m) for m in montants_bs],
+        'loyers'     : loyers,
+        'index_parts': parts_index,
+        'controles'  : finaliser(controles, periode, cfg),
+    }
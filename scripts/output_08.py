@@ -6,7 +6,11 @@ Onglets générés :
   - CELSIUS & VERTICAL: P&L consolidé CELSIUS + VERTICAL
   - Consolidé         : P&L groupe toutes entités
   - Bilan             : Bilan IFRS consolidé
+  - Tableau de flux   : Flux de trésorerie par méthode indirecte (optionnel)
   - Retraitements     : Récap éliminations intercos + IFRS 16
+  - Tendance intercos : Écart de chaque paire interco par mois de l'exercice (optionnel)
+  - Détail P&L FEC    : Comptes FEC par (Entité, Mapping_PL_detail)
+  - Drill-down P&L    : Lignes FEC du mois (optionnel, liens depuis Détail P&L FEC)
 
 Inputs :
   - df_pl_final       : P&L après intercos (pcg_mapping_03 → agreger_pl)
@@ -18,23 +22,57 @@ Inputs :
   - recap_pl          : Récap éliminations intercos P&L
   - recap_bs          : Récap éliminations intercos Bilan
   - ifrs16            : dict résultat ifrs16_07.run()
+  - capex             : dict résultat capex_06.run(), optionnel → D&A - Milestones + onglet Free cash flow
   - periode           : str YYYYMM
   - output_folder     : chemin de sortie
+  - df_drilldown      : lignes FEC indexées (drilldown.lignes_vue), optionnel
+  - cube              : cube P&L mensuel (pl_cube), optionnel → colonnes YTD / N-1 / R12
+  - budget            : budget mémoire (memoire.py), optionnel
+  - interco_historique: historique paire × mois (interco_historique), optionnel → onglet Tendance intercos
+  - flux              : dict résultat cash_flow_07b.run(), optionnel → onglet Tableau de flux
+  - df_ecarts         : écarts réel vs budget / forecast (previsionnel.run), optionnel → colonnes P&L
+
+Consolidation : agrégats des onglets P&L, Bilan, Free cash flow, Tableau de flux (colonnes
+CONSOLIDÉ) et split BU calculés par le
+moteur de consolidation (consolidation.py) — participations, méthodes, dates de périmètre,
+sous-groupes ; sans participations, somme des entités.
+
+Régénération sélective : empreinte des agrégats de chaque onglet (reporting_YYYYMM.empreintes.json) ;
+onglets inchangés repris du classeur précédent, classeur non réécrit si rien n'a changé.
 """
 
+import hashlib
+import json
+import logging
+import numbers
+import numpy as np
+import pandas as pd
 import os
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from openpyxl import Workbook
+from openpyxl import Workbook, load_workbook
 from openpyxl.styles import PatternFill, Font, Alignment, Border, Side
 from openpyxl.utils import get_column_letter
+from openpyxl.worksheet.hyperlink import Hyperlink
+from openpyxl.cell import WriteOnlyCell
 from pathlib import Path
 
 from config import (
     C_HEADER, C_SECTION, C_SUBTOTAL, C_TOTAL, C_ROW_ALT, C_WHITE, C_WARN,
-    PL_STRUCTURE, REPORTING_GROUPS, IFRS16_ENTITIES,
+    PL_STRUCTURE, ENTITES, SEUIL_ECART_INTERCO, EXERCICE_PREMIER_MOIS, CLASSES_PL,
 )
+from scripts.comptes import masque_prefixes
+from scripts.pipeline_config import config_defaut
+from scripts.pl_cube import fenetres_comparatifs, libelle_comparatif
+from scripts.consolidation import (
+    perimetres, matrice_poids, consolider, structure_pl, LIGNE_MINORITAIRES, LIGNE_PART_GROUPE, DETAIL_MINORITAIRES,
+)
+from scripts.cash_flow_07b import colonne_flux, lignes_tableau, fenetres_flux
+from scripts.memoire import tient, mesurer, exiger, estimer_onglet_mb
+from scripts.journal import journal, evenement
+
+log = journal(__name__)
 
 
 # ── Styles (objets openpyxl) ──────────────────────────────────────────────────
@@ -45,6 +83,8 @@ BORDER_THIN = Border(left=THIN, right=THIN, top=THIN, bottom=THIN)
 
 # ── Sous-totaux calculés ──────────────────────────────────────────────────────
 
+LIGNES_STAFF = ("Staff costs (Operating)", "Staff costs (Non-op.)")   # Alimentées par Silae (bu_split_05)
+
 SUBTOTALS = {
     # Convention : charges stockées en négatif (agreger_pl applique * -1 sur classe 6 et 7)
     # → tous les items se somment directement, sans soustraction explicite
@@ -107,61 +147,167 @@ def _style_cell(cell, row_type, col_idx, alt=False):
         cell.number_format = '#,##0;[Red]-#,##0'
 
 
-# ── Construction du dict de valeurs P&L pour un groupe d'entités ─────────────
+# ── Dict de valeurs P&L d'un périmètre (agrégats reportés) ────────────────────
 
-def _build_pl_dict(entities, df_pl_final, df_opex_rh, ifrs16):
-    """
-    Retourne (d_flat, d_detail) pour un groupe d'entités.
-      d_flat   : {category: montant_total}  — utilisé pour les sous-totaux
-      d_detail : {category: {detail: montant}}  — utilisé pour le rendu à 2 niveaux
-    """
-    d_flat   = {}
+def _pl_dict_reporte(pl_reporte, perimetre):
+    """(d_flat, d_detail) d'un périmètre à partir des agrégats reportés (agregats_par_perimetre)."""
+    df = pl_reporte[pl_reporte["Perimetre"] == perimetre]
+    lignes, details = df[df["Type"] != "detail"], df[df["Type"] == "detail"]
+
+    d_flat   = dict(zip(lignes["Ligne"], lignes["Montant"]))
     d_detail = {}
+    for category, detail, montant in zip(details["Categorie"], details["Ligne"], details["Montant"]):
+        d_detail.setdefault(category, {})[detail] = montant
+    return d_flat, d_detail
 
-    # P&L standard (hors staff et rents)
-    df = df_pl_final[df_pl_final["Entite"].isin(entities)].copy()
 
-    for category, cat_grp in df.groupby("Mapping_PL_category"):
-        d_flat[category] = d_flat.get(category, 0) + cat_grp["Mouvement"].sum()
-        if category not in d_detail:
-            d_detail[category] = {}
-        for detail, det_grp in cat_grp.groupby("Mapping_PL_detail"):
-            d_detail[category][detail] = (
-                d_detail[category].get(detail, 0) + det_grp["Mouvement"].sum()
-            )
+# ── Agrégats reportés par périmètre (entité ou groupe) ───────────────────────
 
-    # Staff costs Operating / Non-operating
+def _lignes_pl_entites(df_pl_final, df_opex_rh, ifrs16, periode, capex=None):
+    """
+    Lignes P&L additives de chaque entité (P&L après éliminations + retraitements RH, IFRS 16, CAPEX,
+    sans sous-totaux) :
+      items   : Entite | Periode | Ligne | Montant
+      details : Entite | Periode | Categorie | Ligne | Montant
+    """
+    pl = df_pl_final.rename(columns={"Mapping_PL_category": "Categorie", "Mouvement": "Montant"})
+    rh = df_opex_rh.iloc[0:0]
     if not df_opex_rh.empty:
-        rh = df_opex_rh[df_opex_rh["Entite"].isin(entities)]
-        op    = rh[rh["Type"].str.lower().str.contains("operat") & ~rh["Type"].str.lower().str.contains("non")]["Mouvement"].sum()
-        nonop = rh[rh["Type"].str.lower().str.contains("non")]["Mouvement"].sum()
-        d_flat["Staff costs (Operating)"]  = -op    # négatif : convention charges négatives
-        d_flat["Staff costs (Non-op.)"]    = -nonop
-
-    # IFRS 16 — neutralisation loyers + ROU D&A
-    # Rents & charges est négatif (FEC classe 6 après * -1) ; loyers > 0 → on additionne pour annuler
-    rou_total = 0
-    for e in entities:
-        if e in IFRS16_ENTITIES:
-            key = e.lower()
-            d_flat["Rents & charges"] = d_flat.get("Rents & charges", 0) + ifrs16[f"loyers_{key}"]
-            rou_total += ifrs16[f"rou_{key}"]
-    d_flat["D&A ROU (IFRS 16)"] = -rou_total  # charge D&A → négatif
-
-    # Calcul des sous-totaux
+        type_rh = df_opex_rh["Type"].str.lower()
+        non_op  = type_rh.str.contains("non")
+        op      = type_rh.str.contains("operat") & ~non_op
+        rh      = df_opex_rh[op | non_op]
+
+    # Staff costs des entités couvertes par Silae : les montants RH remplacent ceux du FEC
+    pl = pl[~(pl["Categorie"].isin(LIGNES_STAFF) & pl["Entite"].isin(rh["Entite"].unique()))]
+    items = [pl[["Entite", "Categorie", "Montant"]].rename(columns={"Categorie": "Ligne"})]
+    details = (pl.rename(columns={"Mapping_PL_detail": "Ligne"})[["Entite", "Categorie", "Ligne", "Montant"]]
+               .assign(Periode=str(periode)))
+
+    # Staff costs Operating / Non-operating (convention charges négatives)
+    if not rh.empty:
+        items.append(pd.DataFrame({
+            "Entite" : rh["Entite"],
+            "Ligne"  : np.where(non_op[op | non_op], LIGNES_STAFF[1], LIGNES_STAFF[0]),
+            "Montant": -rh["Mouvement"],
+        }))
+
+    # IFRS 16 (neutralisation loyers, intérêts, D&A ROU) et CAPEX (dotation milestones)
+    retraitements = [
+        (e, ligne, montant)
+        for e, impact in ifrs16["impacts"].items()
+        for ligne, montant in (("Rents & charges", impact["loyer"]),
+                               ("Financial income (loss)", -impact["interets"]),
+                               ("D&A ROU (IFRS 16)", -impact["amortissement"]))
+    ]
+    if capex is not None:
+        retraitements += [(e, "D&A - Milestones", -v["dotation"]) for e, v in capex["par_entite"].items()]
+    items.append(pd.DataFrame(retraitements, columns=["Entite", "Ligne", "Montant"]))
+
+    return pd.concat(items, ignore_index=True).assign(Periode=str(periode)), details
+
+
+def pl_consolide(items, details, poids):
+    """
+    P&L de chaque (périmètre, période) de `poids` (consolidation.matrice_poids) :
+      items / details : lignes additives par entité (_lignes_pl_entites, ou cube P&L)
+    Retourne (lignes, details) :
+      lignes  : DataFrame large, index (Perimetre, Periode), une colonne par ligne P&L — items,
+                sous-totaux (SUBTOTALS), intérêts minoritaires et part du groupe
+      details : Perimetre | Periode | Categorie | Ligne | Montant
+    """
+    items  = items[items["Ligne"] != LIGNE_MINORITAIRES]
+    index  = pd.MultiIndex.from_product([poids["perimetres"], poids["periodes"]], names=["Perimetre", "Periode"])
+    lignes = (consolider(items, ["Ligne"], poids)
+              .pivot_table(index=["Perimetre", "Periode"], columns="Ligne", values="Montant", aggfunc="sum")
+              .reindex(index).fillna(0))
     for ligne, fn in SUBTOTALS.items():
-        d_flat[ligne] = fn(d_flat)
+        lignes[ligne] = fn(lignes)
 
-    return d_flat, d_detail
+    # Intérêts minoritaires : part des minoritaires dans le résultat net de chaque entité
+    par_entite = (items.assign(Periode=items["Periode"].astype(str))
+                  .pivot_table(index=["Periode", "Entite"], columns="Ligne", values="Montant", aggfunc="sum")
+                  .reindex(pd.MultiIndex.from_product([poids["periodes"], poids["entites"]])).fillna(0))
+    for ligne, fn in SUBTOTALS.items():
+        par_entite[ligne] = fn(par_entite)
+    resultat = par_entite["NET INCOME"].to_numpy().reshape(len(poids["periodes"]), len(poids["entites"]))
+    minoritaires = np.einsum("pqe,pe->qp", poids["minoritaires"], resultat)
+
+    lignes[LIGNE_MINORITAIRES] = -minoritaires.ravel()
+    lignes[LIGNE_PART_GROUPE]  = lignes["NET INCOME"] + lignes[LIGNE_MINORITAIRES]
+    return lignes, consolider(details, ["Categorie", "Ligne"], poids)
+
+
+def _par_perimetre(df, poids, cles):
+    """Tri par périmètre (ordre de matrice_poids) puis par `cles`."""
+    rang = pd.Categorical(df["Perimetre"], categories=poids["perimetres"]).codes
+    return df.assign(_rang=rang).sort_values(["_rang", *cles], kind="stable").drop(columns="_rang").reset_index(drop=True)
+
+
+def _bilan_consolide(df_bilan_mapped, poids, periode, categorie_capitaux):
+    """
+    Bilan de chaque périmètre : soldes pondérés par les poids d'intégration ; la part des
+    minoritaires de chaque ligne de capitaux propres est reclassée sur la ligne DETAIL_MINORITAIRES.
+    Retourne Perimetre | Mapping_BS_category | Mapping_BS_detail | Solde
+    """
+    cles  = ["Mapping_BS_category", "Mapping_BS_detail"]
+    df    = df_bilan_mapped.assign(Periode=str(periode))
+    bilan = consolider(df, cles, poids, valeur="Solde")
+    part  = consolider(df[df["Mapping_BS_category"] == categorie_capitaux], cles, poids,
+                       valeur="Solde", ponderation="minoritaires")
+    if not part.empty:
+        bilan = (pd.concat([bilan, part.assign(Solde=-part["Solde"]), part.assign(Mapping_BS_detail=DETAIL_MINORITAIRES)])
+                 .groupby(["Perimetre", *cles], as_index=False, sort=False)["Solde"].sum())
+    return _par_perimetre(bilan[["Perimetre", *cles, "Solde"]], poids, cles)
+
+
+def agregats_par_perimetre(df_pl_final, df_bilan_mapped, df_opex_rh, ifrs16, periode, capex=None, cfg=None):
+    """
+    Chiffres reportés précalculés pour chaque périmètre (mêmes valeurs que les onglets Excel),
+    consolidés par le moteur de consolidation (participations, méthodes, dates d'entrée / sortie).
+    Retourne un dict de DataFrames longs :
+      'pl_reporte'    : Perimetre | Ligne | Type | Categorie | Montant   (Type 'detail' → Categorie = ligne parente)
+      'bilan_reporte' : Perimetre | Mapping_BS_category | Mapping_BS_detail | Solde
+      'bu_reporte'    : Perimetre | BU | Type | Mouvement                (masse salariale OPEX par BU)
+    """
+    cfg   = cfg or config_defaut()
+    poids = matrice_poids(perimetres(cfg.REPORTING_GROUPS), [periode], cfg)
+
+    # P&L : lignes de la structure dans l'ordre, détails (triés) sous leur ligne parente
+    lignes_pl = [(ligne, t) for ligne, t in structure_pl(cfg) if t not in ("section", "spacer")]
+    rang      = {ligne: i for i, (ligne, _) in enumerate(lignes_pl)}
+    lignes, details = pl_consolide(*_lignes_pl_entites(df_pl_final, df_opex_rh, ifrs16, periode, capex), poids)
+
+    valeurs = lignes.reindex(columns=list(rang), fill_value=0).droplevel("Periode")
+    items   = valeurs.stack().rename("Montant").reset_index()
+    items.columns = ["Perimetre", "Ligne", "Montant"]
+    items["Type"], items["Categorie"] = items["Ligne"].map(dict(lignes_pl)), items["Ligne"]
+    details = details[details["Categorie"].isin(rang)].assign(Type="detail")
+    pl = pd.concat([items.assign(_ordre=0), details.assign(_ordre=1)], ignore_index=True)
+    pl = _par_perimetre(pl.assign(_ligne=pl["Categorie"].map(rang)), poids, ["_ligne", "_ordre", "Ligne"])
+    pl = pl[["Perimetre", "Ligne", "Type", "Categorie", "Montant"]].astype({"Montant": float})
+
+    bu = pd.DataFrame()
+    if not df_opex_rh.empty:
+        bu = consolider(df_opex_rh.assign(Periode=str(periode)), ["BU", "Type"], poids, valeur="Mouvement")
+        bu = _par_perimetre(bu, poids, ["BU", "Type"])[["Perimetre", "BU", "Type", "Mouvement"]]
+
+    return {
+        "pl_reporte"   : pl,
+        "bilan_reporte": _bilan_consolide(df_bilan_mapped, poids, periode, cfg.CATEGORIE_CAPITAUX_PROPRES),
+        "bu_reporte"   : bu,
+    }
 
 
 # ── Écriture d'un onglet P&L ──────────────────────────────────────────────────
 
-def _write_pl_sheet(ws, title, col_groups, periode):
+def _write_pl_sheet(ws, title, col_groups, periode, structure=PL_STRUCTURE, pourcentages=()):
     """
     col_groups : liste de (label_colonne, d_flat, d_detail)
-      d_flat   : {category: montant_total}
+      d_flat   : {category: montant_total}  (None : cellule vide)
       d_detail : {category: {detail: montant}}
+    structure    : lignes (ligne, type) du P&L — PL_STRUCTURE de la configuration
+    pourcentages : labels des colonnes affichées en % (écarts vs budget / forecast)
     """
     # Titre
     ws.merge_cells(start_row=1, start_column=1, end_row=1, end_column=1 + len(col_groups))
@@ -185,15 +331,17 @@ def _write_pl_sheet(ws, title, col_groups, periode):
     row = 3
     alt  = False
 
-    for ligne, row_type in PL_STRUCTURE:
+    for ligne, row_type in structure:
         ws.row_dimensions[row].height = 16 if row_type != "spacer" else 6
         label_cell = ws.cell(row, 1, ligne if row_type != "spacer" else "")
         _style_cell(label_cell, row_type, 1, alt)
 
-        for ci, (_, d_flat, _) in enumerate(col_groups, start=2):
+        for ci, (lbl, d_flat, _) in enumerate(col_groups, start=2):
             val = d_flat.get(ligne, 0) if row_type not in ("section", "spacer") else ""
             c = ws.cell(row, ci, val if val != 0 or row_type in ("subtotal", "total") else "")
             _style_cell(c, row_type, ci, alt)
+            if lbl in pourcentages and row_type not in ("section", "spacer"):
+                c.number_format = '0.0%;[Red]-0.0%'
 
         row += 1
 
@@ -233,15 +381,20 @@ def _write_pl_sheet(ws, title, col_groups, periode):
 
 # ── Onglet Bilan ──────────────────────────────────────────────────────────────
 
-def _write_bilan_sheet(ws, df_bilan_mapped, periode):
-    headers = ["Ligne Bilan"] + ["FR", "PID", "CELSIUS", "VERTICAL", "CONSOLIDÉ"]
-    entites = ["FR", "PID", "CELSIUS", "VERTICAL"]
+def _write_bilan_sheet(ws, df_bilan_mapped, periode, entites=ENTITES, consolide=None):
+    """consolide : bilan consolidé (_bilan_consolide) — colonne CONSOLIDÉ ; à défaut, somme des entités."""
+    headers = ["Ligne Bilan"] + list(entites) + ["CONSOLIDÉ"]
 
     # Pivot
     pivot = df_bilan_mapped.pivot_table(
         index="Mapping_BS_detail", columns="Entite", values="Solde", aggfunc="sum"
     ).reindex(columns=entites).fillna(0)
-    pivot["CONSOLIDÉ"] = pivot.sum(axis=1)
+    if consolide is None:
+        pivot["CONSOLIDÉ"] = pivot.sum(axis=1)
+    else:
+        soldes = consolide.groupby("Mapping_BS_detail")["Solde"].sum()
+        pivot  = pivot.reindex(pivot.index.union(soldes.index), fill_value=0)
+        pivot["CONSOLIDÉ"] = soldes.reindex(pivot.index, fill_value=0)
     pivot = pivot.reset_index()
 
     # Titre
@@ -277,6 +430,146 @@ def _write_bilan_sheet(ws, df_bilan_mapped, periode):
         ws.column_dimensions[get_column_letter(ci)].width = 14
 
 
+# ── Onglet Free cash flow ─────────────────────────────────────────────────────
+
+FCF_LIGNES = [
+    ("EBITDA",                              "subtotal"),
+    ("Loyers IFRS 16 décaissés",            "item"),
+    ("CAPEX milestones décaissés",          "item"),
+    ("Masse salariale capitalisée",         "item"),
+    ("FREE CASH FLOW (avant BFR et impôts)", "total"),
+]
+VARIATION_COLS = [
+    ("Entite", "Entité"), ("Projet", "Projet"), ("Brut_ouverture", "Brut ouverture"), ("Additions", "Additions"),
+    ("Dotation", "Dotation"), ("Amort_cumules", "Amort. cumulés"), ("VNC", "VNC clôture"),
+]
+
+
+def _fcf_consolide(df_pl_final, df_opex_rh, ifrs16, capex, periode, poids):
+    """
+    Free cash flow de chaque périmètre de `poids` (consolidation.matrice_poids) : EBITDA du P&L
+    consolidé (pl_consolide), décaissements pondérés par les mêmes poids d'intégration.
+    Retourne un DataFrame périmètre × lignes FCF_LIGNES.
+    """
+    lignes, _ = pl_consolide(*_lignes_pl_entites(df_pl_final, df_opex_rh, ifrs16, periode, capex), poids)
+    decaissements = pd.DataFrame(
+        [(e, "Loyers IFRS 16 décaissés", -v["loyer"]) for e, v in ifrs16["impacts"].items()]
+        + [(e, ligne, -v[cle]) for e, v in capex["par_entite"].items()
+           for ligne, cle in (("CAPEX milestones décaissés", "decaisses"), ("Masse salariale capitalisée", "capitalise_rh"))],
+        columns=["Entite", "Ligne", "Montant"],
+    ).assign(Periode=str(periode))
+    montants = (consolider(decaissements, ["Ligne"], poids)
+                .pivot_table(index="Perimetre", columns="Ligne", values="Montant", aggfunc="sum"))
+
+    fcf = (lignes.droplevel("Periode")[["EBITDA"]].join(montants)
+           .reindex(index=poids["perimetres"], columns=[l for l, t in FCF_LIGNES if t != "total"]).fillna(0.0))
+    fcf[FCF_LIGNES[-1][0]] = fcf.sum(axis=1)
+    return fcf
+
+
+def _write_fcf_sheet(ws, fcf, capex, periode):
+    """Free cash flow opérationnel par entité et consolidé (_fcf_consolide) + variation des immobilisations milestones."""
+    colonnes = list(fcf.index)
+    valeurs  = [fcf.loc[c].to_dict() for c in colonnes]
+
+    ws.merge_cells(start_row=1, start_column=1, end_row=1, end_column=1 + len(colonnes))
+    tc = ws.cell(1, 1, f"Free cash flow — {periode[:4]}/{periode[4:]}")
+    tc.font = _font(bold=True, size=12, color=C_WHITE)
+    tc.fill = _fill(C_HEADER)
+    tc.alignment = Alignment(horizontal="center", vertical="center")
+    ws.row_dimensions[1].height = 22
+
+    ws.cell(2, 1, "").fill = _fill(C_HEADER)
+    for ci, lbl in enumerate(colonnes, start=2):
+        c = ws.cell(2, ci, lbl)
+        c.fill = _fill(C_HEADER)
+        c.font = _font(bold=True, color=C_WHITE)
+        c.alignment = Alignment(horizontal="right", vertical="center")
+        c.border = BORDER_THIN
+
+    row = 3
+    for i, (ligne, row_type) in enumerate(FCF_LIGNES):
+        _style_cell(ws.cell(row, 1, ligne), row_type, 1, i % 2 == 1)
+        for ci, v in enumerate(valeurs, start=2):
+            _style_cell(ws.cell(row, ci, v[ligne]), row_type, ci, i % 2 == 1)
+        row += 1
+
+    # Tableau de variation des immobilisations du mois
+    row += 1
+    ws.merge_cells(start_row=row, start_column=1, end_row=row, end_column=len(VARIATION_COLS))
+    c = ws.cell(row, 1, f"Immobilisations milestones — variation {periode[:4]}/{periode[4:]}")
+    c.fill = _fill(C_SECTION)
+    c.font = _font(bold=True, color=C_WHITE)
+    row += 1
+    for ci, (_, h) in enumerate(VARIATION_COLS, 1):
+        c = ws.cell(row, ci, h)
+        c.fill = _fill(C_HEADER)
+        c.font = _font(bold=True, color=C_WHITE)
+        c.border = BORDER_THIN
+    row += 1
+    for ri, r in enumerate(capex["df_variation"][[col for col, _ in VARIATION_COLS]].itertuples(index=False)):
+        for ci, val in enumerate(r, 1):
+            c = ws.cell(row, ci, val)
+            c.fill = _fill(C_ROW_ALT if ri % 2 == 0 else C_WHITE)
+            c.font = _font()
+            c.border = BORDER_THIN
+            if ci > 2:
+                c.number_format = '#,##0;[Red]-#,##0'
+        row += 1
+
+    ws.column_dimensions["A"].width = 38
+    for ci in range(2, 2 + max(len(colonnes), len(VARIATION_COLS))):
+        ws.column_dimensions[get_column_letter(ci)].width = 16
+
+
+# ── Onglet Tableau de flux ────────────────────────────────────────────────────
+
+FLUX_SHEET = "Tableau de flux"
+
+
+def _flux_consolide(df_flux, poids):
+    """
+    Tableau de flux de chaque périmètre de `poids` sur tous ses mois (mêmes poids d'intégration que
+    le P&L et le Bilan consolidés). Retourne le format de df_flux, périmètre dans la colonne Entite.
+    """
+    return consolider(df_flux, ["Section", "Ligne"], poids).rename(columns={"Perimetre": "Entite"})
+
+
+def _write_flux_sheet(ws, df_flux, periode, entites=ENTITES, premier_mois=EXERCICE_PREMIER_MOIS):
+    """
+    Tableau de flux de trésorerie (méthode indirecte) par entité, consolidé du mois et cumul de l'exercice.
+    df_flux : flux par périmètre (_flux_consolide) — chaque entité et CONSOLIDÉ.
+    """
+    fenetres = [(e, [e], [str(periode)]) for e in entites] + \
+               [(lbl, ["CONSOLIDÉ"], mois) for lbl, mois in fenetres_flux(periode, df_flux["Periode"].unique(), premier_mois)]
+    colonnes = [colonne_flux(df_flux, ents, mois) for _, ents, mois in fenetres]
+
+    ws.merge_cells(start_row=1, start_column=1, end_row=1, end_column=1 + len(fenetres))
+    tc = ws.cell(1, 1, f"Tableau de flux de trésorerie — {periode[:4]}/{periode[4:]}")
+    tc.font = _font(bold=True, size=12, color=C_WHITE)
+    tc.fill = _fill(C_HEADER)
+    tc.alignment = Alignment(horizontal="center", vertical="center")
+    ws.row_dimensions[1].height = 22
+
+    ws.cell(2, 1, "").fill = _fill(C_HEADER)
+    for ci, (lbl, _, _) in enumerate(fenetres, start=2):
+        c = ws.cell(2, ci, lbl)
+        c.fill = _fill(C_HEADER)
+        c.font = _font(bold=True, color=C_WHITE)
+        c.alignment = Alignment(horizontal="right", vertical="center")
+        c.border = BORDER_THIN
+
+    for i, (ligne, row_type, valeurs) in enumerate(lignes_tableau(df_flux, colonnes)):
+        row = 3 + i
+        _style_cell(ws.cell(row, 1, ligne), row_type, 1, i % 2 == 1)
+        for ci in range(2, 2 + len(fenetres)):
+            _style_cell(ws.cell(row, ci, valeurs[ci - 2] if valeurs else None), row_type, ci, i % 2 == 1)
+
+    ws.column_dimensions["A"].width = 38
+    for ci in range(2, 2 + len(fenetres)):
+        ws.column_dimensions[get_column_letter(ci)].width = 16
+
+
 # ── Onglet Retraitements ──────────────────────────────────────────────────────
 
 def _write_retraitements_sheet(ws, recap_pl, recap_bs, ifrs16, periode):
@@ -333,12 +626,105 @@ def _write_retraitements_sheet(ws, recap_pl, recap_bs, ifrs16, periode):
         ws.column_dimensions[get_column_letter(ci)].width = 16
 
 
+# ── Onglet Tendance intercos ──────────────────────────────────────────────────
+
+TENDANCE_SHEET = "Tendance intercos"
+
+
+def _write_tendance_interco_sheet(ws, historique, periode, premier_mois=EXERCICE_PREMIER_MOIS,
+                                  seuil=SEUIL_ECART_INTERCO):
+    """Écart de chaque paire interco par mois de l'exercice (historique persisté, interco_historique)."""
+    mois   = fenetres_comparatifs(periode, premier_mois)["YTD"]
+    ecarts = historique[historique["Mois"].isin(mois)].pivot_table(
+        index=["Vue", "Description"], columns="Mois", values="Ecart", aggfunc="sum"
+    ).reindex(columns=mois)
+
+    ws.merge_cells(start_row=1, start_column=1, end_row=1, end_column=1 + len(mois))
+    tc = ws.cell(1, 1, f"Écarts intercos par mois — exercice au {periode[4:]}/{periode[:4]}")
+    tc.font = _font(bold=True, size=12, color=C_WHITE)
+    tc.fill = _fill(C_HEADER)
+    tc.alignment = Alignment(horizontal="center", vertical="center")
+    ws.row_dimensions[1].height = 22
+
+    ws.cell(2, 1, "Paire").fill = _fill(C_HEADER)
+    ws.cell(2, 1).font = _font(bold=True, color=C_WHITE)
+    for ci, m in enumerate(mois, start=2):
+        c = ws.cell(2, ci, f"{m[4:]}/{m[:4]}")
+        c.fill = _fill(C_HEADER)
+        c.font = _font(bold=True, color=C_WHITE)
+        c.alignment = Alignment(horizontal="right", vertical="center")
+        c.border = BORDER_THIN
+
+    row = 3
+    for vue, titre in [("PL", "P&L — écart des mouvements du mois"), ("BS", "Bilan — écart des soldes fin de mois")]:
+        _style_cell(ws.cell(row, 1, titre), "section", 1)
+        for ci in range(2, 2 + len(mois)):
+            _style_cell(ws.cell(row, ci), "section", ci)
+        row += 1
+        if vue not in ecarts.index.get_level_values("Vue"):
+            continue
+        for i, (desc, valeurs) in enumerate(ecarts.loc[vue].iterrows()):
+            _style_cell(ws.cell(row, 1, desc), "item", 1, i % 2 == 1)
+            for ci, v in enumerate(valeurs, start=2):
+                c = ws.cell(row, ci, None if pd.isna(v) else v)
+                _style_cell(c, "detail", ci, i % 2 == 1)
+                if pd.notna(v) and abs(v) > seuil:
+                    c.font = _font(bold=True, color=C_WARN)
+                c.number_format = '#,##0.00;[Red]-#,##0.00'
+            row += 1
+
+    ws.column_dimensions["A"].width = 38
+    for ci in range(2, 2 + len(mois)):
+        ws.column_dimensions[get_column_letter(ci)].width = 13
+    ws.freeze_panes = "B3"
+
+
+# ── Onglet Split BU (packs) ───────────────────────────────────────────────────
+
+def _write_bu_sheet(ws, df_bu, perimetre, periode):
+    """Masse salariale OPEX par BU (colonnes = Type), à partir de bu_reporte."""
+    pivot = df_bu.pivot_table(index="BU", columns="Type", values="Mouvement", aggfunc="sum").fillna(0)
+    pivot["TOTAL"] = pivot.sum(axis=1)
+
+    ws.merge_cells(start_row=1, start_column=1, end_row=1, end_column=1 + len(pivot.columns))
+    tc = ws.cell(1, 1, f"Split BU — {perimetre} — {periode[:4]}/{periode[4:]}")
+    tc.font = _font(bold=True, size=12, color=C_WHITE)
+    tc.fill = _fill(C_HEADER)
+    tc.alignment = Alignment(horizontal="center", vertical="center")
+    ws.row_dimensions[1].height = 22
+
+    for ci, h in enumerate(["BU"] + list(pivot.columns), 1):
+        c = ws.cell(2, ci, h)
+        c.fill = _fill(C_HEADER)
+        c.font = _font(bold=True, color=C_WHITE)
+        c.alignment = Alignment(horizontal="right" if ci > 1 else "left", vertical="center")
+        c.border = BORDER_THIN
+
+    row = 3
+    for i, (bu, valeurs) in enumerate(pivot.iterrows()):
+        _style_cell(ws.cell(row, 1, bu), "item", 1, i % 2 == 1)
+        for ci, v in enumerate(valeurs, start=2):
+            _style_cell(ws.cell(row, ci, v), "item", ci, i % 2 == 1)
+        row += 1
+
+    _style_cell(ws.cell(row, 1, "TOTAL"), "total", 1)
+    for ci, v in enumerate(pivot.sum(), start=2):
+        _style_cell(ws.cell(row, ci, v), "total", ci)
+
+    ws.column_dimensions["A"].width = 30
+    for ci in range(2, 2 + len(pivot.columns)):
+        ws.column_dimensions[get_column_letter(ci)].width = 16
+
+
 # ── Onglet Détail P&L FEC ─────────────────────────────────────────────────────
 
-def _write_pl_detail_sheet(ws, df_pl_elimine, periode):
-    """Comptes FEC individuels avec leur mapping P&L, groupés par (Entité, Mapping_PL_detail)."""
+def _write_pl_detail_sheet(ws, df_pl_elimine, periode, liens=None):
+    """
+    Comptes FEC individuels avec leur mapping P&L, groupés par (Entité, Mapping_PL_detail).
+    liens : {(entité, mapping): ancre} — lien hypertexte de chaque section vers le drill-down FEC.
+    """
     df = df_pl_elimine[
-        df_pl_elimine["ClasseCompte"].isin(["6", "7"]) &
+        masque_prefixes(df_pl_elimine["CompteId"], CLASSES_PL) &
         df_pl_elimine["Mapping_PL_detail"].notna()
     ].copy()
 
@@ -374,6 +760,10 @@ def _write_pl_detail_sheet(ws, df_pl_elimine, periode):
         ch.font = _font(bold=True, color=C_WHITE)
         ch.alignment = Alignment(horizontal="left", vertical="center")
         ch.border = BORDER_THIN
+        if liens and (entite, mapping) in liens:
+            lien = liens[(entite, mapping)]
+            # Ancre interne (onglet du classeur) ou lien vers le classeur de drill-down écrit en flux
+            ch.hyperlink = lien if "#" in lien else Hyperlink(ref=ch.coordinate, location=lien)
         cs = ws.cell(row, NB_COLS, grp["Mouvement_PL"].sum())
         cs.fill = _fill(C_SECTION)
         cs.font = _font(bold=True, color=C_WHITE)
@@ -406,8 +796,205 @@ def _write_pl_detail_sheet(ws, df_pl_elimine, periode):
     ws.column_dimensions["E"].width = 16
 
 
+# ── Onglet Drill-down P&L (lignes FEC) ───────────────────────────────────────
+
+DRILL_SHEET = "Drill-down P&L"
+DRILL_COLS  = [
+    ("Entite", "Entité", 12), ("CompteNum", "N° Compte", 12), ("EcritureDate", "Date", 12),
+    ("JournalCode", "Journal", 9), ("EcritureNum", "N° Écriture", 12), ("PieceRef", "Pièce", 14),
+    ("EcritureLib", "Libellé", 42), ("Elimination", "Élimination interco", 24), ("Mouvement_Reporte", "Mouvement", 16),
+]
+
+
+def _drilldown_sections(df_lignes):
+    """(entité, mapping, total, lignes) par section de l'onglet Drill-down P&L."""
+    for (entite, detail), grp in df_lignes.groupby(["Entite", "Detail"], sort=True):
+        yield entite, detail, grp["Mouvement_Reporte"].sum(), grp[[col for col, _, _ in DRILL_COLS]].itertuples(index=False)
+
+
+def _drilldown_valeur(val):
+    return val.to_pydatetime() if hasattr(val, "to_pydatetime") else val
+
+
+def _write_drilldown_sheet(ws, df_lignes, periode):
+    """
+    Lignes FEC du mois (drilldown.lignes_vue) groupées par (Entité, Mapping_PL_detail).
+    Retourne {(entité, mapping): ancre} pour les liens de l'onglet Détail P&L FEC.
+    """
+    NB_COLS = len(DRILL_COLS)
+
+    ws.merge_cells(start_row=1, start_column=1, end_row=1, end_column=NB_COLS)
+    tc = ws.cell(1, 1, f"Drill-down P&L — lignes FEC — {periode[:4]}/{periode[4:]}")
+    tc.font = _font(bold=True, size=12, color=C_WHITE)
+    tc.fill = _fill(C_HEADER)
+    tc.alignment = Alignment(horizontal="center", vertical="center")
+    ws.row_dimensions[1].height = 22
+
+    for ci, (_, h, width) in enumerate(DRILL_COLS, 1):
+        c = ws.cell(2, ci, h)
+        c.fill = _fill(C_HEADER)
+        c.font = _font(bold=True, color=C_WHITE)
+        c.alignment = Alignment(horizontal="right" if ci == NB_COLS else "left")
+        c.border = BORDER_THIN
+        ws.column_dimensions[get_column_letter(ci)].width = width
+
+    ancres = {}
+    row = 3
+    for entite, detail, total, lignes in _drilldown_sections(df_lignes):
+        ancres[(entite, detail)] = f"'{DRILL_SHEET}'!A{row}"
+
+        ws.merge_cells(start_row=row, start_column=1, end_row=row, end_column=NB_COLS - 1)
+        ch = ws.cell(row, 1, f"{entite}  ·  {detail}")
+        ch.fill = _fill(C_SECTION)
+        ch.font = _font(bold=True, color=C_WHITE)
+        cs = ws.cell(row, NB_COLS, total)
+        cs.fill = _fill(C_SECTION)
+        cs.font = _font(bold=True, color=C_WHITE)
+        cs.number_format = '#,##0;[Red]-#,##0'
+        row += 1
+
+        for i, r in enumerate(lignes):
+            alt = i % 2 == 0
+            for ci, val in enumerate(r, 1):
+                c = ws.cell(row, ci, _drilldown_valeur(val))
+                c.fill = _fill(C_ROW_ALT if alt else C_WHITE)
+                c.font = _font(color=C_WARN) if r.Elimination else _font()
+                if ci == NB_COLS:
+                    c.number_format = '#,##0.00;[Red]-#,##0.00'
+                elif DRILL_COLS[ci - 1][0] == "EcritureDate":
+                    c.number_format = "DD/MM/YYYY"
+            row += 1
+
+    return ancres
+
+
+def _write_drilldown_classeur(df_lignes, periode, filepath):
+    """
+    Variante en flux de _write_drilldown_sheet (budget mémoire) : classeur séparé en écriture
+    seule, les lignes sont écrites au fil de l'eau sans garder les cellules en mémoire.
+    Retourne {(entité, mapping): lien externe 'fichier#ancre'}.
+    """
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(DRILL_SHEET)
+    for ci, (_, _, width) in enumerate(DRILL_COLS, 1):
+        ws.column_dimensions[get_column_letter(ci)].width = width
+
+    def _cellule(val, fill, font, number_format=None):
+        c = WriteOnlyCell(ws, value=val)
+        c.fill, c.font = fill, font
+        if number_format:
+            c.number_format = number_format
+        return c
+
+    f_header, f_section = _fill(C_HEADER), _fill(C_SECTION)
+    f_lignes            = (_fill(C_ROW_ALT), _fill(C_WHITE))
+    t_blanc, t_normal, t_warn = _font(bold=True, color=C_WHITE), _font(), _font(color=C_WARN)
+    formats = ['#,##0.00;[Red]-#,##0.00' if col == "Mouvement_Reporte" else "DD/MM/YYYY" if col == "EcritureDate" else None
+               for col, _, _ in DRILL_COLS]
+
+    ws.append([_cellule(f"Drill-down P&L — lignes FEC — {periode[:4]}/{periode[4:]}", f_header,
+                        _font(bold=True, size=12, color=C_WHITE))])
+    ws.append([_cellule(h, f_header, t_blanc) for _, h, _ in DRILL_COLS])
+
+    ancres = {}
+    row = 3
+    for entite, detail, total, lignes in _drilldown_sections(df_lignes):
+        ancres[(entite, detail)] = f"{Path(filepath).name}#'{DRILL_SHEET}'!A{row}"
+        ws.append([_cellule(f"{entite}  ·  {detail}", f_section, t_blanc)]
+                  + [_cellule(None, f_section, t_blanc)] * (len(DRILL_COLS) - 2)
+                  + [_cellule(total, f_section, t_blanc, '#,##0;[Red]-#,##0')])
+        row += 1
+        for i, r in enumerate(lignes):
+            fill, font = f_lignes[i % 2], (t_warn if r.Elimination else t_normal)
+            ws.append([_cellule(_drilldown_valeur(val), fill, font, fmt) for val, fmt in zip(r, formats)])
+            row += 1
+
+    wb.save(filepath)
+    log.info(f"[output_08] Onglet '{DRILL_SHEET}' écrit en flux : {filepath}")
+    return ancres
+
+
 # ── Point d'entrée principal ──────────────────────────────────────────────────
 
+def _write_detail_et_drilldown(ws_detail, df_pl_elimine, df_drilldown, drill_onglet, periode, output_folder, budget=None):
+    """Détail P&L FEC + lignes FEC du drill-down (onglet du classeur ou classeur séparé en flux), liés cellule à cellule."""
+    liens = None
+    if df_drilldown is not None and not df_drilldown.empty:
+        if drill_onglet:
+            liens = _write_drilldown_sheet(ws_detail.parent[DRILL_SHEET], df_drilldown, periode)
+            (Path(output_folder) / f"drilldown_{periode}.xlsx").unlink(missing_ok=True)
+            log.info(f"[output_08] Onglet '{DRILL_SHEET}' généré")
+        else:
+            # Budget mémoire insuffisant pour garder les cellules en mémoire → classeur séparé en flux
+            liens = _write_drilldown_classeur(df_drilldown, periode, Path(output_folder) / f"drilldown_{periode}.xlsx")
+        mesurer(budget, "08 drill-down P&L")
+    exiger(budget, "08 Détail P&L FEC", estimer_onglet_mb(len(df_pl_elimine), 5))
+    _write_pl_detail_sheet(ws_detail, df_pl_elimine, periode, liens)
+
+
+# ── Empreintes des onglets (régénération sélective) ──────────────────────────
+
+# Code de ce module et styles : une évolution du rendu invalide toutes les empreintes
+_EMPREINTE_RENDU = hashlib.sha256(
+    Path(__file__).read_bytes() + repr((C_HEADER, C_SECTION, C_SUBTOTAL, C_TOTAL, C_ROW_ALT, C_WHITE, C_WARN)).encode()
+).hexdigest()
+
+
+def _hacher(h, obj):
+    if isinstance(obj, (pd.DataFrame, pd.Series)):
+        h.update(repr(list(obj.columns) if isinstance(obj, pd.DataFrame) else obj.name).encode())
+        h.update(pd.util.hash_pandas_object(obj, index=False).to_numpy().tobytes())
+    elif isinstance(obj, dict):
+        for cle in sorted(obj, key=str):
+            h.update(f"{cle!r}:".encode())
+            _hacher(h, obj[cle])
+    elif isinstance(obj, (list, tuple)):
+        h.update(b"[")
+        for x in obj:
+            _hacher(h, x)
+        h.update(b"]")
+    elif isinstance(obj, numbers.Number) and not isinstance(obj, bool):
+        h.update(repr(float(obj)).encode())
+    else:
+        h.update(repr(obj).encode())
+    h.update(b";")
+
+
+def empreinte_onglet(*entrees):
+    """Empreinte (sha256) des agrégats affichés par un onglet : DataFrames, dicts, listes, scalaires."""
+    h = hashlib.sha256(_EMPREINTE_RENDU.encode())
+    for entree in entrees:
+        _hacher(h, entree)
+    return h.hexdigest()
+
+
+def _chemin_empreintes(filepath):
+    return Path(filepath).with_suffix(".empreintes.json")
+
+
+def _sha256_fichier(chemin):
+    return hashlib.sha256(Path(chemin).read_bytes()).hexdigest()
+
+
+def lire_empreintes_onglets(filepath):
+    """{onglet: empreinte} du classeur existant ; {} s'il est absent ou modifié depuis sa génération."""
+    chemin = _chemin_empreintes(filepath)
+    if not Path(filepath).exists() or not chemin.exists():
+        return {}
+    precedent = json.loads(chemin.read_text(encoding="utf-8"))
+    if precedent.get("classeur_sha256") != _sha256_fichier(filepath):
+        log.info(f"[output_08] {Path(filepath).name} modifié depuis sa génération → régénération complète")
+        return {}
+    return precedent["onglets"]
+
+
+def sauver_empreintes_onglets(filepath, empreintes):
+    _chemin_empreintes(filepath).write_text(json.dumps({
+        "classeur_sha256": _sha256_fichier(filepath),
+        "onglets"        : empreintes,
+    }, ensure_ascii=False, indent=2), encoding="utf-8")
+
+
 def run(
     df_pl_final,
     df_pl_elimine,
@@ -418,45 +1005,173 @@ def run(
     ifrs16,
     periode,
     output_folder="data/output",
+    df_drilldown=None,
+    cube=None,
+    budget=None,
+    capex=None,
+    interco_historique=None,
+    flux=None,
+    agregats=None,
+    df_ecarts=None,
+    cfg=None,
 ):
+    """
+    df_drilldown : lignes FEC indexées (drilldown.lignes_vue) — ajoute l'onglet Drill-down P&L.
+    cube         : cube P&L mensuel (pl_cube) — ajoute les colonnes comparatives (YTD, N-1, R12).
+    budget       : budget mémoire (memoire.nouveau_budget) — au-delà, l'onglet Drill-down P&L
+                   est écrit en flux dans un classeur séparé drilldown_YYYYMM.xlsx.
+    capex        : résultat capex_06.run() — D&A - Milestones + onglet Free cash flow.
+    interco_historique : historique des écarts intercos (interco_historique) — onglet Tendance intercos.
+    flux         : résultat cash_flow_07b.run() — onglet Tableau de flux.
+    agregats     : agrégats reportés (agregats_par_perimetre) — recalculés s'ils ne sont pas fournis.
+    df_ecarts    : écarts réel vs budget / forecast (previsionnel.run) — colonnes prévu / Δ / Δ % des onglets P&L.
+    cfg          : configuration de la clôture (pipeline_config) — groupes, structure P&L, comparatifs.
+
+    Régénération sélective (cfg.REPORTING_REUTILISATION) : chaque onglet a une empreinte de ses
+    agrégats (reporting_YYYYMM.empreintes.json). Seuls les onglets dont l'empreinte a changé sont
+    réécrits, les autres sont repris du classeur précédent ; si aucune n'a changé, le classeur
+    n'est pas réécrit.
+    """
+    cfg = cfg or config_defaut()
     Path(output_folder).mkdir(parents=True, exist_ok=True)
-    wb = Workbook()
-    wb.remove(wb.active)  # Supprime la feuille vide par défaut
+    filepath = Path(output_folder) / f"reporting_{periode}.xlsx"
 
-    # ── Onglets P&L ───────────────────────────────────────────────────────────
-    for sheet_name, entities in REPORTING_GROUPS.items():
-        ws = wb.create_sheet(sheet_name)
-
-        # Colonnes = une par entité + total groupe
-        col_groups = []
-        for e in entities:
-            d_flat, d_detail = _build_pl_dict([e], df_pl_final, df_opex_rh, ifrs16)
-            col_groups.append((e, d_flat, d_detail))
-
-        d_flat_total, d_detail_total = _build_pl_dict(entities, df_pl_final, df_opex_rh, ifrs16)
-        col_groups.append(("TOTAL", d_flat_total, d_detail_total))
+    # Onglets du classeur, dans l'ordre : (nom, empreinte des agrégats affichés, fonction d'écriture)
+    onglets = []
 
-        _write_pl_sheet(ws, sheet_name, col_groups, periode)
-        print(f"[output_08] Onglet '{sheet_name}' généré")
+    # ── Onglets P&L ───────────────────────────────────────────────────────────
+    # Colonnes = une par membre (entité ou sous-groupe) + total du groupe, lues dans les agrégats reportés
+    if agregats is None:
+        agregats = agregats_par_perimetre(df_pl_final, df_bilan_mapped, df_opex_rh, ifrs16, periode, capex, cfg)
+    pl_reporte = agregats["pl_reporte"]
+    structure  = structure_pl(cfg)
+    groupes    = perimetres(cfg.REPORTING_GROUPS)
+
+    # Comparatifs des totaux groupe : cube P&L consolidé sur toutes les périodes des fenêtres d'un coup
+    fenetres = {nom: periodes for nom, periodes in fenetres_comparatifs(periode, cfg.EXERCICE_PREMIER_MOIS).items()
+                if nom in cfg.PL_COMPARATIFS} if cube is not None else {}
+    if fenetres:
+        poids_c = matrice_poids({g: groupes[g] for g in cfg.REPORTING_GROUPS},
+                                sorted({p for periodes in fenetres.values() for p in periodes}), cfg)
+        lignes_c, details_c = pl_consolide(
+            cube[cube["Detail"] == ""].rename(columns={"Categorie": "Ligne"}),
+            cube[cube["Detail"] != ""].rename(columns={"Detail": "Ligne"}),
+            poids_c,
+        )
+
+    ecarts_mois = {}
+    if df_ecarts is not None and not df_ecarts.empty:
+        mois = df_ecarts[(df_ecarts["Periode"] == str(periode)) & df_ecarts["Version"].isin(cfg.PL_ECARTS)]
+        for (perimetre, version), ecarts in mois.groupby(["Perimetre", "Version"], sort=False):
+            ecarts_mois.setdefault(perimetre, {})[version] = ecarts
+        ecarts_mois = {p: {v: e[v] for v in cfg.PL_ECARTS if v in e} for p, e in ecarts_mois.items()}
+
+    for sheet_name, membres in cfg.REPORTING_GROUPS.items():
+        col_groups = [(m, *_pl_dict_reporte(pl_reporte, m)) for m in membres]
+        col_groups.append(("TOTAL", *_pl_dict_reporte(pl_reporte, sheet_name)))
+
+        for nom, periodes in fenetres.items():
+            d_flat_c = lignes_c.xs(sheet_name, level="Perimetre").loc[periodes].sum().to_dict()
+            d_detail_c = {}
+            fenetre = details_c[(details_c["Perimetre"] == sheet_name) & details_c["Periode"].isin(periodes)]
+            for (category, detail), montant in fenetre.groupby(["Categorie", "Ligne"])["Montant"].sum().items():
+                d_detail_c.setdefault(category, {})[detail] = montant
+            col_groups.append((f"TOTAL {libelle_comparatif(nom, periodes, cube)}", d_flat_c, d_detail_c))
+
+        # Budget / forecast du mois : prévu, écart et écart % du total groupe
+        pourcentages = []
+        for version, ecarts in ecarts_mois.get(sheet_name, {}).items():
+            pct = ecarts["Ecart_pct"].astype(object).where(ecarts["Ecart_pct"].notna(), None)
+            col_groups += [(version, dict(zip(ecarts["Ligne"], ecarts["Prevu"])), {}),
+                           (f"Δ {version}", dict(zip(ecarts["Ligne"], ecarts["Ecart"])), {}),
+                           (f"Δ % {version}", dict(zip(ecarts["Ligne"], pct)), {})]
+            pourcentages.append(f"Δ % {version}")
+
+        onglets.append((sheet_name, empreinte_onglet(periode, col_groups, structure),
+                        lambda ws, t=sheet_name, cg=col_groups, pc=tuple(pourcentages):
+                            _write_pl_sheet(ws, t, cg, periode, structure, pc)))
 
     # ── Bilan ─────────────────────────────────────────────────────────────────
-    ws_bilan = wb.create_sheet("Bilan")
-    _write_bilan_sheet(ws_bilan, df_bilan_mapped, periode)
-    print("[output_08] Onglet 'Bilan' généré")
+    bilan_consolide = _bilan_consolide(
+        df_bilan_mapped, matrice_poids({"CONSOLIDÉ": list(cfg.ENTITES)}, [periode], cfg), periode,
+        cfg.CATEGORIE_CAPITAUX_PROPRES,
+    )
+    onglets.append(("Bilan", empreinte_onglet(periode, df_bilan_mapped, bilan_consolide, cfg.ENTITES),
+                    lambda ws: _write_bilan_sheet(ws, df_bilan_mapped, periode, cfg.ENTITES, bilan_consolide)))
+
+    # ── Free cash flow ────────────────────────────────────────────────────────
+    consolide = perimetres({"CONSOLIDÉ": list(cfg.ENTITES)})
+    if capex is not None:
+        fcf = _fcf_consolide(df_pl_final, df_opex_rh, ifrs16, capex, periode, matrice_poids(consolide, [periode], cfg))
+        onglets.append(("Free cash flow", empreinte_onglet(periode, fcf, capex["df_variation"]),
+                        lambda ws: _write_fcf_sheet(ws, fcf, capex, periode)))
+
+    # ── Tableau de flux ───────────────────────────────────────────────────────
+    if flux is not None and not flux["df_flux"].empty:
+        df_flux = _flux_consolide(flux["df_flux"], matrice_poids(consolide, sorted(flux["df_flux"]["Periode"].unique()), cfg))
+        onglets.append((FLUX_SHEET,
+                        empreinte_onglet(periode, df_flux, cfg.ENTITES, cfg.EXERCICE_PREMIER_MOIS),
+                        lambda ws: _write_flux_sheet(ws, df_flux, periode, cfg.ENTITES, cfg.EXERCICE_PREMIER_MOIS)))
 
     # ── Retraitements ─────────────────────────────────────────────────────────
-    ws_ret = wb.create_sheet("Retraitements")
-    _write_retraitements_sheet(ws_ret, recap_pl, recap_bs, ifrs16, periode)
-    print("[output_08] Onglet 'Retraitements' généré")
-
-    # ── Détail P&L FEC ────────────────────────────────────────────────────────
-    ws_detail = wb.create_sheet("Détail P&L FEC")
-    _write_pl_detail_sheet(ws_detail, df_pl_elimine, periode)
-    print("[output_08] Onglet 'Détail P&L FEC' généré")
+    onglets.append(("Retraitements", empreinte_onglet(periode, recap_pl, recap_bs, ifrs16["df_ifrs16"]),
+                    lambda ws: _write_retraitements_sheet(ws, recap_pl, recap_bs, ifrs16, periode)))
+
+    # ── Tendance intercos ─────────────────────────────────────────────────────
+    if interco_historique is not None and not interco_historique.empty:
+        onglets.append((TENDANCE_SHEET,
+                        empreinte_onglet(periode, interco_historique, cfg.EXERCICE_PREMIER_MOIS, cfg.SEUIL_ECART_INTERCO),
+                        lambda ws: _write_tendance_interco_sheet(ws, interco_historique, periode,
+                                                                 cfg.EXERCICE_PREMIER_MOIS, cfg.SEUIL_ECART_INTERCO)))
+
+    # ── Détail P&L FEC (+ Drill-down P&L, lié cellule à cellule : régénérés ensemble) ──
+    drill_onglet = df_drilldown is not None and not df_drilldown.empty and \
+        tient(budget, estimer_onglet_mb(len(df_drilldown), len(DRILL_COLS)))
+    # Drill-down écrit en flux dans un classeur séparé : toujours régénéré (empreinte None)
+    empreinte_detail = empreinte_onglet(periode, df_pl_elimine, df_drilldown) \
+        if drill_onglet or df_drilldown is None or df_drilldown.empty else None
+    onglets.append(("Détail P&L FEC", empreinte_detail,
+                    lambda ws: _write_detail_et_drilldown(ws, df_pl_elimine, df_drilldown, drill_onglet, periode,
+                                                          output_folder, budget)))
+    if drill_onglet:
+        onglets.append((DRILL_SHEET, empreinte_detail, None))   # Écrit avec l'onglet Détail P&L FEC
+
+    # ── Régénération sélective ────────────────────────────────────────────────
+    noms       = [nom for nom, _, _ in onglets]
+    empreintes = {nom: e for nom, e, _ in onglets}
+    precedentes = lire_empreintes_onglets(filepath) if cfg.REPORTING_REUTILISATION else {}
+    inchanges   = [nom for nom in noms if empreintes[nom] is not None and precedentes.get(nom) == empreintes[nom]]
+
+    if len(inchanges) == len(noms) and list(precedentes) == noms:
+        evenement(log, logging.INFO, "output.inchange",
+                  f"\n[output_08] ✅ Reporting inchangé ({len(noms)} onglets, mêmes agrégats) : {filepath}",
+                  periode=str(periode), chemin=str(filepath), onglets=len(noms))
+        return str(filepath)
+
+    if inchanges:
+        wb = load_workbook(filepath)
+        for ws in list(wb.worksheets):
+            if ws.title not in inchanges:
+                wb.remove(ws)
+        log.info(f"[output_08] {len(inchanges)} onglet(s) inchangé(s) repris du classeur précédent : {', '.join(inchanges)}")
+    else:
+        wb = Workbook()
+        wb.remove(wb.active)  # Supprime la feuille vide par défaut
+
+    for nom, _, ecrire in onglets:
+        if nom not in inchanges and nom not in wb.sheetnames:
+            wb.create_sheet(nom)
+    for nom, _, ecrire in onglets:
+        if nom not in inchanges and ecrire is not None:
+            ecrire(wb[nom])
+            log.info(f"[output_08] Onglet '{nom}' généré")
+    for i, nom in enumerate(noms):
+        wb.move_sheet(nom, offset=i - wb.sheetnames.index(nom))
 
     # ── Sauvegarde ────────────────────────────────────────────────────────────
-    filename = f"reporting_{periode}.xlsx"
-    filepath = Path(output_folder) / filename
     wb.save(filepath)
-    print(f"\n[output_08] ✅ Fichier généré : {filepath}")
+    sauver_empreintes_onglets(filepath, empreintes)
+    mesurer(budget, "08 sauvegarde Excel")
+    evenement(log, logging.INFO, "output.reporting", f"\n[output_08] ✅ Fichier généré : {filepath}",
+              periode=str(periode), chemin=str(filepath), regeneres=len(noms) - len(inchanges))
     return str(filepath)
@@ -0,0 +1,140 @@
+"""
+packs.py — Packs de distribution par entité et par groupe (--packs / fpa packs)
+---------------------------------------------------------------------------------
+Logique :
+  - Un classeur par périmètre (chaque entité + chaque groupe de REPORTING_GROUPS, cf.
+    consolidation.perimetres) pour les responsables de filiale :
+      · P&L         : colonnes par entité du périmètre + TOTAL consolidé (mise en forme des onglets P&L)
+      · Détail P&L  : comptes FEC des entités du périmètre (mise en forme Détail P&L FEC)
+      · Split BU    : masse salariale OPEX par BU / Type
+  - Les classeurs sont écrits en parallèle dans un pool de processus (PACKS_WORKERS) : openpyxl
+    est mono-thread, c'est le seul moyen de ne pas multiplier la durée du stage 08
+  - Aucun recalcul : chaque processus relit dans le cache de la période les agrégats déjà
+    calculés par le pipeline (pl_reporte, bu_reporte, df_pl_elimine), filtrés sur son périmètre
+    à la lecture Parquet — rien de volumineux n'est sérialisé vers les processus
+  - Un manifeste (manifest_YYYYMM.json) liste les fichiers générés : périmètre, entités,
+    onglets, taille, sha256, durée d'écriture
+
+Output : data/output/packs/YYYYMM/pack_<PERIMETRE>_YYYYMM.xlsx + manifest_YYYYMM.json
+"""
+
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+from openpyxl import Workbook
+
+from config import FOLDERS, PACKS_WORKERS, PL_STRUCTURE
+from scripts.ledger_store import dossier_periode, periodes_en_cache
+from scripts.pipeline_config import config_defaut
+from scripts.consolidation import perimetres, structure_pl
+from scripts.output_08 import _pl_dict_reporte, _write_pl_sheet, _write_pl_detail_sheet, _write_bu_sheet
+from scripts.journal import journal
+
+log = journal(__name__)
+
+
+def dossier_packs(periode, output_folder=FOLDERS["output"]):
+    return Path(output_folder) / "packs" / str(periode)
+
+
+def _nom_fichier(perimetre, periode):
+    ascii_ = unicodedata.normalize("NFKD", perimetre).encode("ascii", "ignore").decode()
+    return f"pack_{re.sub(r'[^A-Za-z0-9]+', '_', ascii_).strip('_')}_{periode}.xlsx"
+
+
+def _lire(periode, nom, filtres, cache_folder):
+    chemin = dossier_periode(periode, cache_folder) / f"{nom}.parquet"
+    if not chemin.exists():
+        return pd.DataFrame()
+    return pd.read_parquet(chemin, filters=filtres)
+
+
+def ecrire_pack(periode, perimetre, entites, dossier, cache_folder=FOLDERS["cache"], structure=PL_STRUCTURE):
+    """Écrit le pack d'un périmètre (exécuté dans un processus du pool). Retourne son entrée de manifeste."""
+    debut = time.perf_counter()
+    colonnes = [perimetre] if entites == [perimetre] else entites + [perimetre]
+
+    pl_reporte = _lire(periode, "pl_reporte", [("Perimetre", "in", colonnes)], cache_folder)
+    df_detail  = _lire(periode, "df_pl_elimine", [("Entite", "in", entites)], cache_folder)
+    df_bu      = _lire(periode, "bu_reporte", [("Perimetre", "==", perimetre)], cache_folder)
+
+    wb = Workbook()
+    wb.remove(wb.active)
+
+    col_groups = [
+        ("TOTAL" if p == perimetre and len(colonnes) > 1 else p, *_pl_dict_reporte(pl_reporte, p))
+        for p in colonnes
+    ]
+    _write_pl_sheet(wb.create_sheet("P&L"), perimetre, col_groups, periode, structure)
+    if not df_detail.empty:
+        _write_pl_detail_sheet(wb.create_sheet("Détail P&L"), df_detail, periode)
+    if not df_bu.empty:
+        _write_bu_sheet(wb.create_sheet("Split BU"), df_bu, perimetre, periode)
+
+    chemin = Path(dossier) / _nom_fichier(perimetre, periode)
+    wb.save(chemin)
+
+    return {
+        "perimetre": perimetre,
+        "entites"  : entites,
+        "fichier"  : chemin.name,
+        "onglets"  : wb.sheetnames,
+        "octets"   : chemin.stat().st_size,
+        "sha256"   : hashlib.sha256(chemin.read_bytes()).hexdigest(),
+        "duree_s"  : round(time.perf_counter() - debut, 3),
+    }
+
+
+def run(periode=None, workers=PACKS_WORKERS, output_folder=None, cache_folder=None, cfg=None):
+    """
+    Génère les packs de tous les périmètres à partir du cache de `periode` (défaut : la plus récente).
+    workers : taille du pool (None = nombre de CPU, 1 = séquentiel dans le processus courant).
+    cfg     : configuration de la clôture (pipeline_config) — périmètres, structure P&L, dossiers par défaut.
+    Retourne le chemin du manifeste.
+    """
+    cfg           = cfg or config_defaut()
+    output_folder = output_folder or cfg.FOLDERS["output"]
+    cache_folder  = cache_folder or cfg.FOLDERS["cache"]
+    periode = periode or periodes_en_cache(cache_folder)[-1]
+    dossier = dossier_packs(periode, output_folder)
+    dossier.mkdir(parents=True, exist_ok=True)
+    for ancien in dossier.glob("pack_*.xlsx"):
+        ancien.unlink()
+
+    cibles    = list(perimetres(cfg.REPORTING_GROUPS).items())
+    structure = structure_pl(cfg)
+    workers   = min(workers or os.cpu_count() or 1, len(cibles))
+    debut     = time.perf_counter()
+    log.info(f"\n[packs] {len(cibles)} packs {periode} — {workers} processus")
+
+    if workers == 1:
+        fichiers = [ecrire_pack(periode, p, ents, dossier, cache_folder, structure) for p, ents in cibles]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures  = [pool.submit(ecrire_pack, periode, p, ents, dossier, cache_folder, structure)
+                        for p, ents in cibles]
+            fichiers = [f.result() for f in futures]
+
+    for f in fichiers:
+        log.info(f"  ✅ {f['fichier']:<40} {f['octets'] / 1024:>8.0f} Ko  {f['duree_s']:.2f}s")
+
+    manifeste = dossier / f"manifest_{periode}.json"
+    manifeste.write_text(json.dumps({
+        "periode"  : str(periode),
+        "genere_le": datetime.now().isoformat(timespec="seconds"),
+        "duree_s"  : round(time.perf_counter() - debut, 3),
+        "fichiers" : fichiers,
+    }, ensure_ascii=False, indent=2), encoding="utf-8")
+
+    log.info(f"[packs] Manifeste : {manifeste}")
+    return str(manifeste)
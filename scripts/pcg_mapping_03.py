@@ -1,18 +1,24 @@
+import logging
 import pandas as pd
 import os
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from config import ENTITES, CLASSES_PL, NA_VALUES
+from scripts.comptes import masque_prefixes
+from scripts.load_fec_01 import detect_fec_files, lire_comptes_fec
+from scripts.journal import journal, evenement, apercu
 
+log = journal(__name__)
 
-def load_mapping_pcg(mapping_folder):
+
+def load_mapping_pcg(mapping_folder, entites=ENTITES):
     filepath = os.path.join(mapping_folder, 'mapping_pcg.xlsx')
     mappings = {}
 
-    print("\nChargement du mapping PCG...")
+    log.info("\nChargement du mapping PCG...")
 
-    for entite in ENTITES:
+    for entite in entites:
         try:
             df = pd.read_excel(filepath, sheet_name=entite, dtype=str)
             df.columns = ['CompteNum', 'CompteLib', 'Mapping_PL_detail', 'Mapping_BS_detail',
@@ -26,14 +32,65 @@ def load_mapping_pcg(mapping_folder):
                     df[col] = df[col].where(~df[col].str.upper().isin(na_upper), other=None)
 
             mappings[entite] = df
-            print(f"  {entite} : {len(df)} comptes chargés")
+            log.info(f"  {entite} : {len(df)} comptes chargés")
 
         except Exception as e:
-            print(f"  {entite} : onglet non trouvé ou erreur — {e}")
+            log.warning(f"  {entite} : onglet non trouvé ou erreur — {e}")
 
     return mappings
 
 
+def verifier_mapping(comptes_fec, mappings, entites=ENTITES):
+    """
+    Contrôle du mapping PCG avant clôture (fpa check-mapping), sans calcul de mouvements.
+    comptes_fec : Entite | CompteNum | CompteLib (load_fec_01.lire_comptes_fec).
+    Retourne les anomalies : Entite | CompteNum | CompteLib | Anomalie.
+    """
+    anomalies = []
+
+    def signaler(entite, lignes, anomalie):
+        if not lignes.empty:
+            anomalies.append(lignes.assign(Entite=entite, Anomalie=anomalie)[['Entite', 'CompteNum', 'CompteLib', 'Anomalie']])
+
+    for entite in entites:
+        comptes = comptes_fec[comptes_fec['Entite'] == entite]
+        if entite not in mappings:
+            signaler(entite, pd.DataFrame({'CompteNum': [None], 'CompteLib': [None]}), "Onglet de mapping absent")
+            continue
+        df_mapping = mappings[entite]
+
+        signaler(entite, df_mapping[df_mapping['CompteNum'].duplicated(keep=False)], "Compte en double dans le mapping")
+
+        mappe = df_mapping['Mapping_PL_detail'].notna() | df_mapping['Mapping_BS_detail'].notna()
+        signaler(entite, comptes[~comptes['CompteNum'].isin(df_mapping.loc[mappe, 'CompteNum'])], "Compte FEC non mappé")
+
+        # Détail sans catégorie : ignoré par les agrégations (groupby sur la catégorie)
+        for vue in ('PL', 'BS'):
+            orphelins = df_mapping[df_mapping[f'Mapping_{vue}_detail'].notna() & df_mapping[f'Mapping_{vue}_category'].isna()]
+            signaler(entite, orphelins, f"Détail {vue} sans catégorie")
+
+    if not anomalies:
+        return pd.DataFrame(columns=['Entite', 'CompteNum', 'CompteLib', 'Anomalie'])
+    return pd.concat(anomalies, ignore_index=True)
+
+
+def controler_mapping(fec_folder, mapping_folder, periode, entites=ENTITES):
+    """Anomalies du mapping PCG face aux comptes des FEC de `periode` (cf. verifier_mapping)."""
+    fichiers  = detect_fec_files(fec_folder, periode, entites)
+    comptes   = pd.concat([lire_comptes_fec(fp, ent) for ent, fp in fichiers.items()], ignore_index=True)
+    anomalies = verifier_mapping(comptes, load_mapping_pcg(mapping_folder, entites), entites)
+
+    if anomalies.empty:
+        log.info(f"\n  ✅ Mapping complet : {len(comptes)} comptes FEC, {len(fichiers)} entité(s)")
+    for (entite, anomalie), lignes in anomalies.groupby(['Entite', 'Anomalie'], sort=False):
+        lignes = lignes[lignes['CompteNum'].notna()]
+        evenement(log, logging.WARNING, "mapping.anomalie", f"\n  ⚠️  {entite} : {anomalie}" + (f" ({len(lignes)})" if len(lignes) else ""),
+                  entite=entite, anomalie=anomalie, comptes=lambda: lignes['CompteNum'].tolist())
+        if not lignes.empty:
+            log.warning("%s", apercu(lignes, ['CompteNum', 'CompteLib']))
+    return anomalies
+
+
 def appliquer_mapping(df_comptes, mappings):
     dfs_mapped  = []
     dfs_alertes = []
@@ -54,8 +111,9 @@ def appliquer_mapping(df_comptes, mappings):
             non_mappes = non_mappes.copy()
             non_mappes['Entite'] = entite
             dfs_alertes.append(non_mappes[['Entite', 'CompteNum', 'CompteLib', 'Mouvement']])
-            print(f"\n  ⚠️  {entite} : {len(non_mappes)} compte(s) non mappé(s) !")
-            print(non_mappes[['CompteNum', 'CompteLib']].to_string(index=False))
+            evenement(log, logging.WARNING, "mapping.non_mappes", f"\n  ⚠️  {entite} : {len(non_mappes)} compte(s) non mappé(s) !",
+                      entite=entite, comptes=len(non_mappes))
+            log.debug("%s", apercu(non_mappes, ['CompteNum', 'CompteLib']))
 
         dfs_mapped.append(df_merged)
 
@@ -63,14 +121,14 @@ def appliquer_mapping(df_comptes, mappings):
     df_alertes = pd.concat(dfs_alertes, ignore_index=True) if dfs_alertes else pd.DataFrame()
 
     if df_alertes.empty:
-        print("\n  ✅ Tous les comptes sont mappés")
+        log.info("\n  ✅ Tous les comptes sont mappés")
 
     return df_mapped, df_alertes
 
 
 def agreger_pl(df_mapped):
     df_pl = df_mapped[
-        df_mapped['ClasseCompte'].isin(CLASSES_PL) &
+        masque_prefixes(df_mapped['CompteId'], CLASSES_PL) &
         df_mapped['Mapping_PL_detail'].notna()
     ].copy()
 
@@ -81,7 +139,7 @@ def agreger_pl(df_mapped):
     # Produits (classe 7) créditeurs en compta → on inverse pour affichage P&L
     pl['Mouvement'] = pl['Mouvement'] * -1
 
-    print(f"\nP&L agrégé : {pl['Mapping_PL_detail'].nunique()} lignes de détail distinctes")
+    log.info(f"\nP&L agrégé : {pl['Mapping_PL_detail'].nunique()} lignes de détail distinctes")
     return pl
 
 
@@ -104,7 +162,7 @@ def agreger_bilan(df_soldes_bilan, mappings):
         ['Entite', 'Mapping_BS_category', 'Mapping_BS_detail'], as_index=False
     ).agg(Solde=('Solde', 'sum'))
 
-    print(f"Bilan agrégé : {bilan['Mapping_BS_detail'].nunique()} lignes de détail distinctes")
+    log.info(f"Bilan agrégé : {bilan['Mapping_BS_detail'].nunique()} lignes de détail distinctes")
     return bilan
 
 
@@ -0,0 +1,142 @@
+"""
+pipeline_config.py — Configuration d'une clôture (instance), chargeable depuis TOML / YAML
+--------------------------------------------------------------------------------------------
+Logique :
+  - config.py reste la configuration par défaut. PipelineConfig en est une copie propre à une
+    clôture, passée à chaque stage (paramètre `cfg`) au lieu des constantes du module :
+    deux groupes, ou deux jeux de paramètres, peuvent être clôturés dans le même processus ou
+    dans le même pool de processus (main.py --config a.toml --config b.toml)
+  - Les paramètres gardent les noms de config.py : cfg.ENTITES, cfg.FOLDERS["fec"], cfg.PL_STRUCTURE…
+  - Un fichier TOML / YAML ne surcharge que ce qu'il déclare (clés en majuscules ou minuscules) :
+      · FOLDERS est fusionné dossier par dossier, les autres paramètres sont remplacés en bloc
+      · clé inconnue ou type incompatible avec config.py → ValueError (faute de frappe détectée
+        au chargement, pas au stage 08)
+  - Chemins relatifs (FOLDERS, *_FILE) résolus depuis RACINE : par défaut le dossier du fichier de
+    configuration, de sorte que chaque groupe a son arborescence data/ et mapping/
+
+Exemple (groupes/nord/cloture.toml) :
+    nom     = "Groupe Nord"
+    entites = ["HOLD", "OPCO"]
+
+    [reporting_groups]
+    "Consolidé" = ["HOLD", "OPCO"]
+
+    [ifrs16_loyer_accounts]
+    OPCO = "6132"
+
+YAML : même structure (PyYAML requis, import à la demande).
+"""
+
+import copy
+import os
+import sys
+from dataclasses import dataclass, field
+from pathlib import Path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+from scripts.journal import journal
+
+log = journal(__name__)
+
+
+NOM_DEFAUT = "défaut"
+
+
+@dataclass(frozen=True)
+class PipelineConfig:
+    """Paramètres d'une clôture ; attributs en majuscules = paramètres de config.py."""
+    parametres: dict = field(repr=False)
+    nom       : str = NOM_DEFAUT
+    source    : str = None    # Fichier de configuration (None = config.py)
+
+    def __getattr__(self, cle):
+        # Appelé seulement pour les attributs absents de la dataclass (cfg.ENTITES, cfg.FOLDERS…)
+        if cle.startswith("_") or "parametres" not in self.__dict__:
+            raise AttributeError(cle)
+        try:
+            return self.parametres[cle]
+        except KeyError:
+            raise AttributeError(f"Paramètre inconnu : {cle}") from None
+
+    def remplacer(self, **valeurs):
+        """Copie avec quelques paramètres remplacés (mêmes règles que charger_config)."""
+        return PipelineConfig({**self.parametres, **_valider(valeurs, self.parametres)}, self.nom, self.source)
+
+
+def parametres_defaut():
+    """Copie des constantes de config.py (lues à l'appel : reflète un config.py modifié en mémoire)."""
+    return {cle: copy.deepcopy(valeur) for cle, valeur in vars(config).items() if cle.isupper()}
+
+
+def config_defaut():
+    return PipelineConfig(parametres_defaut())
+
+
+def _meme_type(valeur, defaut):
+    if defaut is None or valeur is None:
+        return True
+    if isinstance(defaut, bool) or isinstance(valeur, bool):
+        return isinstance(valeur, bool) and isinstance(defaut, bool)
+    if isinstance(defaut, (int, float)):
+        return isinstance(valeur, (int, float))
+    if isinstance(defaut, (list, tuple)):
+        return isinstance(valeur, (list, tuple))
+    return isinstance(valeur, type(defaut))
+
+
+def _valider(valeurs, defauts):
+    """Clés normalisées en majuscules, contrôlées contre config.py ; FOLDERS fusionné."""
+    resultat = {}
+    for cle, valeur in valeurs.items():
+        cle = cle.upper()
+        if cle not in defauts:
+            raise ValueError(f"Paramètre inconnu : {cle} (absent de config.py)")
+        if not _meme_type(valeur, defauts[cle]):
+            raise ValueError(f"{cle} : {type(valeur).__name__} reçu, {type(defauts[cle]).__name__} attendu")
+        if cle == "FOLDERS":
+            valeur = {**defauts["FOLDERS"], **valeur}
+        elif cle == "PL_STRUCTURE":
+            valeur = [tuple(ligne) for ligne in valeur]
+        resultat[cle] = valeur
+    return resultat
+
+
+def _lire_fichier(chemin):
+    if chemin.suffix == ".toml":
+        import tomllib
+        with open(chemin, "rb") as f:
+            return tomllib.load(f)
+    if chemin.suffix in (".yaml", ".yml"):
+        try:
+            import yaml
+        except ImportError:
+            raise ImportError(f"{chemin.name} : PyYAML requis pour lire une configuration YAML (pip install pyyaml)") from None
+        with open(chemin, encoding="utf-8") as f:
+            return yaml.safe_load(f) or {}
+    raise ValueError(f"{chemin.name} : format de configuration non reconnu (.toml, .yaml ou .yml)")
+
+
+def _resoudre_chemins(parametres, racine):
+    def resoudre(chemin):
+        return chemin if os.path.isabs(chemin) else os.path.normpath(os.path.join(racine, chemin))
+
+    parametres["FOLDERS"] = {cle: resoudre(d) for cle, d in parametres["FOLDERS"].items()}
+    for cle, valeur in parametres.items():
+        if cle.endswith("_FILE") and isinstance(valeur, str):
+            parametres[cle] = resoudre(valeur)
+
+
+def charger_config(chemin):
+    """PipelineConfig depuis un fichier TOML / YAML (paramètres absents : valeurs de config.py)."""
+    chemin  = Path(chemin)
+    valeurs = dict(_lire_fichier(chemin))
+    nom     = valeurs.pop("nom", None) or valeurs.pop("NOM", None) or chemin.stem
+    racine  = valeurs.pop("racine", None) or valeurs.pop("RACINE", None) or "."
+
+    parametres = parametres_defaut()
+    parametres.update(_valider(valeurs, parametres))
+    _resoudre_chemins(parametres, chemin.parent / racine)
+
+    log.info(f"[pipeline_config] {nom} : {chemin} ({len(valeurs)} paramètre(s) surchargé(s))")
+    return PipelineConfig(parametres, str(nom), str(chemin))
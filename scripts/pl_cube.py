@@ -0,0 +1,95 @@
+"""
+pl_cube.py — Cube P&L mensuel persisté (entité × catégorie × détail × mois)
+-----------------------------------------------------------------------------
+Logique :
+  - À chaque clôture, les lignes P&L reportées de chaque entité (output_08.agregats_par_perimetre,
+    lignes 'item' et 'detail') sont insérées dans data/cache/pl_cube.parquet pour la période,
+    en remplaçant une éventuelle version précédente du même mois pour ces seules entités
+    (cache partagé entre groupes : la clôture d'un groupe ne touche pas aux entités des autres)
+  - Le cube ne contient que des montants additifs (pas de sous-totaux) : tout périmètre et toute
+    fenêtre de mois s'obtiennent par somme pondérée (consolidation.consolider), puis output_08
+    recalcule les sous-totaux et les intérêts minoritaires
+  - Les comparatifs (YTD, même mois N-1, 12 mois glissants) sont découpés en mémoire dans le cube,
+    sans recharger les FEC historiques
+
+Colonnes : Entite | Categorie | Detail | Periode | Montant   (Detail vide = ligne 'item')
+"""
+
+import pandas as pd
+import os
+import sys
+from pathlib import Path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import FOLDERS, EXERCICE_PREMIER_MOIS
+from scripts.journal import journal
+from scripts.ledger_store import verrou_cache
+
+log = journal(__name__)
+
+
+COLONNES_CUBE = ["Entite", "Categorie", "Detail", "Periode", "Montant"]
+
+
+def chemin_cube(cache_folder=FOLDERS["cache"]):
+    return Path(cache_folder) / "pl_cube.parquet"
+
+
+def charger_cube(cache_folder=FOLDERS["cache"]):
+    chemin = chemin_cube(cache_folder)
+    if not chemin.exists():
+        return pd.DataFrame(columns=COLONNES_CUBE)
+    return pd.read_parquet(chemin)
+
+
+def mettre_a_jour_cube(periode, pl_reporte, entites, cache_folder=FOLDERS["cache"]):
+    """Remplace les lignes (`periode`, `entites`) par le P&L reporté des entités. Retourne le cube complet."""
+    df = pl_reporte[pl_reporte["Perimetre"].isin(entites) & pl_reporte["Type"].isin(["item", "detail"])]
+    lignes = pd.DataFrame({
+        "Entite"   : df["Perimetre"].to_numpy(),
+        "Categorie": df["Categorie"].to_numpy(),
+        "Detail"   : df["Ligne"].where(df["Type"] == "detail", "").to_numpy(),
+        "Periode"  : str(periode),
+        "Montant"  : df["Montant"].to_numpy(),
+    })
+
+    with verrou_cache("pl_cube", cache_folder):   # Cache partagé : clôtures de groupes en parallèle
+        cube = charger_cube(cache_folder)
+        remplacees = (cube["Periode"] == str(periode)) & cube["Entite"].isin(entites)
+        cube = pd.concat([cube[~remplacees], lignes], ignore_index=True)
+        cube = cube.sort_values(["Periode", "Entite", "Categorie", "Detail"]).reset_index(drop=True)
+
+        chemin = chemin_cube(cache_folder)
+        chemin.parent.mkdir(parents=True, exist_ok=True)
+        cube.to_parquet(chemin, index=False)
+
+    log.info(f"[pl_cube] Période {periode} enregistrée — cube : {cube['Periode'].nunique()} mois, {len(cube)} lignes")
+    return cube
+
+
+def _decaler(periode, mois):
+    return (pd.Period(f"{periode[:4]}-{periode[4:]}", freq="M") + mois).strftime("%Y%m")
+
+
+def fenetres_comparatifs(periode, premier_mois=EXERCICE_PREMIER_MOIS):
+    """{libellé: [périodes YYYYMM]} des comparatifs de `periode` (exercice ouvert au mois `premier_mois`)."""
+    p = pd.Period(f"{periode[:4]}-{periode[4:]}", freq="M")
+    debut_exercice = pd.Period(year=p.year if p.month >= premier_mois else p.year - 1,
+                               month=premier_mois, freq="M")
+    return {
+        "YTD" : [(debut_exercice + i).strftime("%Y%m") for i in range((p - debut_exercice).n + 1)],
+        "N-1" : [_decaler(periode, -12)],
+        "R12" : [_decaler(periode, -i) for i in range(11, -1, -1)],
+    }
+
+
+def libelle_comparatif(nom, periodes, cube):
+    """Libellé de colonne, avec le nombre de mois disponibles dans le cube si incomplet."""
+    disponibles = len(set(periodes) & set(cube["Periode"]))
+    if nom == "N-1":
+        libelle = f"{periodes[0][4:]}/{periodes[0][:4]}"
+    else:
+        libelle = nom
+    if disponibles < len(periodes):
+        libelle += f" ({disponibles}/{len(periodes)} m)"
+    return libelle
@@ -0,0 +1,193 @@
+"""
+previsionnel.py — Budget / forecast : chargement et écarts réel vs prévu (stage 08)
+-------------------------------------------------------------------------------------
+Logique :
+  - Une version par fichier (BUDGET_FILE → "Budget", FORECAST_FILE → "Forecast"), optionnels :
+      Entite | Ligne | 202401 | 202402 | …   (une colonne par mois YYYYMM)
+    Lignes : lignes 'item' de PL_STRUCTURE, convention de signe du reporting (charges négatives) ;
+    sous-totaux recalculés (SUBTOTALS), lignes ou entités inconnues ignorées avec alerte
+  - Le fichier parsé est mis en cache (data/cache/previsionnel/) sous son empreinte : relu
+    seulement quand il change (et gardé en mémoire entre deux runs : fpa watch, pool multi-groupes)
+  - Réel (cube P&L) et prévu sont consolidés par le même moteur (consolidation) pour tous les
+    périmètres et tous les mois communs, puis les écarts sont calculés en une opération sur le
+    tableau version × (périmètre, mois) × ligne :
+      · Ecart     = Reel - Prevu   (positif = favorable, les charges étant négatives)
+      · Ecart_pct = Ecart / |Prevu| (vide si rien n'est prévu)
+  - Versions comparées : PL_ECARTS ; output_08 ajoute prévu / écart / écart % du mois à la
+    colonne TOTAL des onglets P&L
+
+Output : dict avec clés
+  'previsions' : {version: DataFrame Entite | Periode | Ligne | Montant}
+  'df_ecarts'  : DataFrame Version | Perimetre | Periode | Ligne | Reel | Prevu | Ecart | Ecart_pct
+"""
+
+import logging
+import re
+import numpy as np
+import pandas as pd
+import os
+import sys
+from pathlib import Path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import FOLDERS
+from scripts.pipeline_config import config_defaut
+from scripts.consolidation import perimetres, matrice_poids, structure_pl, LIGNE_MINORITAIRES
+from scripts.output_08 import pl_consolide
+from scripts.ledger_store import empreinte_fichiers, table_derivee
+from scripts.journal import journal, evenement
+
+log = journal(__name__)
+
+
+COLONNES_PREVISIONNEL = ["Entite", "Periode", "Ligne", "Montant"]
+DETAILS_VIDES         = pd.DataFrame(columns=["Entite", "Periode", "Categorie", "Ligne", "Montant"])
+
+
+def fichiers_previsionnel(cfg=None):
+    """{version: fichier} des versions prévisionnelles connues."""
+    cfg = cfg or config_defaut()
+    return {"Budget": cfg.BUDGET_FILE, "Forecast": cfg.FORECAST_FILE}
+
+
+# ── Chargement ────────────────────────────────────────────────────────────────
+
+def _mois(colonne):
+    """En-tête de colonne → 'YYYYMM' (texte, entier ou date Excel), None si ce n'est pas un mois."""
+    if hasattr(colonne, "strftime"):
+        return colonne.strftime("%Y%m")
+    texte = str(colonne).strip().removesuffix(".0")
+    return texte if re.fullmatch(r"\d{6}", texte) else None
+
+
+def load_previsionnel(fichier):
+    """Fichier prévisionnel (format large, un mois par colonne) → Entite | Periode | Ligne | Montant."""
+    df = pd.read_excel(fichier, dtype={"Entite": str, "Ligne": str})
+    manquantes = [c for c in ("Entite", "Ligne") if c not in df.columns]
+    if manquantes:
+        raise ValueError(f"Prévisionnel {fichier} : colonnes manquantes {manquantes}")
+
+    mois = {c: _mois(c) for c in df.columns if c not in ("Entite", "Ligne") and _mois(c)}
+    if not mois:
+        raise ValueError(f"Prévisionnel {fichier} : aucune colonne de mois (YYYYMM)")
+
+    long = (df.dropna(subset=["Entite", "Ligne"])
+            .melt(id_vars=["Entite", "Ligne"], value_vars=list(mois), var_name="Periode", value_name="Montant")
+            .dropna(subset=["Montant"]))
+    return pd.DataFrame({
+        "Entite" : long["Entite"].str.strip().to_numpy(),
+        "Periode": long["Periode"].map(mois).to_numpy(),
+        "Ligne"  : long["Ligne"].str.strip().to_numpy(),
+        "Montant": pd.to_numeric(long["Montant"], errors="coerce").fillna(0.0).to_numpy(dtype=float),
+    })[COLONNES_PREVISIONNEL]
+
+
+def get_previsionnel(fichier, version, cache_folder=FOLDERS["cache"]):
+    """Prévisionnel parsé, depuis la mémoire ou le cache Parquet tant que le fichier ne change pas."""
+    empreinte = empreinte_fichiers(fichier)
+    prevision, origine = table_derivee("previsionnel", version.lower(), empreinte,
+                                        lambda: load_previsionnel(fichier), cache_folder)
+    if origine == "cache":
+        log.info(f"[previsionnel] {version} en cache ({empreinte}) : {prevision['Periode'].nunique()} mois")
+    elif origine == "calcul":
+        log.info(f"[previsionnel] {version} chargé : {prevision['Entite'].nunique()} entité(s), "
+                 f"{prevision['Periode'].nunique()} mois — {fichier}")
+    return prevision
+
+
+def _aligner(prevision, version, lignes, entites):
+    """Garde les lignes 'item' de la structure P&L et les entités de la clôture (alerte sur le reste)."""
+    for colonne, connues, libelle in (("Ligne", lignes, "ligne(s) hors lignes 'item' du P&L"),
+                                      ("Entite", entites, "entité(s) inconnue(s)")):
+        inconnues = sorted(set(prevision[colonne]) - set(connues))
+        if inconnues:
+            evenement(log, logging.WARNING, "previsionnel.ignore",
+                      f"[previsionnel] ⚠️  {version} : {len(inconnues)} {libelle} ignorée(s) — {', '.join(inconnues)}",
+                      version=version, colonne=colonne, valeurs=inconnues)
+    return prevision[prevision["Ligne"].isin(lignes) & prevision["Entite"].isin(entites)]
+
+
+# ── Écarts ────────────────────────────────────────────────────────────────────
+
+def calculer_ecarts(cube, previsions, poids, lignes):
+    """
+    Écarts réel vs prévu de tous les périmètres et mois de `poids` (consolidation.matrice_poids).
+    cube       : cube P&L (pl_cube) — réel par entité
+    previsions : {version: Entite | Periode | Ligne | Montant}
+    lignes     : lignes P&L reportées (items, sous-totaux, totaux)
+    Chaque version n'est retenue que sur ses propres mois.
+    """
+    reel  = pl_consolide(cube[cube["Detail"] == ""].rename(columns={"Categorie": "Ligne"}), DETAILS_VIDES, poids)[0]
+    prevu = np.stack([pl_consolide(df, DETAILS_VIDES, poids)[0].reindex(columns=lignes, fill_value=0).to_numpy()
+                      for df in previsions.values()])                       # version × (périmètre, mois) × ligne
+    reel  = np.broadcast_to(reel.reindex(columns=lignes, fill_value=0).to_numpy(), prevu.shape)
+
+    ecart     = reel - prevu
+    ecart_pct = np.divide(ecart, np.abs(prevu), out=np.full(ecart.shape, np.nan), where=prevu != 0)
+
+    versions, n, k = list(previsions), prevu.shape[1], len(lignes)
+    index = pd.MultiIndex.from_product([poids["perimetres"], poids["periodes"]])
+    df = pd.DataFrame({
+        "Version"  : np.repeat(versions, n * k),
+        "Perimetre": np.tile(np.repeat(index.get_level_values(0), k), len(versions)),
+        "Periode"  : np.tile(np.repeat(index.get_level_values(1), k), len(versions)),
+        "Ligne"    : np.tile(lignes, len(versions) * n),
+        "Reel"     : reel.ravel(),
+        "Prevu"    : prevu.ravel(),
+        "Ecart"    : ecart.ravel(),
+        "Ecart_pct": ecart_pct.ravel(),
+    })
+    mois_versions = pd.MultiIndex.from_frame(pd.concat(
+        [df_v[["Periode"]].drop_duplicates().assign(Version=v) for v, df_v in previsions.items()])[["Version", "Periode"]])
+    return df[pd.MultiIndex.from_frame(df[["Version", "Periode"]]).isin(mois_versions)].reset_index(drop=True)
+
+
+# ── Point d'entrée ────────────────────────────────────────────────────────────
+
+def run(periode, cube, cfg=None):
+    """
+    Écarts réel vs prévu (versions PL_ECARTS) de tous les périmètres, sur les mois communs au cube
+    et aux fichiers prévisionnels. Retourne None si aucun fichier n'est présent.
+    cfg : configuration de la clôture (pipeline_config) — fichiers, versions, groupes, structure P&L.
+    """
+    cfg = cfg or config_defaut()
+    fichiers = fichiers_previsionnel(cfg)
+    inconnues = [v for v in cfg.PL_ECARTS if v not in fichiers]
+    if inconnues:
+        raise ValueError(f"Version prévisionnelle inconnue : {', '.join(inconnues)} ({' | '.join(fichiers)})")
+
+    structure = structure_pl(cfg)
+    items     = [l for l, t in structure if t == "item" and l != LIGNE_MINORITAIRES]
+    previsions = {
+        v: _aligner(get_previsionnel(fichiers[v], v, cfg.FOLDERS["cache"]), v, items, cfg.ENTITES)
+        for v in cfg.PL_ECARTS if Path(fichiers[v]).exists()
+    }
+    if not previsions:
+        log.info(f"[previsionnel] Pas de budget / forecast ({', '.join(fichiers[v] for v in cfg.PL_ECARTS)})")
+        return None
+
+    periodes = sorted(set(cube["Periode"]) & {p for df in previsions.values() for p in df["Periode"]})
+    if str(periode) not in {p for df in previsions.values() for p in df["Periode"]}:
+        log.warning(f"[previsionnel] ⚠️  Aucun montant prévu pour {periode} ({', '.join(previsions)})")
+    if not periodes:
+        return {"previsions": previsions, "df_ecarts": pd.DataFrame()}
+
+    poids  = matrice_poids(perimetres(cfg.REPORTING_GROUPS), periodes, cfg)
+    lignes = [l for l, t in structure if t not in ("section", "spacer")]
+    df_ecarts = calculer_ecarts(cube, previsions, poids, lignes)
+
+    evenement(log, logging.INFO, "previsionnel.ecarts",
+              f"[previsionnel] ✅ Écarts {' / '.join(previsions)} vs réel : {len(poids['perimetres'])} périmètre(s) "
+              f"× {len(periodes)} mois", versions=list(previsions), periodes=periodes)
+    return {"previsions": previsions, "df_ecarts": df_ecarts}
+
+
+if __name__ == "__main__":
+    from scripts.pl_cube import charger_cube
+    from scripts.ledger_store import periodes_en_cache
+
+    periode  = periodes_en_cache(FOLDERS["cache"])[-1]
+    resultat = run(periode, charger_cube(FOLDERS["cache"]))
+    if resultat is not None and not resultat["df_ecarts"].empty:
+        df = resultat["df_ecarts"]
+        print(df[df["Periode"] == periode].to_string(index=False))
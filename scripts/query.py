@@ -0,0 +1,69 @@
+"""
+query.py — Requêtes SQL ad hoc sur le cache colonnaire (drill-down)
+---------------------------------------------------------------------
+Expose les tables Parquet de data/cache/YYYYMM/ (ledger, mappings, df_mapped,
+df_pl_final, df_bilan_mapped, recap_pl, recap_bs, …) comme des vues d'un moteur
+SQL embarqué (DuckDB, en process, sans serveur). Les vues lisent directement le
+Parquet : aucune table n'est chargée en mémoire avant d'être interrogée.
+
+Exemple :
+  python fpa.py query "SELECT CompteNum, SUM(Mouvement) FROM ledger JOIN comptes USING (Entite, CompteId)
+                       WHERE Entite = 'PID' GROUP BY 1 ORDER BY 2"
+"""
+
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import FOLDERS
+from scripts.ledger_store import lister_tables, periodes_en_cache
+
+
+def connecter(periode=None, cache_folder=FOLDERS["cache"]):
+    """Connexion DuckDB en mémoire avec une vue par table en cache. Retourne (con, periode)."""
+    import duckdb
+
+    if periode is None:
+        periodes = periodes_en_cache(cache_folder)
+        if not periodes:
+            raise FileNotFoundError(f"Aucune période en cache dans {cache_folder} — lancer d'abord main.py")
+        periode = periodes[-1]
+
+    tables = lister_tables(periode, cache_folder)
+    if not tables:
+        raise FileNotFoundError(f"Aucune table en cache pour la période {periode}")
+
+    con = duckdb.connect(database=":memory:")
+    for nom, chemin in tables.items():
+        con.execute(f"CREATE VIEW \"{nom}\" AS SELECT * FROM read_parquet('{chemin}')")
+    return con, periode
+
+
+def executer(sql, periode=None, cache_folder=FOLDERS["cache"]):
+    """Exécute une requête et retourne un DataFrame."""
+    con, _ = connecter(periode, cache_folder)
+    try:
+        return con.execute(sql).df()
+    finally:
+        con.close()
+
+
+def run(sql=None, periode=None, fmt="table", cache_folder=FOLDERS["cache"]):
+    con, periode = connecter(periode, cache_folder)
+    try:
+        if not sql:
+            print(f"[query] Tables disponibles ({periode}) :")
+            for nom in lister_tables(periode, cache_folder):
+                nb = con.execute(f"SELECT COUNT(*) FROM \"{nom}\"").fetchone()[0]
+                print(f"  {nom:<20} {nb:>10} lignes")
+            return None
+
+        df = con.execute(sql).df()
+    finally:
+        con.close()
+
+    if fmt == "csv":
+        print(df.to_csv(index=False), end="")
+    else:
+        print(df.to_string(index=False))
+    return df
@@ -0,0 +1,211 @@
+"""
+validation.py — Contrôles d'intégrité FEC fusionnés au chargement
+-------------------------------------------------------------------
+Logique :
+  - accumuler() est appelé par load_fec / iter_fec_blocs sur chaque frame déjà parsée :
+    quelques groupby vectorisés sur des colonnes déjà en mémoire, sans relecture du FEC
+      · Debit/Credit par écriture (Entite, JournalCode, EcritureNum)
+      · Debit/Credit/lignes par journal
+      · Debit/Credit par jour
+      · clé 64 bits (écriture × compte × montants) de chaque ligne → doublons
+  - Les accumulateurs sont additifs : une écriture coupée entre deux blocs (mode out-of-core)
+    est réassemblée à la finalisation
+  - finaliser() produit un rapport structuré d'anomalies :
+      Entite | Controle | Cle | Debit | Credit | Ecart | Lignes
+
+Contrôles :
+  - Écriture déséquilibrée   : |Debit - Credit| > SEUIL_EQUILIBRE_FEC par EcritureNum
+  - Journal déséquilibré     : idem par JournalCode
+  - Jour déséquilibré        : idem par EcritureDate
+  - Ligne en double          : même écriture (journal, numéro), même compte, mêmes Débit/Crédit
+                               (en out-of-core, un doublon réparti sur deux blocs est identifié
+                               par sa clé hexadécimale faute de ligne d'exemple)
+  - Date hors période        : écritures postérieures à la fin de période ou antérieures
+                               de plus de FEC_PROFONDEUR_MOIS_MAX mois
+"""
+
+import json
+import logging
+import numpy as np
+import pandas as pd
+import os
+import sys
+from pathlib import Path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import SEUIL_EQUILIBRE_FEC
+from scripts.pipeline_config import config_defaut
+from scripts.journal import journal, evenement
+
+log = journal(__name__)
+
+
+COLONNES_RAPPORT = ['Entite', 'Controle', 'Cle', 'Debit', 'Credit', 'Ecart', 'Lignes']
+
+
+def nouveaux_controles():
+    return {'ecritures': [], 'journaux': [], 'jours': [], 'cles': [], 'doublons': []}
+
+
+def _centimes(montants):
+    return np.round(montants.to_numpy() * 100).astype('int64').view('uint64')
+
+
+def accumuler(controles, df):
+    """Ajoute les agrégats de contrôle d'une frame FEC préparée (une seule entité : fichier ou bloc)."""
+    if controles is None or df.empty:
+        return
+
+    ecritures = df.groupby(['Entite', 'JournalCode', 'EcritureNum'], sort=False)
+    sommes    = ecritures[['Debit', 'Credit']].sum()
+    controles['ecritures'].append(sommes)
+    controles['journaux'].append(
+        df.groupby(['Entite', 'JournalCode'], sort=False)
+        .agg(Debit=('Debit', 'sum'), Credit=('Credit', 'sum'), Lignes=('Debit', 'size'))
+    )
+    controles['jours'].append(
+        df.groupby(['Entite', 'EcritureDate'], sort=False)[['Debit', 'Credit']].sum()
+    )
+
+    # Clé de ligne 64 bits : écriture × compte × montants. Seules les valeurs distinctes
+    # (écritures, comptes) sont hachées, les lignes n'en portent que les codes.
+    h_ecritures      = pd.util.hash_pandas_object(sommes.index.to_frame(index=False), index=False).to_numpy()
+    codes, comptes   = pd.factorize(df['CompteNum'])
+    h_comptes        = pd.util.hash_array(np.asarray(comptes, dtype=object))
+    with np.errstate(over='ignore'):
+        cles = (
+            h_ecritures[ecritures.ngroup().to_numpy()]
+            ^ (h_comptes[codes] * np.uint64(0x9E3779B97F4A7C15))
+            ^ (_centimes(df['Debit'])  * np.uint64(0xC2B2AE3D27D4EB4F))
+            ^ (_centimes(df['Credit']) * np.uint64(0x165667B19E3779F9))
+        )
+    entite = df['Entite'].iat[0]
+    controles['cles'].append((entite, cles))
+
+    doublons = pd.Series(cles).duplicated(keep='first').to_numpy()
+    if doublons.any():
+        d = df[doublons]
+        controles['doublons'].append(pd.DataFrame({
+            'Cle_hash': cles[doublons],
+            'Cle'     : (d['JournalCode'] + '/' + d['EcritureNum'] + ' ' + d['CompteNum']).to_numpy(),
+        }))
+
+
+def _combiner(parts):
+    return pd.concat(parts).groupby(level=list(range(parts[0].index.nlevels))).sum()
+
+
+def _compter_cles(cles):
+    """[(entité, clés | comptages)] → [(entité, Series clé → nombre de lignes)] par entité."""
+    par_entite = {}
+    for entite, c in cles:
+        comptage = pd.Series(c).value_counts() if isinstance(c, np.ndarray) else c
+        par_entite.setdefault(entite, []).append(comptage)
+    return [(e, pd.concat(cs).groupby(level=0).sum()) for e, cs in par_entite.items()]
+
+
+def compacter(controles):
+    """Réduit les accumulateurs (mode out-of-core) sans perdre d'information."""
+    for cle in ('ecritures', 'journaux', 'jours'):
+        if len(controles[cle]) > 1:
+            controles[cle] = [_combiner(controles[cle])]
+    controles['cles'] = _compter_cles(controles['cles'])
+
+
+def fusionner(*controles):
+    """Fusionne des accumulateurs indépendants (ex. un par entité)."""
+    fusion = nouveaux_controles()
+    for c in controles:
+        for cle in fusion:
+            fusion[cle] += c[cle]
+    return fusion
+
+
+def _desequilibres(agregat, controle, format_cle, seuil=SEUIL_EQUILIBRE_FEC):
+    ecart = agregat['Debit'] - agregat['Credit']
+    anomalies = agregat[ecart.abs() > seuil].reset_index()
+    if anomalies.empty:
+        return pd.DataFrame(columns=COLONNES_RAPPORT)
+    anomalies['Controle'] = controle
+    anomalies['Cle']      = anomalies.apply(format_cle, axis=1)
+    anomalies['Ecart']    = anomalies['Debit'] - anomalies['Credit']
+    if 'Lignes' not in anomalies:
+        anomalies['Lignes'] = pd.NA
+    return anomalies[COLONNES_RAPPORT]
+
+
+def finaliser(controles, periode, cfg=None):
+    """Rapport d'anomalies (DataFrame) — vide si le FEC est intègre. Seuils : `cfg` (pipeline_config)."""
+    if not controles['ecritures']:
+        return pd.DataFrame(columns=COLONNES_RAPPORT)
+
+    cfg         = cfg or config_defaut()
+    seuil       = cfg.SEUIL_EQUILIBRE_FEC
+    fin_periode = pd.to_datetime(periode, format='%Y%m') + pd.offsets.MonthEnd(0)
+    debut_min   = fin_periode - pd.DateOffset(months=cfg.FEC_PROFONDEUR_MOIS_MAX)
+
+    ecritures = _combiner(controles['ecritures'])
+    journaux  = _combiner(controles['journaux'])
+    jours     = _combiner(controles['jours'])
+
+    rapports = [
+        _desequilibres(ecritures, 'Écriture déséquilibrée', lambda r: f"{r['JournalCode']}/{r['EcritureNum']}", seuil),
+        _desequilibres(journaux,  'Journal déséquilibré',   lambda r: r['JournalCode'], seuil),
+        _desequilibres(jours,     'Jour déséquilibré',      lambda r: r['EcritureDate'].strftime('%Y-%m-%d'), seuil),
+    ]
+
+    # Dates hors période : agrégées par jour, sans repasser sur les lignes
+    j = jours.reset_index()
+    hors = j[(j['EcritureDate'] > fin_periode) | (j['EcritureDate'] < debut_min)]
+    if not hors.empty:
+        rapports.append(pd.DataFrame({
+            'Entite'  : hors['Entite'],
+            'Controle': 'Date hors période',
+            'Cle'     : hors['EcritureDate'].dt.strftime('%Y-%m-%d'),
+            'Debit'   : hors['Debit'],
+            'Credit'  : hors['Credit'],
+            'Ecart'   : hors['Debit'] - hors['Credit'],
+            'Lignes'  : pd.NA,
+        }))
+
+    echantillons = (pd.concat(controles['doublons']).drop_duplicates('Cle_hash').set_index('Cle_hash')['Cle']
+                    if controles['doublons'] else pd.Series(dtype=str))
+    for entite, comptages in _compter_cles(controles['cles']):
+        doublons = comptages[comptages > 1]
+        if doublons.empty:
+            continue
+        rapports.append(pd.DataFrame({
+            'Entite'  : entite,
+            'Controle': 'Ligne en double',
+            'Cle'     : [echantillons.get(h, f"{h:016x}") for h in doublons.index.to_numpy()],
+            'Debit'   : pd.NA,
+            'Credit'  : pd.NA,
+            'Ecart'   : pd.NA,
+            'Lignes'  : doublons.to_numpy(),
+        }))
+
+    rapport = pd.concat([r for r in rapports if not r.empty], ignore_index=True) \
+        if any(not r.empty for r in rapports) else pd.DataFrame(columns=COLONNES_RAPPORT)
+
+    log.info(f"\nContrôles d'intégrité FEC :")
+    log.info(f"  Écritures contrôlées : {len(ecritures)} | Journaux : {len(journaux)} | Jours : {len(jours)}")
+    if rapport.empty:
+        log.info("  ✅ Aucune anomalie")
+    else:
+        for (entite, controle), grp in rapport.groupby(['Entite', 'Controle']):
+            evenement(log, logging.WARNING, "fec.anomalie", f"  ⚠️  {entite} : {len(grp)} × {controle}",
+                      entite=entite, controle=controle, nombre=len(grp))
+    return rapport
+
+
+def sauver_rapport(rapport, periode, output_folder):
+    """Rapport JSON : synthèse par contrôle + liste des anomalies."""
+    Path(output_folder).mkdir(parents=True, exist_ok=True)
+    chemin = Path(output_folder) / f"controles_{periode}.json"
+    contenu = {
+        "periode"  : str(periode),
+        "synthese" : rapport.groupby(['Entite', 'Controle']).size().rename('Anomalies').reset_index().to_dict(orient='records'),
+        "anomalies": json.loads(rapport.to_json(orient='records', force_ascii=False)),
+    }
+    chemin.write_text(json.dumps(contenu, ensure_ascii=False, indent=2), encoding='utf-8')
+    return str(chemin)
@@ -0,0 +1,41 @@
+"""Dimension compte : lignes du ledger identifiées par CompteId seul (comptes)."""
+
+import pandas as pd
+
+from scripts.comptes import encoder_comptes, retenir_libelles, dimension_comptes, libelles_comptes
+from scripts.monthly_movements_02 import get_mouvements_par_compte
+
+
+def _lignes_preparees():
+    comptes = ["706000", "706000", "512000"]
+    return pd.DataFrame({
+        "Entite"   : "TESTCPT",
+        "CompteNum": comptes,
+        "CompteLib": ["Prestations", "Prestations", "Banque"],
+        "CompteId" : encoder_comptes(comptes),
+        "Debit"    : [0.0, 0.0, 150.0],
+        "Credit"   : [100.0, 50.0, 0.0],
+        "Mouvement": [-100.0, -50.0, 150.0],
+    })
+
+
+def test_ledger_sans_libelles_agregats_avec():
+    lignes = retenir_libelles(_lignes_preparees())
+    assert "CompteNum" not in lignes and "CompteLib" not in lignes
+
+    mouvements = get_mouvements_par_compte(lignes).set_index("CompteNum")
+    assert list(mouvements.columns[:3]) == ["Entite", "CompteLib", "CompteId"]
+    assert mouvements.loc["706000", "CompteLib"] == "Prestations"
+    assert mouvements.loc["706000", "Mouvement"] == -150.0
+    assert mouvements.loc["512000", "ClasseCompte"] == "5"
+
+
+def test_dimension_par_entite():
+    retenir_libelles(_lignes_preparees())
+    mapping = pd.DataFrame({"Entite": ["TESTCPT", "TESTCPT"], "CompteNum": ["706000", "641000"]})
+    dim = dimension_comptes(pd.concat([libelles_comptes(["TESTCPT"]), mapping])).set_index("CompteNum")
+
+    assert sorted(dim.index) == ["512000", "641000", "706000"]
+    assert dim.loc["706000", "CompteLib"] == "Prestations"   # Libellé FEC prioritaire sur le mapping
+    assert pd.isna(dim.loc["641000", "CompteLib"])
+    assert dim.loc["641000", "Classe"] == 6
@@ -0,0 +1,50 @@
+"""Moteur de consolidation sur une chaîne de détention FR → CELSIUS (80 %) → VERTICAL (60 %)."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from scripts.consolidation import consolider, matrice_detention, matrice_poids, perimetres, pourcentages_interet
+from scripts.pipeline_config import config_defaut
+
+ENTITES        = ["FR", "CELSIUS", "VERTICAL"]
+PARTICIPATIONS = {"FR": {"CELSIUS": 0.8}, "CELSIUS": {"VERTICAL": 0.6}}
+GROUPES        = {"GROUPE": ["FR", "SOUS-GROUPE"], "SOUS-GROUPE": ["CELSIUS", "VERTICAL"]}
+
+
+def _config(**parametres):
+    return config_defaut().remplacer(PARTICIPATIONS=PARTICIPATIONS, **parametres)
+
+
+def _resultats(periodes=("202403",)):
+    """Résultat net de 100 par entité et par mois."""
+    return pd.DataFrame([(e, p, "NET INCOME", 100.0) for p in periodes for e in ENTITES],
+                        columns=["Entite", "Periode", "Ligne", "Montant"])
+
+
+def test_pourcentages_interet_indirects():
+    membres = np.array([[True, True, True], [False, True, True], [False, False, True]])
+    x = pourcentages_interet(membres, matrice_detention(ENTITES, PARTICIPATIONS))
+    np.testing.assert_allclose(x, [[1.0, 0.8, 0.48], [0.0, 1.0, 0.6], [0.0, 0.0, 1.0]])
+
+
+def test_consolider_integration_et_minoritaires():
+    poids = matrice_poids(perimetres(GROUPES), ["202403"], _config())
+    integration  = consolider(_resultats(), ["Ligne"], poids).set_index("Perimetre")["Montant"]
+    minoritaires = consolider(_resultats(), ["Ligne"], poids, ponderation="minoritaires").set_index("Perimetre")["Montant"]
+
+    assert integration["GROUPE"] == pytest.approx(300.0)
+    assert integration["VERTICAL"] == pytest.approx(100.0)
+    # Minoritaires du groupe : 20 % de CELSIUS + 52 % de VERTICAL ; du sous-groupe : 40 % de VERTICAL
+    assert minoritaires["GROUPE"] == pytest.approx(20.0 + 52.0)
+    assert minoritaires["SOUS-GROUPE"] == pytest.approx(40.0)
+
+
+def test_consolider_proportionnelle_et_entree_de_perimetre():
+    cfg   = _config(METHODES_CONSOLIDATION={"VERTICAL": "proportionnelle"}, DATES_PERIMETRE={"VERTICAL": ["202403", ""]})
+    poids = matrice_poids(perimetres(GROUPES), ["202402", "202403"], cfg)
+    res   = consolider(_resultats(["202402", "202403"]), ["Ligne"], poids).set_index(["Perimetre", "Periode"])["Montant"]
+
+    assert res["GROUPE", "202402"] == pytest.approx(200.0)          # VERTICAL hors périmètre avant mars
+    assert res["GROUPE", "202403"] == pytest.approx(200.0 + 48.0)   # puis intégré à 48 %
+    assert res["VERTICAL", "202402"] == pytest.approx(100.0)        # Entité seule : ses propres comptes
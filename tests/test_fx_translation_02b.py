@@ -0,0 +1,53 @@
+"""Conversion des filiales hors EUR (fx_translation_02b)."""
+
+import pandas as pd
+import pytest
+
+from scripts.comptes import encoder_comptes
+from scripts.fx_translation_02b import convertir_ledger, ecarts_conversion, load_taux
+from scripts.pipeline_config import config_defaut
+
+PERIODE = "202403"
+
+
+@pytest.fixture
+def cfg():
+    return config_defaut().remplacer(DEVISES_ENTITES={"CELSIUS": "CHF"})
+
+
+@pytest.fixture
+def ledger():
+    """Une vente CHF encaissée (706 / 512) de CELSIUS et la même en EUR pour FR."""
+    comptes = ["706000", "512000", "706000", "512000"]
+    return pd.DataFrame({
+        "Entite"       : ["CELSIUS", "CELSIUS", "FR", "FR"],
+        "CompteNum"    : comptes,
+        "CompteId"     : encoder_comptes(comptes),
+        "EcritureDate" : pd.to_datetime(["2024-03-15"] * 4),
+        "Debit"        : [0.0, 110.0, 0.0, 100.0],
+        "Credit"       : [110.0, 0.0, 100.0, 0.0],
+        "Mouvement"    : [-110.0, 110.0, -100.0, 100.0],
+        "Montantdevise": [None] * 4,
+        "Idevise"      : [None] * 4,
+    })
+
+
+def test_conversion_avec_table_de_taux(tmp_path, ledger, cfg):
+    fichier = tmp_path / "taux.xlsx"
+    pd.DataFrame({"Devise": ["CHF"], "Date": pd.to_datetime(["2024-03-31"]),
+                  "Taux_moyen": [1.1], "Taux_cloture": [1.0]}).to_excel(fichier, index=False)
+
+    df = convertir_ledger(ledger, PERIODE, load_taux(fichier), cfg)
+    celsius = df[df["Entite"] == "CELSIUS"].set_index("CompteNum")
+    assert celsius.loc["706000", "Mouvement"] == pytest.approx(-100.0)   # P&L : taux moyen
+    assert celsius.loc["512000", "Mouvement"] == pytest.approx(110.0)    # Bilan : taux de clôture
+    assert df[df["Entite"] == "FR"]["Mouvement"].tolist() == [-100.0, 100.0]
+    assert ecarts_conversion(df, PERIODE, cfg) == {"CELSIUS": pytest.approx(-10.0)}
+
+
+def test_conversion_sans_table_de_taux(tmp_path, ledger, cfg):
+    df = convertir_ledger(ledger, PERIODE, load_taux(tmp_path / "absent.xlsx"), cfg)
+    # Aucun taux ni taux implicite : taux 1, montants inchangés, pas d'écart de conversion
+    assert df["Taux"].tolist() == [1.0] * 4
+    assert df["Mouvement"].tolist() == ledger["Mouvement"].tolist()
+    assert ecarts_conversion(df, PERIODE, cfg) == {"CELSIUS": pytest.approx(0.0)}
@@ -0,0 +1,28 @@
+"""Montants des paires intercos (interco_04.calculer_montants_intercos)."""
+
+import pandas as pd
+
+from scripts.comptes import encoder_comptes
+from scripts.interco_04 import calculer_montants_intercos
+
+
+def test_montants_par_paire_et_filtre():
+    df_interco = pd.DataFrame({
+        "Description"         : ["Management fees", "Refacturations"],
+        "Entite_A"            : ["FR", "FR"],
+        "Compte_Entite_A"     : ["706000", "706000"],
+        "Filtre_EcritureLib_A": ["MGT", ""],
+        "Entite_B"            : ["PID", "PID"],
+        "Compte_Entite_B"     : ["604000", "604100"],
+        "Filtre_EcritureLib_B": ["mgt, fees", ""],
+    })
+    # Un même compte dans deux paires : filtré pour la première, entier pour la seconde
+    df = pd.DataFrame({
+        "Entite"     : ["FR", "FR", "PID", "PID", "CELSIUS"],
+        "CompteId"   : encoder_comptes(["706000", "706000", "604000", "604000", "706000"]),
+        "EcritureLib": ["Mgt fees mars", None, "FEES mars", "Achats", "Mgt fees"],
+        "Mouvement"  : [-10.0, -5.0, 10.0, 3.0, -7.0],
+    })
+
+    assert calculer_montants_intercos(df, df_interco) == [(-10.0, 10.0), (-15.0, 0.0)]
+    assert calculer_montants_intercos(df.iloc[:0], df_interco) == [(0.0, 0.0), (0.0, 0.0)]
@@ -0,0 +1,54 @@
+"""Historique compte × mois et retraitement du mapping PCG (mapping_historique)."""
+
+import pandas as pd
+import pytest
+
+from scripts.comptes import encoder_comptes
+from scripts.mapping_historique import (charger_index, charger_mouvements, enregistrer_version,
+                                        mettre_a_jour_mouvements, retraiter)
+
+
+def _mapping(lignes):
+    """Table de mapping (ledger_store.mappings_en_table) : (Entite, CompteNum, detail, categorie) P&L."""
+    df = pd.DataFrame(lignes, columns=["Entite", "CompteNum", "Mapping_PL_detail", "Mapping_PL_category"])
+    return df.assign(Mapping_BS_detail=None, Mapping_BS_category=None)
+
+
+def _mouvements(lignes):
+    """df_pl_elimine minimal : (Entite, CompteNum, Mouvement) ; df_bilan vide."""
+    pl = pd.DataFrame(lignes, columns=["Entite", "CompteNum", "Mouvement"])
+    pl = pl.assign(CompteLib=pl["CompteNum"], CompteId=encoder_comptes(pl["CompteNum"]))
+    bilan = pd.DataFrame(columns=["Entite", "CompteNum", "CompteLib", "CompteId", "Solde"])
+    return pl, bilan
+
+
+def _cloturer(periode, entites, mapping, mouvements, cache):
+    version = enregistrer_version(_mapping(mapping), f"clôture {periode}", cache)
+    mettre_a_jour_mouvements(periode, *_mouvements(mouvements), version, cache, entites=entites)
+    return version
+
+
+def test_deux_groupes_meme_mois(tmp_path):
+    va = _cloturer("202403", ["FR"], [("FR", "706000", "Ventes", "Sales")], [("FR", "706000", -100.0)], tmp_path)
+    vb = _cloturer("202403", ["PID"], [("PID", "706000", "Ventes", "Sales")], [("PID", "706000", -40.0)], tmp_path)
+
+    historique = charger_mouvements(tmp_path)
+    assert sorted(historique["Entite"]) == ["FR", "PID"]
+    assert charger_index(tmp_path)["periodes"]["202403"] == {"FR": va, "PID": vb}
+    # Chaque groupe retraité sous son propre mapping : aucun écart
+    assert retraiter(va, cache_folder=tmp_path).empty
+    assert retraiter(vb, cache_folder=tmp_path).empty
+
+
+def test_retraiter_un_compte_remappe(tmp_path):
+    mapping = [("FR", "706000", "Ventes", "Sales"), ("FR", "708000", "Ventes annexes", "Sales")]
+    mouvements = [("FR", "706000", -100.0), ("FR", "708000", -25.0)]
+    v1 = _cloturer("202402", ["FR"], mapping, mouvements, tmp_path)
+    v2 = enregistrer_version(_mapping([mapping[0], ("FR", "708000", "Autres produits", "Other income")]),
+                             "fpa restate", tmp_path)
+
+    diff = retraiter(v2, cache_folder=tmp_path).set_index("Detail")
+    assert set(diff.index) == {"Ventes annexes", "Autres produits"}
+    assert (diff["Version_avant"] == v1).all() and (diff["Version_apres"] == v2).all()
+    assert diff.loc["Ventes annexes", "Ecart"] == pytest.approx(-25.0)
+    assert diff.loc["Autres produits", "Ecart"] == pytest.approx(25.0)
@@ -0,0 +1,60 @@
+"""Agrégats P&L reportés (output_08) : lignes par entité et consolidation."""
+
+import pandas as pd
+import pytest
+
+from scripts.consolidation import matrice_poids
+from scripts.output_08 import SUBTOTALS, _lignes_pl_entites, pl_consolide
+from scripts.pipeline_config import config_defaut
+
+PERIODE = "202403"
+SANS_IFRS16 = {"impacts": {}}
+
+
+def _build_pl_dict_reference(entities, df_pl_final, df_opex_rh):
+    """Calcul historique (baseline _build_pl_dict, sans IFRS 16) : le RH remplace les staff costs du FEC."""
+    d_flat = df_pl_final[df_pl_final["Entite"].isin(entities)].groupby("Mapping_PL_category")["Mouvement"].sum().to_dict()
+    if not df_opex_rh.empty:
+        rh    = df_opex_rh[df_opex_rh["Entite"].isin(entities)]
+        type_ = rh["Type"].str.lower()
+        d_flat["Staff costs (Operating)"] = -rh[type_.str.contains("operat") & ~type_.str.contains("non")]["Mouvement"].sum()
+        d_flat["Staff costs (Non-op.)"]   = -rh[type_.str.contains("non")]["Mouvement"].sum()
+    for ligne, fn in SUBTOTALS.items():
+        d_flat[ligne] = fn(d_flat)
+    return d_flat
+
+
+@pytest.fixture
+def pl():
+    df_pl_final = pd.DataFrame({
+        "Entite"             : ["FR", "FR", "FR", "PID"],
+        "Mapping_PL_category": ["Sales", "Staff costs (Operating)", "Structure costs", "Sales"],
+        "Mapping_PL_detail"  : ["Sales", "Salaires", "Honoraires", "Sales"],
+        "Mouvement"          : [1000.0, -300.0, -50.0, 400.0],
+    })
+    df_opex_rh = pd.DataFrame({
+        "Entite": ["FR", "FR"], "BU": ["Games", "Games"],
+        "Type": ["Operating", "Non-operating"], "Mouvement": [300.0, 120.0],
+    })
+    return df_pl_final, df_opex_rh
+
+
+def test_staff_costs_rh_remplacent_le_fec(pl):
+    df_pl_final, df_opex_rh = pl
+    poids = matrice_poids({"FR": ["FR"]}, [PERIODE], config_defaut())
+    lignes, details = pl_consolide(*_lignes_pl_entites(df_pl_final, df_opex_rh, SANS_IFRS16, PERIODE), poids)
+
+    reference = _build_pl_dict_reference(["FR"], df_pl_final, df_opex_rh)
+    fr = lignes.loc[("FR", PERIODE)]
+    for ligne in ("Staff costs (Operating)", "Staff costs (Non-op.)", "EBITDA", "NET INCOME"):
+        assert fr[ligne] == pytest.approx(reference[ligne])
+    assert fr["Staff costs (Operating)"] == pytest.approx(-300.0)
+    assert "Salaires" not in set(details["Ligne"])
+
+
+def test_staff_costs_fec_conserves_sans_rh(pl):
+    df_pl_final, _ = pl
+    poids = matrice_poids({"FR": ["FR"]}, [PERIODE], config_defaut())
+    vide  = pd.DataFrame(columns=["Entite", "BU", "Type", "Mouvement"])
+    lignes, _ = pl_consolide(*_lignes_pl_entites(df_pl_final, vide, SANS_IFRS16, PERIODE), poids)
+    assert lignes.loc[("FR", PERIODE), "Staff costs (Operating)"] == pytest.approx(-300.0)
@@ -0,0 +1,42 @@
+"""Cube P&L mensuel partagé entre groupes (pl_cube)."""
+
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+import pytest
+
+from scripts.pl_cube import charger_cube, mettre_a_jour_cube
+
+
+def _pl_reporte(montants):
+    """P&L reporté minimal : une ligne 'item' Sales par entité."""
+    return pd.DataFrame({
+        "Perimetre": list(montants), "Ligne": "Sales", "Type": "item", "Categorie": "Sales",
+        "Montant": list(montants.values()),
+    })
+
+
+def test_deux_groupes_sur_le_meme_cache(tmp_path):
+    mettre_a_jour_cube("202403", _pl_reporte({"FR": 100.0, "PID": 50.0}), ["FR", "PID"], tmp_path)
+    mettre_a_jour_cube("202403", _pl_reporte({"CELSIUS": 30.0}), ["CELSIUS"], tmp_path)
+    # Re-clôture du premier groupe : ses lignes sont remplacées, celles de l'autre groupe restent
+    mettre_a_jour_cube("202403", _pl_reporte({"FR": 120.0, "PID": 50.0}), ["FR", "PID"], tmp_path)
+
+    cube = charger_cube(tmp_path).set_index("Entite")["Montant"]
+    assert cube.to_dict() == {"CELSIUS": pytest.approx(30.0), "FR": pytest.approx(120.0), "PID": pytest.approx(50.0)}
+    assert len(cube) == 3
+
+
+def _cloturer_groupe(args):
+    periode, montants, cache = args
+    mettre_a_jour_cube(periode, _pl_reporte(montants), list(montants), cache)
+
+
+def test_clotures_paralleles(tmp_path):
+    # Clôtures simultanées (main.cloturer_groupes) : aucune ne perd les lignes d'une autre
+    groupes = [("202403", {f"E{g}{i}": float(g * 10 + i) for i in range(3)}, tmp_path) for g in range(6)]
+    with ProcessPoolExecutor(max_workers=6) as pool:
+        list(pool.map(_cloturer_groupe, groupes))
+
+    cube = charger_cube(tmp_path)
+    assert sorted(cube["Entite"]) == sorted(e for _, montants, _ in groupes for e in montants)